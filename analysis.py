@@ -1,123 +1,2645 @@
+import csv
+import hashlib
+import itertools
+import json
+import os
+import pickle
+import shutil
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from multiprocessing import shared_memory
 import pandas as pd
 import numpy as np
 from scipy.stats import iqr
 from scipy.spatial.distance import mahalanobis
 from scipy import stats
+from scipy.linalg import solve_triangular
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from sklearn.ensemble import IsolationForest
+from sklearn.neighbors import NearestNeighbors
+
+SNIFF_BLOCK_SIZE = 64 * 1024  # 探测标题时每次读取的字节数
+CANDIDATE_SEPARATORS = [',', '\t', ';', ' ']
+
+
+def _split_fields(line, sep):
+    """按分隔符拆分一行（支持引号），返回字段列表"""
+    return next(csv.reader([line], delimiter=sep))
+
+
+def _iter_lines_with_offsets(f, counter):
+    """逐块读取字节，依次产出(行号, 行文本, 该行结束后的字节偏移)"""
+    buffer = b''
+    offset = 0
+    index = 0
+    while True:
+        block = f.read(SNIFF_BLOCK_SIZE)
+        counter['sniff_bytes'] += len(block)
+        if not block:
+            if buffer:
+                # 文件末尾没有换行符时，剩余部分也是完整的一行
+                yield index, buffer.decode('utf-8').rstrip('\r'), offset + len(buffer)
+            return
+        buffer += block
+        *complete, buffer = buffer.split(b'\n')
+        for raw in complete:
+            offset += len(raw) + 1
+            text = raw.decode('utf-8').rstrip('\r')
+            yield index, text.lstrip('\ufeff') if index == 0 else text, offset
+            index += 1
+
+
+def _sniff_csv(file_path, header_row=None, special_char=None, max_scan_lines=100):
+    """只读取文件开头的字节前缀，确定标题行、分隔符、列名和数据起始的字节偏移
+    
+    参数:
+        header_row: 手动模式下的标题行号（从0开始）
+        special_char: 自动检测模式下用于定位标题行的特殊字符
+    """
+    file_size = os.path.getsize(file_path)
+    counter = {'sniff_bytes': 0}
+    header = None
+    first = None
+    
+    with open(file_path, 'rb') as f:
+        for index, text, end in _iter_lines_with_offsets(f, counter):
+            if header is None:
+                if special_char is not None:
+                    # 自动检测模式：在前max_scan_lines行中查找包含特殊字符的行
+                    if index >= max_scan_lines:
+                        break
+                    if special_char in text:
+                        header_row = index
+                        print(f"找到特殊字符所在行: {header_row}，数据起始行: {header_row + 1}")
+                        header = (index, text, end)
+                elif index >= header_row and text.strip():
+                    header = (index, text, end)
+            elif index >= header_row + 1 and text.strip():
+                # 与原先pd.read_csv(skiprows=data_start_row)一致：数据起始行本身作为表头行被跳过
+                first = (index, text, end)
+                break
+    
+    if header is None:
+        if special_char is not None:
+            error_msg = f"自动检测失败: 未找到特殊字符'{special_char}'，请检查设置或使用手动模式"
+            print(error_msg)
+            raise ValueError(error_msg)
+        raise ValueError(f"文件在第{header_row}行之后没有内容")
+    
+    # 尝试候选分隔符，选择标题列数与数据列数一致且列数最多的分隔符
+    sep = ','
+    columns = [str(col).strip() for col in _split_fields(header[1], sep)]
+    if first is not None:
+        best = None
+        for candidate in CANDIDATE_SEPARATORS:
+            test_columns = [str(col).strip() for col in _split_fields(header[1], candidate)]
+            if len(test_columns) == len(_split_fields(first[1], candidate)):
+                if best is None or len(test_columns) > len(best[1]):
+                    best = (candidate, test_columns)
+        if best is not None:
+            sep, columns = best
+            if sep != ',':
+                print(f"使用分隔符: {sep!r}")
+        else:
+            # 所有分隔符都无法使标题与数据列数一致时，使用默认列名
+            print(f"警告: 列数不匹配。使用默认列名。")
+            columns = [f"Column_{i}" for i in range(len(_split_fields(first[1], sep)))]
+    
+    return {
+        'header_row': header_row,
+        'data_start_row': header_row + 1,
+        'sep': sep,
+        'columns': columns,
+        'data_offset': first[2] if first is not None else file_size,
+        'sniff_bytes': counter['sniff_bytes'],
+        'file_size': file_size
+    }
+
+
+def _parse_csv_body(file_path, sniff, **read_kwargs):
+    """从探测得到的字节偏移处开始一次性解析数据，返回(DataFrame, 解析的字节数)"""
+    if sniff['data_offset'] >= sniff['file_size']:
+        return pd.DataFrame(columns=read_kwargs.get('usecols') or range(len(sniff['columns']))), 0
+    with open(file_path, 'rb') as f:
+        f.seek(sniff['data_offset'])
+        df = pd.read_csv(f, sep=sniff['sep'], header=None, **read_kwargs)
+        parsed_bytes = f.tell() - sniff['data_offset']
+    return df, parsed_bytes
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.smart_yield_cache')
+DEFAULT_CACHE_MAX_BYTES = 4 * 1024 ** 3  # 缓存总大小上限
+
+
+class ColumnCache:
+    """已解析CSV文件的磁盘列式缓存
+    
+    每个缓存条目是一个目录，数值列各自保存为一个.npy文件，再次打开时以内存映射方式
+    加载；非数值列保存为pickle。条目可以只包含部分列，缺少的列解析后再追加。
+    缓存键由文件路径、大小、修改时间以及解析得到的标题行、数据起始行和分隔符组成，
+    文件变化后自动失效。
+    
+    参数:
+        cache_dir: 缓存目录
+        max_bytes: 缓存总大小上限，超出时按最近使用时间淘汰
+        max_age_days: 超过该天数未使用的条目会被删除
+    """
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MAX_BYTES, max_age_days=7):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+    
+    def make_key(self, file_path, sniff):
+        stat = os.stat(file_path)
+        key_parts = [os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns,
+                     sniff['header_row'], sniff['data_start_row'], sniff['sep']]
+        return hashlib.sha1(json.dumps(key_parts).encode('utf-8')).hexdigest()
+    
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+    
+    def _read_meta(self, key):
+        meta_path = os.path.join(self._entry_dir(key), 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def load(self, key, indices=None):
+        """返回以内存映射方式加载的DataFrame
+        
+        indices为列序号列表，None表示所有列；只要有一列未缓存就返回None。
+        """
+        try:
+            meta = self._read_meta(key)
+            if meta is None:
+                return None
+            if indices is None:
+                indices = range(len(meta['columns']))
+            indices = list(indices)
+            if any(str(i) not in meta['stored'] for i in indices):
+                return None
+            
+            entry_dir = self._entry_dir(key)
+            data = {}
+            for i in indices:
+                if meta['stored'][str(i)] == 'npy':
+                    data[i] = np.load(os.path.join(entry_dir, f'c{i}.npy'), mmap_mode='r')
+                else:
+                    data[i] = pd.read_pickle(os.path.join(entry_dir, f'c{i}.pkl'))
+            df = pd.DataFrame(data, index=pd.RangeIndex(meta['n_rows']), copy=False)
+            df.columns = [meta['columns'][i] for i in indices]
+            # 更新修改时间，作为淘汰时的最近使用时间
+            os.utime(os.path.join(entry_dir, 'meta.json'))
+            return df
+        except Exception as e:
+            print(f"读取缓存失败，重新解析文件: {e}")
+            return None
+    
+    def store(self, key, df, columns, indices=None):
+        """把解析结果写入缓存，写入失败不影响正常读取
+        
+        参数:
+            df: 解析得到的数据，列顺序与indices对应
+            columns: 文件的全部列名
+            indices: df各列在文件中的列序号，None表示df包含全部列
+        """
+        entry_dir = self._entry_dir(key)
+        try:
+            os.makedirs(entry_dir, exist_ok=True)
+            meta = self._read_meta(key) or {'columns': [str(c) for c in columns], 'n_rows': len(df), 'stored': {}}
+            if indices is None:
+                indices = range(df.shape[1])
+            for pos, i in enumerate(indices):
+                if str(i) in meta['stored']:
+                    continue
+                col = df.iloc[:, pos]
+                tmp_path = os.path.join(entry_dir, f'c{i}.tmp-{os.getpid()}')
+                if pd.api.types.is_numeric_dtype(col.dtype) and not isinstance(col.dtype, pd.api.extensions.ExtensionDtype):
+                    with open(tmp_path, 'wb') as f:
+                        np.save(f, col.to_numpy())
+                    os.replace(tmp_path, os.path.join(entry_dir, f'c{i}.npy'))
+                    meta['stored'][str(i)] = 'npy'
+                else:
+                    col.reset_index(drop=True).to_pickle(tmp_path)
+                    os.replace(tmp_path, os.path.join(entry_dir, f'c{i}.pkl'))
+                    meta['stored'][str(i)] = 'pkl'
+            
+            tmp_meta = os.path.join(entry_dir, f'meta.json.tmp-{os.getpid()}')
+            with open(tmp_meta, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(tmp_meta, os.path.join(entry_dir, 'meta.json'))
+            self.evict()
+        except Exception as e:
+            print(f"写入缓存失败: {e}")
+    
+    def evict(self):
+        """删除过期条目，并按最近使用时间淘汰直到总大小不超过上限"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, name)
+            meta_path = os.path.join(entry_dir, 'meta.json')
+            if not os.path.isdir(entry_dir) or not os.path.exists(meta_path):
+                continue
+            last_used = os.path.getmtime(meta_path)
+            if now - last_used > self.max_age_days * 86400:
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                continue
+            size = sum(os.path.getsize(os.path.join(entry_dir, f)) for f in os.listdir(entry_dir))
+            entries.append((last_used, size, entry_dir))
+        
+        total = sum(size for _, size, _ in entries)
+        for last_used, size, entry_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+
+
+def _resolve_read_options(analyzer, skiprows):
+    """从界面设置中解析标题行的定位方式，返回可传给_sniff_csv的参数字典"""
+    print(f"self.analyzer = {analyzer}")
+    if analyzer is not None and hasattr(analyzer, 'auto_detect_var') and analyzer.auto_detect_var.get():
+        # 自动检测模式
+        print("使用自动检测模式")
+        if hasattr(analyzer, 'special_char_entry'):
+            special_char = analyzer.special_char_entry.get()
+            print(f"获取到特殊字符: '{special_char}'")
+        else:
+            special_char = ','
+            print(f"未找到special_char_entry，使用默认特殊字符: '{special_char}'")
+        return {'special_char': special_char}
+    
+    # 手动模式或者没有提供analyzer
+    print("使用手动模式")
+    if analyzer is not None and hasattr(analyzer, 'start_row_entry'):
+        try:
+            start_row_text = analyzer.start_row_entry.get()
+            print(f"获取到起始行文本: '{start_row_text}'")
+            data_start_row = int(start_row_text)
+            header_row = data_start_row - 1
+            print(f"转换后的行号: header_row={header_row}, data_start_row={data_start_row}")
+        except (ValueError, AttributeError) as e:
+            print(f"获取起始行出错: {e}，使用默认值")
+            # 如果无法获取，使用默认值
+            header_row = skiprows
+    else:
+        print(f"未找到start_row_entry，使用skiprows值: {skiprows}")
+        # 使用初始化时提供的skiprows值
+        header_row = skiprows
+    return {'header_row': header_row}
+
+
+def discover_columns(files, skiprows=16, analyzer=None):
+    """只读取每个文件的标题区域获取列名，不解析数据
+    
+    参数与DataAnalyzer一致。返回字典:
+        columns: 第一个成功读取的文件的列名
+        union: 所有文件列名的并集（按首次出现顺序）
+        intersection: 所有文件共有的列名（按第一个文件的顺序）
+        per_file: 每个文件的列名
+        errors: 读取失败的文件及错误信息
+    """
+    read_options = _resolve_read_options(analyzer, skiprows)
+    per_file = {}
+    errors = {}
+    for file_path in files:
+        try:
+            per_file[file_path] = _sniff_csv(file_path, **read_options)['columns']
+        except Exception as e:
+            print(f"读取文件标题时出错: {file_path}: {e}")
+            errors[file_path] = str(e)
+    
+    column_lists = list(per_file.values())
+    union = list(dict.fromkeys(col for cols in column_lists for col in cols))
+    common = set(column_lists[0]).intersection(*column_lists[1:]) if column_lists else set()
+    return {
+        'columns': column_lists[0] if column_lists else [],
+        'union': union,
+        'intersection': [col for col in dict.fromkeys(column_lists[0]) if col in common] if column_lists else [],
+        'per_file': per_file,
+        'errors': errors
+    }
+
+
+def _load_csv(file_path, header_row=None, special_char=None, cache=None, usecols=None):
+    """读取单个CSV文件，返回(DataFrame, 读取统计)
+    
+    只依赖可序列化的参数，因此也可以在子进程中调用。提供cache(ColumnCache)时，
+    命中缓存直接以内存映射方式加载，不再调用pd.read_csv；提供usecols(列名列表)时
+    只解析这些列。
+    """
+    # 只读取文件开头的一小段字节，确定标题行、分隔符和数据起始位置
+    sniff = _sniff_csv(file_path, header_row=header_row, special_char=special_char)
+    columns = sniff['columns']
+    print(f"标题行: {sniff['header_row']}，数据起始行: {sniff['data_start_row']}，分隔符: {sniff['sep']!r}")
+    print(f"Found columns: {columns}")
+    
+    indices = None
+    if usecols is not None:
+        wanted = set(usecols)
+        indices = [i for i, col in enumerate(columns) if col in wanted]
+    
+    read_stats = {
+        'file_size': sniff['file_size'],
+        'sniff_bytes': sniff['sniff_bytes'],
+        'parsed_bytes': 0,
+        'bytes_read': sniff['sniff_bytes'],
+        'header_row': sniff['header_row'],
+        'data_start_row': sniff['data_start_row'],
+        'sep': sniff['sep'],
+        'cache_hit': False
+    }
+    
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.make_key(file_path, sniff)
+        cached_df = cache.load(cache_key, indices)
+        if cached_df is not None:
+            print(f"命中缓存: {file_path}")
+            read_stats['cache_hit'] = True
+            return cached_df, read_stats
+    
+    if indices is not None and not indices:
+        # 文件中没有需要的列
+        return pd.DataFrame(), read_stats
+    
+    # 从数据起始位置开始，整个文件只解析一次
+    full_df, parsed_bytes = _parse_csv_body(file_path, sniff, usecols=indices)
+    if indices is not None:
+        full_df.columns = [columns[i] for i in indices]
+    else:
+        if len(full_df.columns) != len(columns):
+            # 数据行的列数与标题不一致时，仍然使用默认列名
+            print(f"警告: 列数仍然不匹配。使用默认列名。")
+            columns = [f"Column_{i}" for i in range(len(full_df.columns))]
+        full_df.columns = columns
+    
+    read_stats['parsed_bytes'] = parsed_bytes
+    read_stats['bytes_read'] = sniff['sniff_bytes'] + parsed_bytes
+    print(f"读取字节数: 探测 {sniff['sniff_bytes']}，解析 {parsed_bytes}，文件大小 {sniff['file_size']}")
+    if cache is not None:
+        cache.store(cache_key, full_df, columns, indices)
+    return full_df, read_stats
+
+
+def _load_csv_worker(file_path, read_options):
+    """进程池任务：读取失败时返回错误信息而不是抛出异常，避免影响其他文件"""
+    try:
+        df, read_stats = _load_csv(file_path, **read_options)
+        return df, read_stats, None
+    except Exception as e:
+        import traceback
+        return None, None, f"{e}\n{traceback.format_exc()}"
+
+
+def _iter_csv_chunks(file_path, header_row=None, special_char=None, usecols=None, chunksize=200000, **_):
+    """按块读取CSV文件，每次产出一个最多chunksize行的DataFrame，不会把整个文件读入内存"""
+    sniff = _sniff_csv(file_path, header_row=header_row, special_char=special_char)
+    columns = sniff['columns']
+    indices = None
+    if usecols is not None:
+        wanted = set(usecols)
+        indices = [i for i, col in enumerate(columns) if col in wanted]
+        if not indices:
+            return
+    if sniff['data_offset'] >= sniff['file_size']:
+        return
+    
+    with open(file_path, 'rb') as f:
+        f.seek(sniff['data_offset'])
+        for chunk in pd.read_csv(f, sep=sniff['sep'], header=None, usecols=indices, chunksize=chunksize):
+            if indices is not None:
+                chunk.columns = [columns[i] for i in indices]
+            elif len(chunk.columns) == len(columns):
+                chunk.columns = columns
+            else:
+                chunk.columns = [f"Column_{i}" for i in range(len(chunk.columns))]
+            yield chunk
+
+
+class StreamingColumnStats:
+    """逐块累积一列数据的统计量，不需要保存全部数据
+    
+    精确累积样本数、均值、二到四阶中心矩、最小值、最大值和接近0的值的个数；
+    分位数、正态性检验等基于一个固定大小的均匀蓄水池样本（分位数草图）。
+    
+    参数:
+        sample_size: 蓄水池样本大小，0表示不保留样本
+    """
+    def __init__(self, sample_size=100000, seed=0):
+        self.sample_size = sample_size
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.m3 = 0.0
+        self.m4 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.zero_count = 0
+        self.sample = np.empty(0)
+        self._sample_keys = np.empty(0)
+        self._rng = np.random.default_rng(seed)
+    
+    def update(self, values):
+        """加入一块数据（NaN会被忽略）"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        n_b = len(values)
+        if n_b == 0:
+            return
+        
+        # 本块的中心矩，再按Pébay公式与已有结果合并
+        mean_b = values.mean()
+        d = values - mean_b
+        d2 = d * d
+        self._merge_moments(n_b, mean_b, d2.sum(), (d2 * d).sum(), (d2 * d2).sum())
+        
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.zero_count += int(np.count_nonzero(np.abs(values) < 1e-10))
+        
+        if self.sample_size > 0:
+            # 给每个值一个随机键，保留键最小的sample_size个值，即无放回的均匀抽样
+            keys = np.concatenate([self._sample_keys, self._rng.random(n_b)])
+            sample = np.concatenate([self.sample, values])
+            if len(sample) > self.sample_size:
+                keep = np.argpartition(keys, self.sample_size)[:self.sample_size]
+                keys, sample = keys[keep], sample[keep]
+            self._sample_keys, self.sample = keys, sample
+    
+    def _merge_moments(self, n_b, mean_b, m2_b, m3_b, m4_b):
+        """合并另一组样本的样本数、均值和中心矩"""
+        n_a = self.count
+        n = n_a + n_b
+        if n_b == 0:
+            return
+        delta = mean_b - self.mean
+        self.m4 += (m4_b + delta ** 4 * n_a * n_b * (n_a * n_a - n_a * n_b + n_b * n_b) / n ** 3
+                    + 6 * delta ** 2 * (n_a * n_a * m2_b + n_b * n_b * self.m2) / n ** 2
+                    + 4 * delta * (n_a * m3_b - n_b * self.m3) / n)
+        self.m3 += (m3_b + delta ** 3 * n_a * n_b * (n_a - n_b) / n ** 2
+                    + 3 * delta * (n_a * m2_b - n_b * self.m2) / n)
+        self.m2 += m2_b + delta ** 2 * n_a * n_b / n
+        self.mean += delta * n_b / n
+        self.count = n
+    
+    def merge(self, other):
+        """合并另一个StreamingColumnStats的统计量（不合并样本）"""
+        self._merge_moments(other.count, other.mean, other.m2, other.m3, other.m4)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.zero_count += other.zero_count
+    
+    @property
+    def std(self):
+        """样本标准差（ddof=1，与pandas一致）"""
+        return np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+    
+    @property
+    def skew(self):
+        """偏度（与scipy.stats.skew的默认参数一致）"""
+        if self.count == 0 or self.m2 == 0:
+            return np.nan
+        return np.sqrt(self.count) * self.m3 / self.m2 ** 1.5
+    
+    @property
+    def kurtosis(self):
+        """超额峰度（与scipy.stats.kurtosis的默认参数一致）"""
+        if self.count == 0 or self.m2 == 0:
+            return np.nan
+        return self.count * self.m4 / self.m2 ** 2 - 3
+    
+    def percentile(self, q):
+        """基于蓄水池样本估计百分位数"""
+        return np.percentile(self.sample, q) if len(self.sample) > 0 else np.nan
+
+
+BATCH_MATRIX_BYTES = 256 * 1024 * 1024  # 批量计算上下限时每块二维矩阵的最大字节数
+
+
+def _count_in_limits(sorted_values, lower, upper):
+    """在排好序的数组上用两次二分查找统计超限个数，结果与布尔掩码的写法一致
+    
+    返回 (超下限数, 超上限数, 起始, 结束)，范围内的数据为 sorted_values[起始:结束]；
+    任一限值为None时范围内为全部数据，限值为NaN时不计入超限也没有范围内数据。
+    """
+    n = len(sorted_values)
+    lower_nan = lower is not None and np.isnan(lower)
+    upper_nan = upper is not None and np.isnan(upper)
+    lower_pos = int(np.searchsorted(sorted_values, lower, side='left')) if lower is not None and not lower_nan else 0
+    upper_pos = int(np.searchsorted(sorted_values, upper, side='right')) if upper is not None and not upper_nan else n
+    below = lower_pos if lower is not None and not lower_nan else 0
+    above = n - upper_pos if upper is not None and not upper_nan else 0
+    if lower is None or upper is None:
+        return below, above, 0, n
+    if lower_nan or upper_nan:
+        return below, above, 0, 0
+    return below, above, lower_pos, max(lower_pos, upper_pos)
+
+
+def _segment_sum(values, offsets):
+    """按文件分段求和，offsets为各文件在列存储中的起止位置，空分段结果为0"""
+    starts = offsets[:-1]
+    nonempty = starts < offsets[1:]
+    dtype = np.int64 if values.dtype == bool else np.float64
+    result = np.zeros(len(starts), dtype=dtype)
+    if nonempty.any():
+        result[nonempty] = np.add.reduceat(values, starts[nonempty], dtype=dtype)
+    return result
+
+
+def _sorted_percentile(sorted_matrix, counts, q):
+    """在按列排好序（NaN在末尾）的二维矩阵上逐列计算百分位数，与np.percentile的线性插值一致"""
+    position = q / 100 * np.maximum(counts - 1, 0)
+    below = np.floor(position).astype(np.int64)
+    above = np.minimum(below + 1, np.maximum(counts - 1, 0))
+    a = np.take_along_axis(sorted_matrix, below[np.newaxis, :], axis=0)[0]
+    b = np.take_along_axis(sorted_matrix, above[np.newaxis, :], axis=0)[0]
+    t = position - below
+    # 与numpy相同的插值写法，t>=0.5时从上端点反向插值
+    diff = b - a
+    result = np.where(t >= 0.5, b - diff * (1 - t), a + diff * t)
+    return np.where(counts > 0, result, np.nan)
+
+
+def _limits_from_matrix(matrix, method, params):
+    """在NaN填充的二维矩阵（每列一个特征项）上一次算出所有列的上下限
+    
+    返回 (下限数组, 上限数组)，规则与DataAnalyzer.calculate_limits相同。
+    """
+    valid = ~np.isnan(matrix)
+    counts = valid.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(valid, matrix, 0).sum(axis=0) / counts
+        d = np.where(valid, matrix - mean, 0)
+        d2 = d * d
+        m2 = d2.sum(axis=0)
+        m3 = (d2 * d).sum(axis=0)
+        skewness = np.where(m2 > 0, np.sqrt(counts) * m3 / m2 ** 1.5, np.nan)
+        std = np.where(counts > 1, np.sqrt(m2 / (counts - 1)), np.nan)
+    
+    # 偏态分布使用非对称的倍数；用户指定了参数时总是使用用户的参数
+    is_skewed = np.abs(skewness) > 0.5
+    right_skewed = skewness > 0
+    
+    def multiplier(name, normal, right, left):
+        if name in params:
+            return np.full(len(counts), params[name], dtype=np.float64)
+        return np.where(is_skewed, np.where(right_skewed, right, left), normal)
+    
+    if method == '3sigma':
+        lower_sigma = multiplier('lower_param', 3.0, 2.5, 3.5)
+        upper_sigma = multiplier('upper_param', 3.0, 3.5, 2.5)
+        return mean - lower_sigma * std, mean + upper_sigma * std
+    
+    sorted_matrix = np.sort(matrix, axis=0)
+    q1 = _sorted_percentile(sorted_matrix, counts, 25)
+    q3 = _sorted_percentile(sorted_matrix, counts, 75)
+    iqr_value = q3 - q1
+    lower_mult = multiplier('lower_multiplier', 1.5, 1.3, 2.0)
+    upper_mult = multiplier('upper_multiplier', 1.5, 2.0, 1.3)
+    return q1 - lower_mult * iqr_value, q3 + upper_mult * iqr_value
+
+
+def _sweep_yield(sorted_values, lowers, uppers):
+    """对一组候选上下限同时计算良率（两次向量化的二分查找），lowers和uppers可以广播"""
+    n = len(sorted_values)
+    if n == 0:
+        return np.full(np.broadcast(lowers, uppers).shape, np.nan)
+    start = np.searchsorted(sorted_values, lowers, side='left')
+    end = np.searchsorted(sorted_values, uppers, side='right')
+    return np.maximum(end - start, 0) / n
+
+
+def _central_limits(sorted_values, tail_count):
+    """两侧各去掉tail_count个数据后的上下限"""
+    n = len(sorted_values)
+    tail_count = min(max(tail_count, 0), (n - 1) // 2)
+    return sorted_values[tail_count], sorted_values[n - 1 - tail_count]
+
+
+def _symmetric_limits(sorted_values, center, min_count):
+    """以center为中心、至少包含min_count个数据的最窄对称上下限，在排序数组上二分查找半宽"""
+    n = len(sorted_values)
+    min_count = min(min_count, n)
+    
+    def count_within(half_width):
+        return (np.searchsorted(sorted_values, center + half_width, side='right') -
+                np.searchsorted(sorted_values, center - half_width, side='left'))
+    
+    low, high = 0.0, max(center - sorted_values[0], sorted_values[-1] - center)
+    # center ± high 可能因舍入没有覆盖最外侧的数据，逐步放宽直到确实包含min_count个数据
+    step = np.spacing(max(abs(center), high))
+    while count_within(high) < min_count:
+        high += step
+        step *= 2
+    for _ in range(200):
+        mid = (low + high) / 2
+        if mid <= low or mid >= high:
+            break
+        if count_within(mid) >= min_count:
+            high = mid
+        else:
+            low = mid
+    # 收缩到实际包含的最外侧数据，保证对称且包含这些数据
+    start = np.searchsorted(sorted_values, center - high, side='left')
+    end = np.searchsorted(sorted_values, center + high, side='right')
+    half_width = max(center - sorted_values[start], sorted_values[end - 1] - center)
+    return min(center - half_width, sorted_values[start]), max(center + half_width, sorted_values[end - 1])
+
+
+# 按字节查表：最高位起第一个为1的位的序号（packbits的位顺序），以及为1的位数
+_FIRST_SET_BIT = np.array([8] + [8 - i.bit_length() for i in range(1, 256)], dtype=np.int64)
+_BIT_COUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+PACKED_CHUNK_ROWS = 65536  # 汇总位矩阵时每次处理的行数
+
+
+def _pack_failures(frame, columns, limits):
+    """逐列向量化比较，把失效结果按位压缩成 (晶粒数, ceil(列数/8)) 的uint8矩阵
+    
+    第j列对应第j//8个字节中从高位起第j%8位。限值为None表示该侧不限制，缺失值视为通过。
+    返回 (位矩阵, 各列失效数)。
+    """
+    n = len(frame)
+    packed = np.zeros((n, (len(columns) + 7) // 8), dtype=np.uint8)
+    fail_counts = np.zeros(len(columns), dtype=np.int64)
+    for j, col in enumerate(columns):
+        if col not in frame.columns:
+            continue
+        values = pd.to_numeric(frame[col], errors='coerce').to_numpy(dtype=np.float64)
+        lower, upper = limits[col]
+        fail = np.zeros(n, dtype=bool)
+        if lower is not None:
+            fail |= values < lower
+        if upper is not None:
+            fail |= values > upper
+        fail_counts[j] = np.count_nonzero(fail)
+        packed[:, j >> 3] |= fail.view(np.uint8) << (7 - (j & 7))
+    return packed, fail_counts
+
+
+def _summarize_packed(packed, n_columns):
+    """从位矩阵统计全部通过数、首次失效列的计数和只在一列失效的晶粒计数"""
+    passed = 0
+    first_fail = np.zeros(n_columns, dtype=np.int64)
+    only_fail = np.zeros(n_columns, dtype=np.int64)
+    for start in range(0, len(packed), PACKED_CHUNK_ROWS):
+        chunk = packed[start:start + PACKED_CHUNK_ROWS]
+        nonzero = chunk != 0
+        failed = nonzero.any(axis=1)
+        passed += len(chunk) - np.count_nonzero(failed)
+        if not failed.any():
+            continue
+        chunk = chunk[failed]
+        first_byte = nonzero[failed].argmax(axis=1)
+        first = first_byte * 8 + _FIRST_SET_BIT[chunk[np.arange(len(chunk)), first_byte]]
+        first_fail += np.bincount(first, minlength=n_columns)
+        single = _BIT_COUNT[chunk].sum(axis=1) == 1
+        only_fail += np.bincount(first[single], minlength=n_columns)
+    return passed, first_fail, only_fail
+
+
+class ColumnProfile:
+    """一列数据的统计概要，一次计算后供分布分析、上下限计算和智能推荐共用
+    
+    参数:
+        values: 该列去除NaN后的数据（流式模式下为蓄水池样本）
+        column_stats: 流式模式下的StreamingColumnStats，提供精确的矩和最值
+        sorted_values: 已排好序的数据，为None时在这里排序
+    """
+    def __init__(self, values, column_stats=None, sorted_values=None):
+        values = np.asarray(values, dtype=np.float64)
+        # 排序一次，最值和所有分位数都从排好序的数组中取得
+        self.sorted_values = np.sort(values) if sorted_values is None else sorted_values
+        
+        if column_stats is not None:
+            self.count = column_stats.count
+            self.mean = column_stats.mean
+            self.std = column_stats.std
+            self.min = column_stats.min
+            self.max = column_stats.max
+            self.skewness = column_stats.skew
+            self.kurtosis = column_stats.kurtosis
+            self.has_zero = column_stats.zero_count > 0
+        else:
+            self.count = len(values)
+            self.min = self.sorted_values[0] if self.count > 0 else np.nan
+            self.max = self.sorted_values[-1] if self.count > 0 else np.nan
+            self.mean = values.mean() if self.count > 0 else np.nan
+            # 二到四阶中心矩，偏度和峰度与scipy.stats的默认参数一致
+            d = values - self.mean
+            d2 = d * d
+            m2 = d2.sum()
+            self.std = np.sqrt(m2 / (self.count - 1)) if self.count > 1 else np.nan
+            if self.count > 0 and m2 > 0:
+                self.skewness = np.sqrt(self.count) * (d2 * d).sum() / m2 ** 1.5
+                self.kurtosis = self.count * (d2 * d2).sum() / m2 ** 2 - 3
+            else:
+                self.skewness = np.nan
+                self.kurtosis = np.nan
+            self.has_zero = bool(np.any(np.abs(values) < 1e-10))
+        
+        self.q1 = self.percentile(25)
+        self.q3 = self.percentile(75)
+        self.iqr = self.q3 - self.q1
+        
+        # 正态性检验、离群值比例和分布类型
+        self.p_value = 1.0
+        self.is_normal = True
+        self.outlier_ratio = 0
+        self.distribution = 'unknown'
+        if self.count >= 10:  # 数据太少时无法可靠分析
+            _, self.p_value = stats.normaltest(values)
+            self.is_normal = self.p_value > 0.05
+            
+            # 检测离群值比例
+            lower_bound = self.q1 - 1.5 * self.iqr
+            upper_bound = self.q3 + 1.5 * self.iqr
+            n_outliers = (np.searchsorted(self.sorted_values, lower_bound, side='left') +
+                          len(values) - np.searchsorted(self.sorted_values, upper_bound, side='right'))
+            self.outlier_ratio = n_outliers / len(values)
+            self.distribution = self._classify(values)
+    
+    def _classify(self, values):
+        """根据正态性检验、偏度和峰度判断分布类型"""
+        distribution = 'normal'
+        if not self.is_normal:
+            if abs(self.skewness) < 0.5:
+                if self.kurtosis > 0.5:
+                    distribution = 't-distribution'
+                elif self.kurtosis < -0.5:
+                    distribution = 'uniform'
+                else:
+                    distribution = 'near-normal'
+            elif self.skewness > 0.5:
+                # 检查是否为对数正态分布
+                if self.min > 0:
+                    try:
+                        _, lognorm_p = stats.normaltest(np.log(values))
+                        if lognorm_p > 0.05:
+                            distribution = 'lognormal'
+                        else:
+                            distribution = 'right-skewed'
+                    except:
+                        distribution = 'right-skewed'
+                else:
+                    distribution = 'right-skewed'
+            elif self.skewness < -0.5:
+                distribution = 'left-skewed'
+        return distribution
+    
+    def percentile(self, q):
+        """计算百分位数（与np.percentile一致）"""
+        return np.percentile(self.sorted_values, q) if len(self.sorted_values) > 0 else np.nan
+    
+    def distribution_info(self):
+        """返回analyze_distribution使用的分布信息字典"""
+        if self.count < 10:
+            return {
+                'distribution': 'unknown',
+                'skewness': 0,
+                'kurtosis': 0,
+                'is_normal': True,
+                'p_value': 1.0,
+                'outlier_ratio': 0
+            }
+        return {
+            'distribution': self.distribution,
+            'skewness': self.skewness,
+            'kurtosis': self.kurtosis,
+            'is_normal': self.is_normal,
+            'p_value': self.p_value,
+            'outlier_ratio': self.outlier_ratio
+        }
+
+
+def _recommend_from_profile(profile, values, strictness='balanced'):
+    """根据列的统计概要选择推荐方法并计算上下限，返回 ((下限, 上限), 方法名)
+    
+    参数:
+        profile: 该列的ColumnProfile
+        values: 该列的数据，对数正态分布时在对数空间中计算
+        strictness: 严格程度，可选值为'strict'(严格)、'balanced'(平衡)、'loose'(宽松)
+    """
+    dist_info = profile.distribution_info()
+    
+    # 检查数据是否包含0点或接近0的值
+    has_zero = profile.has_zero
+    data_range = profile.max - profile.min
+    data_magnitude = max(abs(profile.max), abs(profile.min))
+    
+    # 基本统计量，用于所有方法
+    mean = profile.mean
+    std = profile.std
+    q1 = profile.q1
+    q3 = profile.q3
+    iqr_value = profile.iqr
+    
+    # 根据严格程度设置系数
+    if strictness == 'strict':
+        strict_factor = 0.7  # 严格模式
+        # 对于大数值，使用更严格的控制
+        large_value_factor = 0.5 if data_magnitude > 300 else 0.7
+    elif strictness == 'loose':
+        strict_factor = 1.0  # 宽松模式
+        large_value_factor = 0.8 if data_magnitude > 300 else 1.0
+    else:  # balanced
+        strict_factor = 0.85  # 平衡模式
+        large_value_factor = 0.65 if data_magnitude > 300 else 0.85
+    
+    # 对于大数值，使用相对范围而非绝对范围
+    is_large_value = data_magnitude > 300  # 将大数值定义从100改为300
+    
+    # 根据分布类型选择合适的方法和参数
+    if dist_info['distribution'] == 'normal' or dist_info['distribution'] == 'near-normal':
+        # 正态或接近正态分布，使用3sigma方法
+        if is_large_value:
+            # 对于大数值，使用相对标准差（变异系数）或百分位数
+            if has_zero:
+                # 有0点时使用变异系数
+                cv = std / abs(mean) if mean != 0 else 0.1  # 变异系数
+                # 使用更严格的系数
+                sigma_factor = 2.0 * strict_factor * large_value_factor
+                lower = mean * (1 - sigma_factor * cv)
+                upper = mean * (1 + sigma_factor * cv)
+            else:
+                # 无0点时使用百分位数
+                p_low = 1.0 if strictness == 'strict' else (0.5 if strictness == 'loose' else 0.75)
+                p_high = 99.0 if strictness == 'strict' else (99.5 if strictness == 'loose' else 99.25)
+                lower = profile.percentile(p_low)
+                upper = profile.percentile(p_high)
+            
+            # 确保下限不会变为负数（除非数据本身有负值）
+            if lower < 0 and profile.min >= 0:
+                lower = 0
+        else:
+            # 使用更严格的sigma倍数
+            sigma_factor = 2.5 * strict_factor
+            lower = mean - sigma_factor * std
+            upper = mean + sigma_factor * std
+        
+        return (lower, upper), '3sigma'
+    
+    elif dist_info['distribution'] == 'right-skewed':
+        # 右偏分布
+        if dist_info['outlier_ratio'] > 0.1:
+            # 离群值较多，使用IQR方法
+            # 对于大数值，调整IQR倍数
+            if is_large_value:
+                if has_zero:
+                    # 有0点时使用更严格的控制
+                    lower_mult = 0.5 * strict_factor * large_value_factor
+                    upper_mult = 1.0 * strict_factor * large_value_factor
+                else:
+                    # 无0点时使用百分位数
+                    p_low = 1.0 if strictness == 'strict' else (0.5 if strictness == 'loose' else 0.75)
+                    p_high = 99.0 if strictness == 'strict' else (99.5 if strictness == 'loose' else 99.25)
+                    return (profile.percentile(p_low), profile.percentile(p_high)), 'percentile'
+            else:
+                lower_mult = 1.0 * strict_factor
+                upper_mult = 1.5 * strict_factor
+            
+            lower = q1 - lower_mult * iqr_value
+            upper = q3 + upper_mult * iqr_value
+            
+            # 确保下限不会变为负数（除非数据本身有负值）
+            if lower < 0 and profile.min >= 0:
+                lower = 0
+            
+            return (lower, upper), 'iqr'
+        else:
+            # 离群值较少，使用调整后的3sigma
+            if is_large_value:
+                if has_zero:
+                    # 有0点时使用变异系数
+                    cv = std / abs(mean) if mean != 0 else 0.1
+                    sigma_lower = 1.5 * strict_factor * large_value_factor
+                    sigma_upper = 2.0 * strict_factor * large_value_factor
+                    lower = mean * (1 - sigma_lower * cv)
+                    upper = mean * (1 + sigma_upper * cv)
+                else:
+                    # 无0点时使用百分位数
+                    p_low = 1.0 if strictness == 'strict' else (0.5 if strictness == 'loose' else 0.75)
+                    p_high = 99.0 if strictness == 'strict' else (99.5 if strictness == 'loose' else 99.25)
+                    lower = profile.percentile(p_low)
+                    upper = profile.percentile(p_high)
+                
+                # 确保下限不会变为负数（除非数据本身有负值）
+                if lower < 0 and profile.min >= 0:
+                    lower = 0
+            else:
+                lower = mean - 2.0 * std * strict_factor
+                upper = mean + 2.5 * std * strict_factor
+            
+            return (lower, upper), '3sigma'
+    
+    elif dist_info['distribution'] == 'left-skewed':
+        # 左偏分布
+        if dist_info['outlier_ratio'] > 0.1:
+            # 离群值较多，使用IQR方法
+            if is_large_value:
+                if has_zero:
+                    # 有0点时使用更严格的控制
+                    lower_mult = 1.0 * strict_factor * large_value_factor
+                    upper_mult = 0.5 * strict_factor * large_value_factor
+                else:
+                    # 无0点时使用百分位数
+                    p_low = 1.0 if strictness == 'strict' else (0.5 if strictness == 'loose' else 0.75)
+                    p_high = 99.0 if strictness == 'strict' else (99.5 if strictness == 'loose' else 99.25)
+                    return (profile.percentile(p_low), profile.percentile(p_high)), 'percentile'
+            else:
+                lower_mult = 1.5 * strict_factor
+                upper_mult = 1.0 * strict_factor
+            
+            lower = q1 - lower_mult * iqr_value
+            upper = q3 + upper_mult * iqr_value
+            
+            # 确保下限不会变为负数（除非数据本身有负值）
+            if lower < 0 and profile.min >= 0:
+                lower = 0
+            
+            return (lower, upper), 'iqr'
+        else:
+            # 离群值较少，使用调整后的3sigma
+            if is_large_value:
+                if has_zero:
+                    # 有0点时使用变异系数
+                    cv = std / abs(mean) if mean != 0 else 0.1
+                    sigma_lower = 2.0 * strict_factor * large_value_factor
+                    sigma_upper = 1.5 * strict_factor * large_value_factor
+                    lower = mean * (1 - sigma_lower * cv)
+                    upper = mean * (1 + sigma_upper * cv)
+                else:
+                    # 无0点时使用百分位数
+                    p_low = 1.0 if strictness == 'strict' else (0.5 if strictness == 'loose' else 0.75)
+                    p_high = 99.0 if strictness == 'strict' else (99.5 if strictness == 'loose' else 99.25)
+                    lower = profile.percentile(p_low)
+                    upper = profile.percentile(p_high)
+                
+                # 确保下限不会变为负数（除非数据本身有负值）
+                if lower < 0 and profile.min >= 0:
+                    lower = 0
+            else:
+                lower = mean - 2.5 * std * strict_factor
+                upper = mean + 2.0 * std * strict_factor
+            
+            return (lower, upper), '3sigma'
+    
+    elif dist_info['distribution'] == 'lognormal':
+        # 对数正态分布，在对数空间中使用3sigma，然后转换回原始空间
+        # 确保所有值都为正
+        if profile.min <= 0:
+            # 如果有非正值，使用IQR方法
+            lower = max(0, q1 - 1.2 * iqr_value * strict_factor)  # 确保下限不小于0
+            upper = q3 + 1.2 * iqr_value * strict_factor
+            return (lower, upper), 'iqr'
+        else:
+            # 对于大数值，使用百分位数
+            if is_large_value:
+                p_low = 1.0 if strictness == 'strict' else (0.5 if strictness == 'loose' else 0.75)
+                p_high = 99.0 if strictness == 'strict' else (99.5 if strictness == 'loose' else 99.25)
+                return (profile.percentile(p_low), profile.percentile(p_high)), 'percentile'
+            else:
+                # 在对数空间中使用sigma
+                log_sigma = 2.0 * strict_factor
+                log_data = np.log(values)
+                log_mean = log_data.mean()
+                log_std = log_data.std(ddof=1)
+                log_lower = log_mean - log_sigma * log_std
+                log_upper = log_mean + log_sigma * log_std
+                return (np.exp(log_lower), np.exp(log_upper)), 'lognormal'
+    
+    elif dist_info['distribution'] == 't-distribution':
+        # t分布，使用分位数方法
+        if strictness == 'strict':
+            p_low, p_high = 2.5, 97.5
+        elif strictness == 'loose':
+            p_low, p_high = 0.5, 99.5
+        else:  # balanced
+            p_low, p_high = 1.0, 99.0
+        
+        # 对于大数值，使用更严格的分位数
+        if is_large_value:
+            p_low = p_low * 2 if p_low < 5 else p_low
+            p_high = 100 - (100 - p_high) * 2 if p_high > 95 else p_high
+        
+        lower = profile.percentile(p_low)
+        upper = profile.percentile(p_high)
+        
+        # 确保下限不会变为负数（除非数据本身有负值）
+        if lower < 0 and profile.min >= 0:
+            lower = 0
+        
+        return (lower, upper), 'percentile'
+    
+    elif dist_info['distribution'] == 'uniform':
+        # 均匀分布，使用扩展的最小/最大值，但对大数值进行调整
+        min_val = profile.min
+        max_val = profile.max
+        range_val = max_val - min_val
+        
+        # 对于大数值，使用更小的扩展比例或直接使用分位数
+        if is_large_value:
+            if strictness == 'strict':
+                p_low, p_high = 2.5, 97.5
+            elif strictness == 'loose':
+                p_low, p_high = 0.5, 99.5
+            else:  # balanced
+                p_low, p_high = 1.0, 99.0
+            
+            lower = profile.percentile(p_low)
+            upper = profile.percentile(p_high)
+        else:
+            # 根据严格程度调整扩展比例
+            if strictness == 'strict':
+                extension = 0.01 * strict_factor
+            elif strictness == 'loose':
+                extension = 0.05 * strict_factor
+            else:  # balanced
+                extension = 0.03 * strict_factor
+            
+            lower = min_val - extension * range_val
+            upper = max_val + extension * range_val
+        
+        # 确保下限不会变为负数（除非数据本身有负值）
+        if lower < 0 and min_val >= 0:
+            lower = 0
+        
+        return (lower, upper), 'range'
+    
+    else:
+        # 未知分布，使用IQR方法（较为稳健），但对大数值进行调整
+        if is_large_value:
+            # 对于大数值，使用分位数
+            if strictness == 'strict':
+                p_low, p_high = 2.5, 97.5
+            elif strictness == 'loose':
+                p_low, p_high = 0.5, 99.5
+            else:  # balanced
+                p_low, p_high = 1.0, 99.0
+            
+            lower = profile.percentile(p_low)
+            upper = profile.percentile(p_high)
+        else:
+            # 根据严格程度调整IQR倍数
+            if strictness == 'strict':
+                mult = 0.8 * strict_factor
+            elif strictness == 'loose':
+                mult = 1.5 * strict_factor
+            else:  # balanced
+                mult = 1.2 * strict_factor
+            
+            lower = q1 - mult * iqr_value
+            upper = q3 + mult * iqr_value
+        
+        # 确保下限不会变为负数（除非数据本身有负值）
+        if lower < 0 and profile.min >= 0:
+            lower = 0
+        
+        return (lower, upper), 'iqr'
+
+
+def _smart_recommend_worker(values_name, sorted_name, total, dtype, tasks, strictness):
+    """子进程中为一组列计算ColumnProfile和推荐上下限
+    
+    各列数据从共享内存中按(起始, 结束)位置读取，排好序的数据写回另一块共享内存，
+    返回的ColumnProfile不带sorted_values，避免在进程间传递数据。
+    """
+    values_shm = shared_memory.SharedMemory(name=values_name)
+    sorted_shm = shared_memory.SharedMemory(name=sorted_name)
+    try:
+        all_values = np.ndarray((total,), dtype=dtype, buffer=values_shm.buf)
+        all_sorted = np.ndarray((total,), dtype=np.float64, buffer=sorted_shm.buf)
+        results = []
+        for col, start, end in tasks:
+            begin = time.perf_counter()
+            values = all_values[start:end]
+            profile = ColumnProfile(values)
+            recommendation = _recommend_from_profile(profile, values, strictness)
+            all_sorted[start:end] = profile.sorted_values
+            profile.sorted_values = None
+            results.append((col, recommendation, profile, time.perf_counter() - begin))
+        return results
+    finally:
+        # 关闭共享内存前释放所有指向它的数组
+        values = all_values = all_sorted = None
+        values_shm.close()
+        sorted_shm.close()
+
+
+HISTOGRAM_CHUNK_ROWS = 1 << 20  # 分箱计数时每块的行数
+
+
+def _right_closed_counts(values, bins, sorted_values=None, chunk_rows=HISTOGRAM_CHUNK_ROWS):
+    """按右闭区间 (bins[i], bins[i+1]] 统计频数，结果与 pd.cut(values, bins).value_counts().sort_index() 相同
+    
+    等于最左端边界的值、超出范围的值和NaN不计入，没有数据的区间频数为0。不生成区间标签。
+    传入排好序的数据时每个边界只需一次二分查找；否则分块计算每个值所在的区间后用bincount计数，
+    等宽分箱直接由 (x - bins[0]) / 宽度 得到区间号，再与边界比较修正浮点误差。
+    """
+    bins = np.asarray(bins, dtype=np.float64)
+    if len(bins) < 2 or np.any(np.diff(bins) <= 0):
+        raise ValueError("分箱边界必须严格递增")
+    if sorted_values is not None:
+        return np.diff(np.searchsorted(sorted_values, bins, side='right'))
+    
+    n_edges = len(bins)
+    width = (bins[-1] - bins[0]) / (n_edges - 1)
+    uniform = np.allclose(np.diff(bins), width, rtol=1e-9, atol=0)
+    # 两端补上正负无穷，区间号i满足 padded[i] < x <= padded[i + 1]，即 searchsorted(bins, x, 'left')
+    padded = np.concatenate(([-np.inf], bins, [np.inf]))
+    counts = np.zeros(n_edges + 1, dtype=np.int64)
+    for start in range(0, len(values), chunk_rows):
+        chunk = np.asarray(values[start:start + chunk_rows], dtype=np.float64)
+        if uniform:
+            # fmax/fmin把NaN变为0，落在不计入的第0个区间
+            index = np.fmin(np.fmax(np.ceil((chunk - bins[0]) / width), 0), n_edges).astype(np.intp)
+            index -= (chunk <= padded[index]) & (index > 0)
+            index += chunk > padded[index + 1]
+        else:
+            index = np.searchsorted(bins, chunk, side='left')
+        counts += np.bincount(index, minlength=n_edges + 1)
+    return counts[1:n_edges]
+
+
+def _histogram_page_spec(col, data, lower=None, upper=None):
+    """计算一个特征项分布图页面需要的全部内容
+    
+    直方图用np.histogram预先统计，返回区间边界、频数和右侧统计信息文本，
+    绘图时只需画柱状图，不再传入原始数据。
+    """
+    data = np.asarray(data, dtype=np.float64)
+    spec = {'column': col, 'lower': lower, 'upper': upper, 'empty': len(data) == 0}
+    if spec['empty']:
+        return spec
+    
+    # 处理离群值并计算更合适的直方图区间
+    try:
+        # 使用四分位范围(IQR)检测离群值
+        q1, q3 = np.percentile(data, [25, 75])
+        iqr_value = q3 - q1
+        
+        # 定义离群值边界 (一般用1.5倍IQR)
+        lower_bound = q1 - 1.5 * iqr_value
+        upper_bound = q3 + 1.5 * iqr_value
+        main_count = np.count_nonzero((data >= lower_bound) & (data <= upper_bound))
+        
+        # 如果过滤掉超过10%的数据，尝试使用更宽松的边界
+        if main_count < len(data) * 0.9:
+            lower_bound = q1 - 3 * iqr_value
+            upper_bound = q3 + 3 * iqr_value
+            main_count = np.count_nonzero((data >= lower_bound) & (data <= upper_bound))
+            
+            # 如果还是过滤掉太多数据，则使用1%和99%分位数作为边界
+            if main_count < len(data) * 0.8:
+                lower_bound, upper_bound = np.percentile(data, [1, 99])
+        
+        # 确保边界包含上下限值（如果有设置）
+        if lower is not None:
+            lower_bound = min(lower_bound, lower)
+        if upper is not None:
+            upper_bound = max(upper_bound, upper)
+        
+        min_val = lower_bound
+        max_val = upper_bound
+        # 如果数据范围很小，调整间距
+        if max_val - min_val < 1e-10:
+            mean_val = np.mean(data)
+            min_val = mean_val - 1
+            max_val = mean_val + 1
+        
+        # 根据数据量自动调整bin数量
+        if len(data) < 100:
+            n_bins = 10
+        elif len(data) < 1000:
+            n_bins = 20
+        else:
+            n_bins = 30
+        bins = np.linspace(min_val, max_val, n_bins + 1)
+        
+        # 记录离群值的信息
+        n_outliers = np.count_nonzero((data < lower_bound) | (data > upper_bound))
+        outlier_info = f"离群值: {n_outliers}个 ({n_outliers/len(data)*100:.2f}%)" if n_outliers > 0 else ""
+    except Exception:
+        # 如果出错就使用默认设置
+        bins = 20
+        outlier_info = ""
+    spec['counts'], spec['bins'] = np.histogram(data, bins=bins)
+    
+    # 计算正态性检验结果
+    try:
+        _, p_value = stats.normaltest(data)
+    except Exception:
+        p_value = np.nan
+    is_normal = p_value > 0.05
+    normality_text = "符合正态分布" if is_normal else "不符合正态分布"
+    
+    # 如果不符合正态分布，尝试识别可能的分布类型
+    distribution_type = ""
+    if not is_normal:
+        try:
+            skewness = stats.skew(data)
+            kurtosis = stats.kurtosis(data)
+            
+            # 对数正态分布检验，要求数据全部为正
+            if np.all(data > 0):
+                _, lognorm_p = stats.normaltest(np.log(data))
+                if lognorm_p > 0.05:
+                    distribution_type = "可能符合对数正态分布"
+            
+            # 根据偏度和峰度判断
+            if not distribution_type:
+                if abs(skewness) < 0.5:
+                    if kurtosis > 0.5:
+                        distribution_type = "可能符合t分布"
+                    elif kurtosis < -0.5:
+                        distribution_type = "可能符合均匀分布"
+                    else:
+                        distribution_type = "接近正态但有偏差"
+                elif skewness > 0.5:
+                    distribution_type = "右偏分布(可能为指数族分布)"
+                elif skewness < -0.5:
+                    distribution_type = "左偏分布"
+        except Exception:
+            distribution_type = "无法确定分布类型"
+    
+    # 统计信息
+    info_text = f"总样本数: {len(data)}\n"
+    info_text += f"平均值: {np.mean(data):.4f}\n"
+    info_text += f"标准差: {np.std(data):.4f}\n"
+    info_text += f"中位数: {np.median(data):.4f}\n"
+    info_text += f"最小值: {np.min(data):.4f}\n"
+    info_text += f"最大值: {np.max(data):.4f}\n\n"
+    info_text += f"正态性检验: {normality_text}\n(p={p_value:.4f})\n"
+    if not is_normal and distribution_type:
+        info_text += f"分布类型: {distribution_type}\n"
+    if outlier_info:
+        info_text += f"\n{outlier_info}\n"
+    if lower is not None and upper is not None:
+        valid_count = np.count_nonzero((data >= lower) & (data <= upper))
+        below_count = np.count_nonzero(data < lower)
+        above_count = np.count_nonzero(data > upper)
+        
+        info_text += f"\n范围内样本数: {valid_count}\n({valid_count/len(data)*100:.2f}%)\n"
+        info_text += f"低于下限样本数: {below_count}\n({below_count/len(data)*100:.2f}%)\n"
+        info_text += f"高于上限样本数: {above_count}\n({above_count/len(data)*100:.2f}%)\n"
+        info_text += f"\n下限值: {lower:.4f}\n"
+        info_text += f"上限值: {upper:.4f}\n"
+    spec['info_text'] = info_text
+    return spec
+
+
+def _histogram_page_worker(values_name, total, dtype, tasks):
+    """子进程中为一组列计算分布图页面内容，各列数据从共享内存中按(起始, 结束)位置读取"""
+    values_shm = shared_memory.SharedMemory(name=values_name)
+    try:
+        all_values = np.ndarray((total,), dtype=dtype, buffer=values_shm.buf)
+        results = []
+        for col, start, end, lower, upper in tasks:
+            try:
+                results.append(_histogram_page_spec(col, all_values[start:end], lower, upper))
+            except Exception as e:
+                results.append({'column': col, 'lower': lower, 'upper': upper, 'empty': True, 'error': str(e)})
+        return results
+    finally:
+        all_values = None
+        values_shm.close()
+
+
+MAHALANOBIS_CHUNK_ROWS = 262144  # 分块计算马氏距离时每块的行数
+
+
+def mahalanobis_fit(data, regularization=1e-6, chunk_rows=MAHALANOBIS_CHUNK_ROWS):
+    """分块计算均值向量和加上正则项后协方差矩阵的Cholesky分解，返回 (均值向量, 下三角矩阵L)，cov = L L^T"""
+    data = np.asarray(data, dtype=np.float64)
+    n_rows, n_features = data.shape
+    mean_vec = data.mean(axis=0)
+    
+    # 分块累加离差矩阵，避免np.cov复制整个数据矩阵
+    scatter = np.zeros((n_features, n_features))
+    for start in range(0, n_rows, chunk_rows):
+        diff = data[start:start + chunk_rows] - mean_vec
+        scatter += diff.T @ diff
+    cov_mat = scatter / (n_rows - 1) + regularization * np.eye(n_features)
+    return mean_vec, np.linalg.cholesky(cov_mat)
+
+
+def _whitened_norms(data, mean_vec, whitening, chunk_rows=MAHALANOBIS_CHUNK_ROWS):
+    """分块计算每行的 ||(x - mean) W|| """
+    distances = np.empty(len(data))
+    for start in range(0, len(data), chunk_rows):
+        y = (np.asarray(data[start:start + chunk_rows], dtype=np.float64) - mean_vec) @ whitening
+        distances[start:start + chunk_rows] = np.sqrt(np.einsum('ij,ij->i', y, y))
+    return distances
+
+
+def mahalanobis_distances(data, regularization=1e-6, chunk_rows=MAHALANOBIS_CHUNK_ROWS):
+    """计算每行到均值向量的马氏距离
+    
+    协方差矩阵加上正则项后做Cholesky分解 cov = L L^T，解三角方程得到白化矩阵 W = L^-1，
+    每块数据的距离为 ||(x - mean) W^T|| ，只需一次矩阵乘法，不需要对协方差矩阵求逆。
+    均值、协方差和距离都按块计算，临时内存只有 chunk_rows × 特征数 大小。
+    """
+    mean_vec, chol = mahalanobis_fit(data, regularization, chunk_rows)
+    whitening = solve_triangular(chol, np.eye(len(mean_vec)), lower=True).T
+    return _whitened_norms(data, mean_vec, whitening, chunk_rows)
+
+
+def mahalanobis_inliers(data, threshold=0.99, chunk_rows=MAHALANOBIS_CHUNK_ROWS):
+    """返回马氏距离不超过卡方分布阈值的行号，threshold为置信度"""
+    distances = mahalanobis_distances(data, chunk_rows=chunk_rows)
+    cutoff = np.sqrt(stats.chi2.ppf(threshold, np.shape(data)[1]))
+    return np.where(distances <= cutoff)[0]
+
+
+PCA_EXACT_MAX_FEATURES = 500  # 特征数不超过该值时直接分解协方差矩阵，否则用随机化方法只求前几个主成分
+PCA_CHUNK_ELEMENTS = 4 * 1024 ** 2  # 降维计算时每块数据的最大元素数，特征很多时相应减少每块的行数
+
+
+def _pca_chunk_rows(chunk_rows, n_features):
+    return max(1, min(chunk_rows, PCA_CHUNK_ELEMENTS // max(n_features, 1)))
+
+
+PCA_MAX_ITER = 20  # 随机化方法最多的幂迭代次数，仍未收敛时改为直接分解
+PCA_RESIDUAL_TOL = 1e-4  # 主成分收敛判据：||S u - λ u|| / λ 的上限，降维后距离的相对误差与之相当
+
+
+def _pca_components(data, mean_vec, n_components, chunk_rows=MAHALANOBIS_CHUNK_ROWS, n_oversamples=None,
+                    max_iter=PCA_MAX_ITER, tol=PCA_RESIDUAL_TOL, random_state=0):
+    """分块求协方差矩阵的前n_components个特征值和特征向量，返回 (特征向量矩阵 d×k, 特征值)，特征值从大到小
+    
+    特征数较多时不构造 d×d 的协方差矩阵，用随机化幂迭代（Halko等的随机化SVD）：
+    每次遍历数据计算 S Q = Σ (X - mean)^T ((X - mean) Q)，只需要 d×(k+n_oversamples) 的内存。
+    随机化方法的精度取决于第k个与第k+n_oversamples个特征值之间的差距：前几个主成分占主导的数据
+    几次迭代即可收敛；标准化后的参数测试数据特征值往往很平坦，幂迭代收敛很慢，得到的主成分与
+    精确结果差别很大。因此每次迭代检查各主成分的残差 ||S u - λ u|| / λ，全部不超过tol时停止；
+    按收敛速度估计max_iter次内无法收敛时改为直接分解协方差矩阵（结果精确，但需要 d×d 内存和 O(n d^2) 的计算）。
+    """
+    n_rows, n_features = data.shape
+    n_components = min(n_components, n_features)
+    chunk_rows = _pca_chunk_rows(chunk_rows, n_features)
+    if n_oversamples is None:
+        n_oversamples = max(10, n_components)
+    
+    def exact_components():
+        scatter = np.zeros((n_features, n_features))
+        for start in range(0, n_rows, chunk_rows):
+            diff = data[start:start + chunk_rows] - mean_vec
+            scatter += diff.T @ diff
+        variances, vectors = np.linalg.eigh(scatter / (n_rows - 1))
+        order = np.argsort(variances)[::-1][:n_components]
+        return vectors[:, order], variances[order]
+    
+    if n_features <= PCA_EXACT_MAX_FEATURES or n_components + n_oversamples >= n_features:
+        return exact_components()
+    
+    def scatter_product(basis):
+        # (X - 1 mean^T)^T (X - 1 mean^T) B = X^T Z - mean (1^T Z)，Z = X B - 1 (mean^T B)，不复制数据块
+        result = np.zeros_like(basis)
+        shift = mean_vec @ basis
+        for start in range(0, n_rows, chunk_rows):
+            chunk = data[start:start + chunk_rows]
+            z = chunk @ basis - shift
+            result += chunk.T @ z - np.outer(mean_vec, z.sum(axis=0))
+        return result
+    
+    rng = np.random.default_rng(random_state)
+    basis, _ = np.linalg.qr(scatter_product(rng.normal(size=(n_features, n_components + n_oversamples))))
+    for iteration in range(max_iter):
+        # 子空间内的小矩阵 Q^T S Q 做特征分解得到近似主成分，残差直接由 S Q 算出，不需要额外遍历数据
+        product = scatter_product(basis)
+        ritz_values, vectors = np.linalg.eigh(basis.T @ product)
+        order = np.argsort(ritz_values)[::-1]
+        eigenvalues, vectors = ritz_values[order[:n_components]], vectors[:, order[:n_components]]
+        residual = np.linalg.norm(product @ vectors - (basis @ vectors) * eigenvalues, axis=0)
+        relative = np.max(residual / np.maximum(eigenvalues, np.finfo(np.float64).tiny))
+        if relative <= tol:
+            return basis @ vectors, eigenvalues / (n_rows - 1)
+        
+        # 残差大约按 (λ_{k+p} / λ_k) 的比例逐次减小，剩余的迭代次数不够时提前改为直接分解
+        ratio = ritz_values[order[-1]] / eigenvalues[-1] if eigenvalues[-1] > 0 else 1.0
+        if iteration > 0 and (ratio >= 1 or np.log(tol / relative) / np.log(ratio) > max_iter - iteration - 1):
+            break
+        basis, _ = np.linalg.qr(product)
+    
+    print("随机化主成分收敛太慢（特征值分布平坦），改为直接分解协方差矩阵")
+    return exact_components()
+
+
+def pca_mahalanobis_fit(data, n_components=None, chunk_rows=MAHALANOBIS_CHUNK_ROWS, random_state=0):
+    """主成分降维后的马氏距离模型，返回 (均值向量, 白化投影矩阵 d×k)
+    
+    n_components为保留的主成分数，None表示全部。方差接近0的主成分（相关性很强的测试项造成的奇异方向）
+    会被去掉，因此不需要给协方差矩阵加正则项。投影矩阵的列为 主成分 / sqrt(方差)，
+    降维空间中的距离 ||(x - mean) P|| 服从自由度为k的卡方分布。
+    """
+    data = np.asarray(data, dtype=np.float64)
+    mean_vec = data.mean(axis=0)
+    components, variances = _pca_components(data, mean_vec, n_components or data.shape[1], chunk_rows,
+                                            random_state=random_state)
+    keep = variances > variances.max(initial=0.0) * data.shape[1] * np.finfo(np.float64).eps
+    return mean_vec, components[:, keep] / np.sqrt(variances[keep])
+
+
+def pca_mahalanobis_distances(data, n_components=None, chunk_rows=MAHALANOBIS_CHUNK_ROWS):
+    """降维空间中每行的马氏距离，返回 (距离, 实际保留的主成分数)"""
+    mean_vec, projection = pca_mahalanobis_fit(data, n_components, chunk_rows)
+    distances = _whitened_norms(data, mean_vec, projection, _pca_chunk_rows(chunk_rows, len(mean_vec)))
+    return distances, projection.shape[1]
+
+
+def pca_mahalanobis_inliers(data, n_components=None, threshold=0.99, chunk_rows=MAHALANOBIS_CHUNK_ROWS):
+    """返回降维空间中马氏距离不超过卡方分布阈值的行号，threshold为置信度"""
+    distances, k = pca_mahalanobis_distances(data, n_components, chunk_rows)
+    if k == 0:
+        return np.arange(len(distances))
+    cutoff = np.sqrt(stats.chi2.ppf(threshold, k))
+    return np.where(distances <= cutoff)[0]
+
+
+DBSCAN_SAMPLE_SIZE = 200000  # DBSCAN拟合时最多使用的颗粒数，超过时随机抽样
+DBSCAN_MEMORY_MB = 512  # DBSCAN分块查询时的内存上限
+DBSCAN_GRAPH_NEIGHBORS = 10  # 核心点连通时每个核心点最多连接的近邻数
+
+
+def dbscan_labels(data, eps=0.5, min_samples=5, sample_size=DBSCAN_SAMPLE_SIZE, max_memory_mb=DBSCAN_MEMORY_MB,
+                  n_jobs=None, algorithm='kd_tree', random_state=0, return_cores=False):
+    """标准化后做DBSCAN密度聚类，返回 (每行的簇标签, 计时信息)，标签-1为噪声点
+    
+    不保存每个点的全部eps邻域，内存只与样本数和分块行数有关：
+    1. 颗粒数超过sample_size时随机抽样，在样本上建立KD树（或球树）；
+    2. 用k近邻判断核心点：样本中第min_samples近的点（含自身）不超过eps的一定是核心点，
+       其余样本点再分块查询全部数据，统计eps范围内的实际邻居数；
+    3. 核心点之间按距离不超过eps的近邻连通划分成簇；
+    4. 分块为每颗晶粒查找最近的核心点，距离不超过eps时归入该簇，否则为噪声。
+    不抽样时噪声点的判定与DBSCAN完全相同；抽样时未被抽中的核心点不参与判定，稀疏区域是近似的。
+    n_jobs为近邻查询使用的线程数。return_cores为True时再返回标准化参数和核心点，
+    {'mean', 'scale', 'core_samples'(标准化后), 'core_labels', 'eps', 'algorithm'}，可用于判定新数据。
+    """
+    start_time = time.perf_counter()
+    data = np.asarray(data, dtype=np.float64)
+    n_rows, n_features = data.shape
+    # 每块的临时内存：标准化后的数据、近邻距离和序号
+    chunk_rows = int(max(1000, max_memory_mb * 1024 ** 2 // (8 * (2 * n_features + 4 * DBSCAN_GRAPH_NEIGHBORS))))
+    
+    # 分块计算标准化参数（与StandardScaler相同，标准差为0的特征不缩放）
+    mean_vec = data.mean(axis=0)
+    sum_sq = np.zeros(n_features)
+    for start in range(0, n_rows, chunk_rows):
+        sum_sq += ((data[start:start + chunk_rows] - mean_vec) ** 2).sum(axis=0)
+    scale = np.sqrt(sum_sq / max(n_rows, 1))
+    scale[scale == 0] = 1.0
+    
+    def scaled(rows):
+        return (data[rows] - mean_vec) / scale
+    
+    sampled = n_rows > sample_size
+    sample_rows = np.sort(np.random.default_rng(random_state).choice(n_rows, size=sample_size, replace=False)) \
+        if sampled else np.arange(n_rows)
+    sample = scaled(sample_rows)
+    info = {'mode': 'sampled' if sampled else 'exact', 'rows': n_rows, 'sample_size': len(sample), 'chunk_rows': chunk_rows}
+    
+    # 样本内的k近邻：第min_samples近的点不超过eps即为核心点
+    fit_start = time.perf_counter()
+    n_neighbors = min(max(min_samples, DBSCAN_GRAPH_NEIGHBORS), len(sample))
+    sample_index = NearestNeighbors(algorithm=algorithm, n_jobs=n_jobs).fit(sample)
+    knn_dist = np.empty((len(sample), n_neighbors))
+    knn_ind = np.empty((len(sample), n_neighbors), dtype=np.int64)
+    for start in range(0, len(sample), chunk_rows):
+        knn_dist[start:start + chunk_rows], knn_ind[start:start + chunk_rows] = sample_index.kneighbors(
+            sample[start:start + chunk_rows], n_neighbors=n_neighbors)
+    is_core = knn_dist[:, min_samples - 1] <= eps if min_samples <= n_neighbors else np.zeros(len(sample), dtype=bool)
+    
+    # 抽样时，样本内邻居不足的点再统计其在全部数据中的邻居数
+    uncertain = np.flatnonzero(~is_core)
+    if sampled and len(uncertain):
+        uncertain_index = NearestNeighbors(radius=eps, algorithm=algorithm, n_jobs=n_jobs).fit(sample[uncertain])
+        counts = np.zeros(len(uncertain), dtype=np.int64)
+        for start in range(0, n_rows, chunk_rows):
+            indices = uncertain_index.radius_neighbors(scaled(slice(start, start + chunk_rows)), return_distance=False)
+            counts += np.bincount(np.concatenate(indices), minlength=len(uncertain)) if len(indices) else 0
+        is_core[uncertain[counts >= min_samples]] = True
+    info['core_points'] = int(np.count_nonzero(is_core))
+    if not is_core.any():
+        info['fit_seconds'] = time.perf_counter() - fit_start
+        info['total_seconds'] = time.perf_counter() - start_time
+        labels = np.full(n_rows, -1, dtype=np.int64)
+        if return_cores:
+            cores = {'mean': mean_vec, 'scale': scale, 'core_samples': np.empty((0, n_features)),
+                     'core_labels': np.empty(0, dtype=np.int64), 'eps': eps, 'algorithm': algorithm}
+            return labels, info, cores
+        return labels, info
+    
+    # 核心点之间按eps以内的近邻连通
+    core_ids = np.full(len(sample), -1, dtype=np.int64)
+    core_ids[is_core] = np.arange(info['core_points'])
+    edges = is_core[:, None] & is_core[knn_ind] & (knn_dist <= eps)
+    rows, cols = np.nonzero(edges)
+    graph = csr_matrix((np.ones(len(rows), dtype=np.int8), (core_ids[rows], core_ids[knn_ind[rows, cols]])),
+                       shape=(info['core_points'], info['core_points']))
+    _, core_labels = connected_components(graph, directed=False)
+    knn_dist = knn_ind = None
+    info['fit_seconds'] = time.perf_counter() - fit_start
+    
+    # 按最近的核心点分配簇标签
+    label_start = time.perf_counter()
+    core_index = NearestNeighbors(algorithm=algorithm, n_jobs=n_jobs).fit(sample[is_core])
+    labels = np.empty(n_rows, dtype=np.int64)
+    for start in range(0, n_rows, chunk_rows):
+        distance, nearest = core_index.kneighbors(scaled(slice(start, start + chunk_rows)), n_neighbors=1)
+        labels[start:start + chunk_rows] = np.where(distance[:, 0] <= eps, core_labels[nearest[:, 0]], -1)
+    info['label_seconds'] = time.perf_counter() - label_start
+    info['total_seconds'] = time.perf_counter() - start_time
+    if return_cores:
+        cores = {'mean': mean_vec, 'scale': scale, 'core_samples': sample[is_core], 'core_labels': core_labels,
+                 'eps': eps, 'algorithm': algorithm}
+        return labels, info, cores
+    return labels, info
+
+
+ISOLATION_FOREST_CHUNK_ROWS = 131072  # 分块计算异常分数时每块的行数
+ISOLATION_FOREST_CACHE_SIZE = 4  # 最多缓存的已拟合模型数
+_isolation_forest_cache = OrderedDict()  # (数据标识, 树数量, 随机种子) -> (模型, 每行的异常分数)
+
+
+def _matrix_hash(data):
+    """数据矩阵内容的哈希，用作模型缓存的键"""
+    data = np.ascontiguousarray(data)
+    digest = hashlib.sha1(f"{data.shape}{data.dtype.str}".encode('utf-8'))
+    digest.update(memoryview(data).cast('B'))
+    return digest.hexdigest()
+
+
+def _score_in_chunks(score_func, data, n_jobs=None, chunk_rows=ISOLATION_FOREST_CHUNK_ROWS):
+    """分块调用score_func计算每行的分数，n_jobs大于1时多个线程同时计算不同的块"""
+    chunks = [slice(start, start + chunk_rows) for start in range(0, len(data), chunk_rows)]
+    if n_jobs and n_jobs > 1 and len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            parts = list(executor.map(lambda rows: score_func(data[rows]), chunks))
+    else:
+        parts = [score_func(data[rows]) for rows in chunks]
+    return np.concatenate(parts) if parts else np.empty(0)
+
+
+def isolation_forest_scores(data, n_estimators=100, random_state=42, n_jobs=None,
+                            chunk_rows=ISOLATION_FOREST_CHUNK_ROWS, cache_key=None):
+    """拟合IsolationForest，返回 (模型, 每行的score_samples异常分数，越小越异常)
+    
+    结果按cache_key缓存（如DataAnalyzer.feature_matrix_key），同一数据再次调用时不重新拟合和打分；
+    没有cache_key时才对整个矩阵计算哈希作为键。拟合时各棵树由n_jobs个线程并行构建，打分分块并行。
+    """
+    key = (cache_key if cache_key is not None else _matrix_hash(data), n_estimators, random_state)
+    if key in _isolation_forest_cache:
+        _isolation_forest_cache.move_to_end(key)
+        return _isolation_forest_cache[key]
+    
+    model = IsolationForest(n_estimators=n_estimators, random_state=random_state, n_jobs=n_jobs).fit(data)
+    scores = _score_in_chunks(model.score_samples, data, n_jobs, chunk_rows)
+    _isolation_forest_cache[key] = (model, scores)
+    while len(_isolation_forest_cache) > ISOLATION_FOREST_CACHE_SIZE:
+        _isolation_forest_cache.popitem(last=False)
+    return model, scores
+
+
+def isolation_forest_inliers(data, contamination=0.05, n_estimators=100, random_state=42, n_jobs=None,
+                             cache_key=None):
+    """返回Isolation Forest判定为正常的行号
+    
+    与 IsolationForest(contamination=...).fit(data).predict(data) == 1 的结果相同：阈值是
+    异常分数的contamination分位数，所以只修改异常比例时直接用缓存的分数重新划分。
+    """
+    _, scores = isolation_forest_scores(data, n_estimators, random_state, n_jobs, cache_key=cache_key)
+    threshold = np.percentile(scores, 100.0 * contamination)
+    return np.where(scores >= threshold)[0]
+
+
+OUTLIER_SCREEN_METHODS = ('mahalanobis', 'isolation_forest', 'dbscan')
+OUTLIER_SCREEN_FORMAT = 1  # 模型文件格式版本
+
+
+class OutlierScreen:
+    """已拟合的多维离群筛选模型，保存到文件后可以直接判定新批次的晶粒，不需要重新拟合
+    
+    method为'mahalanobis'、'isolation_forest'或'dbscan'，features为特征列名，顺序与拟合时矩阵的列相同。
+    state保存各方法判定所需的内容：
+        mahalanobis: 均值向量mean、协方差Cholesky分解chol（主成分降维时为白化投影矩阵whitening）、距离阈值cutoff
+        isolation_forest: 拟合好的模型model、异常分数阈值threshold
+        dbscan: 标准化参数mean/scale、标准化后的核心点core_samples及其簇标签core_labels、邻域半径eps
+    模型文件用pickle保存，只加载自己保存的文件。
+    """
+    def __init__(self, method, features, params, state, info=None):
+        if method not in OUTLIER_SCREEN_METHODS:
+            raise ValueError(f"不支持的多维筛选方法: {method}")
+        self.method = method
+        self.features = list(features)
+        self.params = dict(params)
+        self.state = state
+        self.info = dict(info or {})
+        self._whitening = None  # 马氏距离的白化矩阵，首次判定时由chol计算
+        self._core_index = None  # DBSCAN核心点的近邻索引，首次判定时建立
+    
+    @classmethod
+    def fit(cls, method, data, features, n_jobs=None, cache_key=None, **params):
+        """在数据矩阵上拟合筛选模型，返回 (模型, 拟合数据中判定为正常的行号)
+        
+        cache_key为数据的标识，isolation_forest用它缓存已拟合的模型。
+        
+        参数与各方法的函数相同：mahalanobis为threshold、regularization、n_components（不为None时
+        先做主成分降维）；isolation_forest为
+        contamination、n_estimators、random_state；dbscan为eps、min_samples、sample_size、max_memory_mb。
+        """
+        start = time.perf_counter()
+        data = np.asarray(data, dtype=np.float64)
+        info = {'rows': len(data)}
+        if method == 'mahalanobis':
+            params = {'threshold': 0.99, 'regularization': 1e-6, 'n_components': None, **params}
+            if params['n_components']:
+                mean_vec, whitening = pca_mahalanobis_fit(data, params['n_components'])
+                state = {'mean': mean_vec, 'whitening': whitening,
+                         'cutoff': float(np.sqrt(stats.chi2.ppf(params['threshold'], whitening.shape[1])))
+                         if whitening.shape[1] else np.inf}
+            else:
+                mean_vec, chol = mahalanobis_fit(data, params['regularization'])
+                state = {'mean': mean_vec, 'chol': chol,
+                         'cutoff': float(np.sqrt(stats.chi2.ppf(params['threshold'], data.shape[1])))}
+            screen = cls(method, features, params, state, info)
+            inliers = np.where(screen.inlier_mask(data))[0]
+        elif method == 'isolation_forest':
+            params = {'contamination': 0.05, 'n_estimators': 100, 'random_state': 42, **params}
+            model, scores = isolation_forest_scores(data, params['n_estimators'], params['random_state'], n_jobs,
+                                                    cache_key=cache_key)
+            threshold = float(np.percentile(scores, 100.0 * params['contamination']))
+            screen = cls(method, features, params, {'model': model, 'threshold': threshold}, info)
+            inliers = np.where(scores >= threshold)[0]
+        elif method == 'dbscan':
+            params = {'eps': 0.5, 'min_samples': 5, 'sample_size': DBSCAN_SAMPLE_SIZE,
+                      'max_memory_mb': DBSCAN_MEMORY_MB, **params}
+            labels, dbscan_info, cores = dbscan_labels(data, n_jobs=n_jobs, return_cores=True, **params)
+            info.update(dbscan_info)
+            screen = cls(method, features, params, cores, info)
+            inliers = np.where(labels != -1)[0]
+        else:
+            raise ValueError(f"不支持的多维筛选方法: {method}")
+        screen.info['fit_seconds'] = time.perf_counter() - start
+        return screen, inliers
+    
+    def inlier_mask(self, data, n_jobs=None):
+        """判定数据矩阵每一行是否正常，列顺序与features相同，返回布尔数组"""
+        data = np.asarray(data, dtype=np.float64)
+        if data.ndim != 2 or data.shape[1] != len(self.features):
+            raise ValueError(f"数据应有{len(self.features)}列特征，实际形状为{data.shape}")
+        if len(data) == 0:
+            return np.zeros(0, dtype=bool)
+        state = self.state
+        if self.method == 'mahalanobis':
+            if self._whitening is None:
+                self._whitening = state['whitening'] if 'whitening' in state else \
+                    solve_triangular(state['chol'], np.eye(len(self.features)), lower=True).T
+            chunk_rows = _pca_chunk_rows(MAHALANOBIS_CHUNK_ROWS, len(self.features))
+            return _whitened_norms(data, state['mean'], self._whitening, chunk_rows) <= state['cutoff']
+        if self.method == 'isolation_forest':
+            return _score_in_chunks(state['model'].score_samples, data, n_jobs) >= state['threshold']
+        
+        # DBSCAN：最近的核心点在eps以内的归入该簇，否则为噪声
+        if len(state['core_samples']) == 0:
+            return np.zeros(len(data), dtype=bool)
+        if self._core_index is None:
+            self._core_index = NearestNeighbors(algorithm=state['algorithm'], n_jobs=n_jobs).fit(state['core_samples'])
+        distance, _ = self._core_index.kneighbors((data - state['mean']) / state['scale'], n_neighbors=1)
+        return distance[:, 0] <= state['eps']
+    
+    def save(self, path):
+        """保存到文件，先写临时文件再替换，写入中断时不会留下损坏的模型文件"""
+        content = {'format': OUTLIER_SCREEN_FORMAT, 'method': self.method, 'features': self.features,
+                   'params': self.params, 'state': self.state, 'info': self.info,
+                   'saved_at': time.strftime('%Y-%m-%d %H:%M:%S')}
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(content, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            content = pickle.load(f)
+        if not isinstance(content, dict) or content.get('format') != OUTLIER_SCREEN_FORMAT:
+            raise ValueError(f"不是有效的多维筛选模型文件: {path}")
+        return cls(content['method'], content['features'], content['params'], content['state'], content['info'])
+
+
+def screen_csv_files(screen, files, read_options=None, chunksize=200000, n_jobs=None, progress_callback=None):
+    """用已拟合的筛选模型按块判定CSV文件中的晶粒，不把文件读入内存
+    
+    参数:
+        read_options: 标题行定位参数，与_iter_csv_chunks相同
+        progress_callback: 每处理完一个文件调用一次 progress_callback(已完成数, 总数, 文件路径)
+    返回字典:
+        files: 每个文件的结果 {file, total(读取行数), screened(特征都有值的行数), passed, failed,
+               yield(通过百分比), seconds, error}
+        rows: 读取的总行数
+        seconds: 总耗时
+        dies_per_second: 每秒处理的颗粒数
+    """
+    read_options = dict(read_options or {})
+    read_options['usecols'] = screen.features
+    start = time.perf_counter()
+    results = []
+    for file_idx, file_path in enumerate(files):
+        file_start = time.perf_counter()
+        row = {'file': os.path.basename(file_path), 'total': 0, 'screened': 0, 'passed': 0, 'failed': 0,
+               'yield': np.nan, 'seconds': 0.0, 'error': ''}
+        try:
+            n_chunks = 0
+            for chunk in _iter_csv_chunks(file_path, chunksize=chunksize, **read_options):
+                n_chunks += 1
+                missing = [col for col in screen.features if col not in chunk.columns]
+                if missing:
+                    raise ValueError(f"缺少特征列: {missing}")
+                matrix = np.column_stack([pd.to_numeric(chunk[col], errors='coerce').to_numpy(dtype=np.float64)
+                                          for col in screen.features])
+                valid = ~np.isnan(matrix).any(axis=1)
+                passed = int(np.count_nonzero(screen.inlier_mask(matrix[valid], n_jobs=n_jobs)))
+                row['total'] += len(matrix)
+                row['screened'] += int(np.count_nonzero(valid))
+                row['passed'] += passed
+            if n_chunks == 0:
+                raise ValueError("文件中没有数据或没有所需的特征列")
+            row['failed'] = row['screened'] - row['passed']
+            if row['screened']:
+                row['yield'] = row['passed'] / row['screened'] * 100
+        except Exception as e:
+            print(f"筛选文件时出错: {file_path}: {e}")
+            row['error'] = str(e)
+        row['seconds'] = time.perf_counter() - file_start
+        results.append(row)
+        if progress_callback:
+            progress_callback(file_idx + 1, len(files), file_path)
+    
+    elapsed = time.perf_counter() - start
+    total_rows = sum(row['total'] for row in results)
+    return {'files': results, 'rows': total_rows, 'seconds': elapsed,
+            'dies_per_second': total_rows / elapsed if elapsed > 0 else 0.0}
+
+
+EXPORT_FORMATS = ('xlsx', 'csv', 'parquet')
+EXCEL_SHEET_NAME_LIMIT = 31
+_INVALID_SHEET_CHARS = '[]:*?/\\'
+
+
+def export_format(output_path):
+    """根据扩展名判断导出格式，.csv和.parquet以外一律按xlsx处理"""
+    ext = os.path.splitext(output_path)[1].lower().lstrip('.')
+    return ext if ext in EXPORT_FORMATS else 'xlsx'
+
+
+def _excel_cell(value):
+    """把单元格值转换为Excel可写入的类型，缺失值写成空单元格"""
+    if value is None or isinstance(value, (str, bool, int)):
+        return value
+    if isinstance(value, float):
+        return None if value != value or value in (float('inf'), float('-inf')) else value
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return None if pd.isna(value) else pd.Timestamp(value).to_pydatetime()
+    if isinstance(value, np.generic):
+        return _excel_cell(value.item())
+    return str(value)
+
+
+class TableWriter:
+    """逐行写出的表格写入器，用于导出报告和分布结果
+    
+    xlsx格式优先使用xlsxwriter的constant_memory模式，未安装时使用openpyxl的write_only模式，
+    两者都是写完一行即释放，不在内存中保留整个工作簿；代价是不带pandas默认的表头格式。
+    csv和parquet格式下每个工作表写成一个单独文件：第一个工作表写到output_path，其余写到
+    <文件名>_<工作表名>.csv/.parquet；parquet需要安装pyarrow。
+    
+    参数:
+        output_path: 输出路径
+        fmt: 'xlsx'、'csv'或'parquet'，None表示按扩展名判断
+        engine: xlsx写入引擎，'xlsxwriter'或'openpyxl'，None表示自动选择
+    """
+    def __init__(self, output_path, fmt=None, engine=None):
+        self.output_path = output_path
+        self.fmt = fmt or export_format(output_path)
+        if self.fmt not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的导出格式: {self.fmt}")
+        self.paths = []
+        self.sheet_names = []
+        self.rows_written = 0
+        self._workbook = None
+        self.engine = None
+        if self.fmt == 'xlsx':
+            if engine is None:
+                try:
+                    import xlsxwriter  # noqa: F401
+                    engine = 'xlsxwriter'
+                except ImportError:
+                    engine = 'openpyxl'
+            if engine == 'xlsxwriter':
+                import xlsxwriter
+                self._workbook = xlsxwriter.Workbook(output_path, {'constant_memory': True})
+            elif engine == 'openpyxl':
+                from openpyxl import Workbook
+                self._workbook = Workbook(write_only=True)
+            else:
+                raise ValueError(f"不支持的xlsx写入引擎: {engine}")
+            self.engine = engine
+            self.paths.append(output_path)
+        elif self.fmt == 'parquet':
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise ImportError("导出parquet需要安装pyarrow")
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+    
+    def _unique_sheet_name(self, sheet_name):
+        """按Excel的规则清理工作表名：去掉非法字符、截断到31个字符并去重"""
+        name = ''.join('_' if c in _INVALID_SHEET_CHARS else c for c in str(sheet_name)) or 'Sheet'
+        name = name[:EXCEL_SHEET_NAME_LIMIT]
+        existing = {n.lower() for n in self.sheet_names}
+        candidate, suffix = name, 1
+        while candidate.lower() in existing:
+            tag = f"_{suffix}"
+            candidate = name[:EXCEL_SHEET_NAME_LIMIT - len(tag)] + tag
+            suffix += 1
+        self.sheet_names.append(candidate)
+        return candidate
+    
+    def write_sheet(self, df, sheet_name='Sheet1', index=True):
+        """写出一个DataFrame，index和header的含义与DataFrame.to_excel相同"""
+        if index:
+            if df.index.nlevels == 1 and df.index.name is None:
+                df = df.rename_axis('')
+            df = df.reset_index()
+        if isinstance(df.columns, pd.MultiIndex):
+            df = df.copy()
+            df.columns = [' '.join(str(level) for level in col if str(level) != '') for col in df.columns]
+        sheet_name = self._unique_sheet_name(sheet_name)
+        
+        if self.fmt == 'xlsx':
+            header = [str(col) for col in df.columns]
+            # 按列转换为Python对象后逐行写出
+            columns = [[_excel_cell(v) for v in df.iloc[:, j].tolist()] for j in range(df.shape[1])]
+            if self.engine == 'xlsxwriter':
+                worksheet = self._workbook.add_worksheet(sheet_name)
+                worksheet.write_row(0, 0, header)
+                for i, row in enumerate(zip(*columns), start=1):
+                    worksheet.write_row(i, 0, row)
+            else:
+                worksheet = self._workbook.create_sheet(sheet_name)
+                worksheet.append(header)
+                for row in zip(*columns):
+                    worksheet.append(row)
+        else:
+            if not self.paths:
+                path = self.output_path
+            else:
+                stem = os.path.splitext(self.output_path)[0]
+                safe_name = ''.join('_' if c in '<>:"/\\|?*' else c for c in sheet_name)
+                path = f"{stem}_{safe_name}.{self.fmt}"
+            if self.fmt == 'csv':
+                df.to_csv(path, index=False, encoding='utf-8-sig')
+            else:
+                # parquet要求列名为字符串，混合类型的object列转换为字符串
+                out = df.copy()
+                out.columns = [str(col) for col in out.columns]
+                for col in out.columns:
+                    if out[col].dtype == object or isinstance(out[col].dtype, pd.CategoricalDtype):
+                        if pd.api.types.infer_dtype(out[col], skipna=True) not in ('string', 'empty'):
+                            out[col] = out[col].astype(str)
+                out.to_parquet(path, index=False)
+            self.paths.append(path)
+        self.rows_written += len(df)
+        return sheet_name
+    
+    def close(self):
+        if self._workbook is None:
+            return
+        workbook, self._workbook = self._workbook, None
+        if self.engine == 'xlsxwriter':
+            workbook.close()
+        else:
+            if not workbook.sheetnames:
+                workbook.create_sheet('Sheet1')
+            workbook.save(self.output_path)
+
+
+_ANALYZER_IDS = itertools.count()  # 每个DataAnalyzer的编号，与data_version一起标识数据
+
 
 class DataAnalyzer:
-    def __init__(self, files, skiprows=16, analyzer=None):
+    def __init__(self, files, skiprows=16, analyzer=None, workers=None, progress_callback=None, cache=None,
+                 columns=None, lazy=False, max_loaded_columns=64, streaming=False, chunksize=200000,
+                 sample_size=100000, column_dtype=np.float64):
+        """
+        参数:
+            files: CSV文件路径列表
+            workers: 并行读取的进程数，None或1表示逐个读取
+            progress_callback: 每读完一个文件调用一次 progress_callback(已完成数, 总数, 文件路径)
+            cache: ColumnCache对象；为None时，每次读取时按界面上是否勾选使用缓存决定是否使用默认缓存
+            columns: 只加载这些列，None表示加载所有列
+            lazy: 为True时创建时不读取数据，各分析方法第一次用到某列时才解析该列
+            max_loaded_columns: 按需加载模式下最多保留的列数，超出时淘汰最久未使用的列
+            streaming: 为True时不把数据读入内存，分析时按块遍历文件，只累积所需的统计量
+            chunksize: 流式模式下每块的行数
+            sample_size: 流式模式下用于分位数和正态性检验的蓄水池样本大小
+            column_dtype: 列存储中数组的类型，np.float64或np.float32（内存减半）
+        """
         self.files = files
+        self.columns = list(columns) if columns is not None else None
         self.skiprows = skiprows
         self.analyzer = analyzer  # 添加analyzer属性
         if analyzer is not None and hasattr(analyzer, 'skiprows'):
             self.skiprows = analyzer.skiprows
-        self.dfs = [self._read_file(f) for f in files]
+        self.cache = cache
+        self._default_cache = None  # 界面勾选使用缓存时创建的默认缓存
+        self.workers = workers
+        self.lazy = lazy
+        self.max_loaded_columns = max_loaded_columns
+        self._loaded_columns = OrderedDict()  # 按需加载模式下已加载的列，按最近使用排序
+        self.streaming = streaming
+        self.chunksize = chunksize
+        self.sample_size = sample_size
+        self._stream_stats = {}  # 流式模式下每列的统计量
+        self.column_dtype = column_dtype
+        self._column_store = {}  # 列存储：列名 -> (所有文件合并后的非空数组, 各文件在数组中的起始位置)
+        self._column_masks = {}  # 列名 -> 各文件的非空掩码，None表示没有缺失值，False表示文件中没有该列
+        self.data_version = 0  # 文件集合每变化一次加1，用于缓存失效
+        self._instance_id = next(_ANALYZER_IDS)
+        self._profiles = {}  # (列名, data_version) -> ColumnProfile
+        self._sorted_index = {}  # (列名, data_version) -> 排好序的列数据
+        self._sorted_segments = {}  # (列名, data_version) -> 各文件分别排序后拼接的数据，位置与列存储相同
+        self._report_cache = {}  # (data_version, 列名, 下限, 上限, 方法) -> ({文件序号: 报告行}, 汇总行)
+        self._page_spec_cache = {}  # (data_version, 列名, 下限, 上限) -> 分布图页面内容
+        self.read_stats = {}  # 每个文件的读取字节统计
+        self.load_errors = {}  # 读取失败的文件及错误信息
+        if lazy or streaming:
+            self.dfs = [pd.DataFrame() for _ in files]
+        else:
+            self.dfs = self._read_files(files, workers, progress_callback, self.columns)
+    
+    def set_files(self, files, progress_callback=None):
+        """更换文件集合，清空已加载的数据和列存储"""
+        self.files = files
+        self._loaded_columns.clear()
+        self._stream_stats.clear()
+        self._column_store.clear()
+        self._column_masks.clear()
+        self._profiles.clear()
+        self._sorted_index.clear()
+        self._sorted_segments.clear()
+        self._report_cache.clear()
+        self._page_spec_cache.clear()
+        self.read_stats.clear()
+        self.load_errors.clear()
+        self.data_version += 1
+        # 原地替换，外部持有的dfs引用同样生效
+        if self.lazy or self.streaming:
+            self.dfs[:] = [pd.DataFrame() for _ in files]
+        else:
+            self.dfs[:] = self._read_files(files, self.workers, progress_callback, self.columns)
+    
+    def _resolve_cache(self):
+        """返回本次读取使用的缓存，界面上的缓存开关在每次读取时重新检查"""
+        if self.cache is not None:
+            return self.cache
+        if self.analyzer is not None and hasattr(self.analyzer, 'use_cache_var') and self.analyzer.use_cache_var.get():
+            if self._default_cache is None:
+                self._default_cache = ColumnCache()
+            return self._default_cache
+        return None
+    
+    def _read_options(self, usecols=None):
+        """返回传给_load_csv的读取参数"""
+        read_options = _resolve_read_options(self.analyzer, self.skiprows)
+        read_options['cache'] = self._resolve_cache()
+        read_options['usecols'] = usecols
+        return read_options
+    
+    def has_columns(self, columns):
+        """判断所需的列是否都已加载（按需加载模式下总是可以加载）"""
+        return self.lazy or self.columns is None or all(col in self.columns for col in columns)
+    
+    def missing_columns(self, columns):
+        """按需加载模式下返回尚未加载的列"""
+        if not self.lazy:
+            return []
+        return [col for col in dict.fromkeys(columns) if col not in self._loaded_columns]
+    
+    def ensure_columns(self, columns, progress_callback=None):
+        """按需加载模式下确保这些列已加载，一次解析只读取缺少的列（usecols）
+        
+        本次需要的列总会保留；加载新列后若超出max_loaded_columns，淘汰其余最久未使用的列。
+        流式模式下不加载数据，而是一次遍历文件计算这些列的统计量。
+        """
+        if self.streaming:
+            self.stream_column_stats(columns)
+            return
+        if not self.lazy:
+            return
+        columns = list(dict.fromkeys(columns))
+        missing = self.missing_columns(columns)
+        if missing:
+            print(f"按需加载列: {missing}")
+            loaded = self._read_files(self.files, self.workers, progress_callback, missing)
+            for i, new_df in enumerate(loaded):
+                if new_df.empty and len(new_df.columns) == 0:
+                    continue
+                if len(self.dfs[i].columns) == 0:
+                    self.dfs[i] = new_df
+                else:
+                    self.dfs[i] = pd.concat([self.dfs[i], new_df], axis=1)
+            for col in missing:
+                self._loaded_columns[col] = True
+        for col in columns:
+            self._loaded_columns.move_to_end(col)
+        if not missing:
+            return
+        
+        # 加载了新列后，淘汰最久未使用的列
+        keep = set(columns)
+        evicted = []
+        for col in list(self._loaded_columns):
+            if len(self._loaded_columns) <= self.max_loaded_columns:
+                break
+            if col not in keep:
+                del self._loaded_columns[col]
+                evicted.append(col)
+        if evicted:
+            print(f"释放列: {evicted}")
+            for col in evicted:
+                self._column_store.pop(col, None)
+                self._column_masks.pop(col, None)
+                self._profiles.pop((col, self.data_version), None)
+                self._sorted_index.pop((col, self.data_version), None)
+                self._sorted_segments.pop((col, self.data_version), None)
+            for i, df in enumerate(self.dfs):
+                self.dfs[i] = df.drop(columns=evicted, errors='ignore')
+    
+    def _read_files(self, files, workers=None, progress_callback=None, usecols=None):
+        """读取所有文件，workers大于1时使用进程池并行读取，结果保持原文件顺序"""
+        files = list(files)
+        if not workers or workers <= 1 or len(files) <= 1:
+            dfs = []
+            for i, file_path in enumerate(files):
+                dfs.append(self._read_file(file_path, usecols))
+                if progress_callback is not None:
+                    progress_callback(i + 1, len(files), file_path)
+            return dfs
+        
+        read_options = self._read_options(usecols)
+        dfs = [None] * len(files)
+        done = 0
+        print(f"使用 {min(workers, len(files))} 个进程并行读取 {len(files)} 个文件")
+        with ProcessPoolExecutor(max_workers=min(workers, len(files))) as executor:
+            futures = {executor.submit(_load_csv_worker, f, read_options): i for i, f in enumerate(files)}
+            for future in as_completed(futures):
+                i = futures[future]
+                file_path = files[i]
+                try:
+                    df, read_stats, error = future.result()
+                except Exception as e:
+                    # 子进程异常退出等情况
+                    df, read_stats, error = None, None, str(e)
+                
+                if error is None:
+                    dfs[i] = df
+                    self.read_stats[file_path] = read_stats
+                else:
+                    print(f"读取文件时出错: {file_path}: {error}")
+                    self.load_errors[file_path] = error
+                    # 返回空数据帧
+                    dfs[i] = pd.DataFrame()
+                
+                done += 1
+                if progress_callback is not None:
+                    progress_callback(done, len(files), file_path)
+        return dfs
+        
+    def _read_file(self, file_path, usecols=None):
+        try:
+            print(f"开始读取文件: {file_path}")
+            df, self.read_stats[file_path] = _load_csv(file_path, **self._read_options(usecols))
+            return df
+        except Exception as e:
+            print(f"读取文件时出错: {e}")
+            import traceback
+            traceback.print_exc()
+            self.load_errors[file_path] = str(e)
+            # 返回空数据帧
+            return pd.DataFrame()
+
+    def _iter_file_chunks(self, file_path, columns):
+        """流式模式下按块读取一个文件中的指定列，读取失败时记录错误并跳过该文件"""
+        try:
+            for chunk in _iter_csv_chunks(file_path, chunksize=self.chunksize, **self._read_options(columns)):
+                yield chunk
+        except Exception as e:
+            print(f"读取文件时出错: {file_path}: {e}")
+            self.load_errors[file_path] = str(e)
+    
+    def stream_column_stats(self, columns):
+        """流式模式下返回各列的StreamingColumnStats，未计算过的列一起遍历一次文件"""
+        missing = [col for col in dict.fromkeys(columns) if col not in self._stream_stats]
+        if missing:
+            print(f"流式统计列: {missing}")
+            accumulators = {col: StreamingColumnStats(self.sample_size) for col in missing}
+            for file_path in self.files:
+                for chunk in self._iter_file_chunks(file_path, missing):
+                    for col in missing:
+                        if col in chunk.columns:
+                            accumulators[col].update(pd.to_numeric(chunk[col], errors='coerce').to_numpy(dtype=np.float64))
+            self._stream_stats.update(accumulators)
+        return {col: self._stream_stats[col] for col in columns}
+    
+    def _stream_limit_stats(self, columns, limits):
+        """流式模式下按文件统计各列的总数、超下限数、超上限数以及范围内数据的均值和标准差
+        
+        返回 {(文件序号, 列名): (总数, 超下限数, 超上限数, 范围内数据的StreamingColumnStats)}，
+        文件中不存在的列不会出现在结果中。
+        """
+        results = {}
+        for file_idx, file_path in enumerate(self.files):
+            for chunk in self._iter_file_chunks(file_path, columns):
+                for col in columns:
+                    if col not in chunk.columns:
+                        continue
+                    data = pd.to_numeric(chunk[col], errors='coerce').to_numpy(dtype=np.float64)
+                    data = data[~np.isnan(data)]
+                    lower, upper = limits.get(col, (None, None))
+                    total, below, above, valid_stats = results.get((file_idx, col), (0, 0, 0, StreamingColumnStats(0)))
+                    total += len(data)
+                    if lower is not None:
+                        below += int(np.count_nonzero(data < lower))
+                    if upper is not None:
+                        above += int(np.count_nonzero(data > upper))
+                    valid_stats.update(data[(data >= lower) & (data <= upper)] if lower is not None and upper is not None else data)
+                    results[(file_idx, col)] = (total, below, above, valid_stats)
+        return results
+    
+    def _build_column(self, column):
+        """把某列在所有文件中的数据合并为一个连续数组，只做一次去除NaN
+        
+        各文件的非空掩码记录在_column_masks中，用于按行对齐多个特征项。
+        """
+        parts = []
+        offsets = [0]
+        masks = []
+        for df in self.dfs:
+            if column in df.columns:
+                values = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=self.column_dtype)
+                valid = ~np.isnan(values)
+                if valid.all():
+                    masks.append(None)
+                else:
+                    values = values[valid]
+                    masks.append(valid)
+            else:
+                values = np.empty(0, dtype=self.column_dtype)
+                masks.append(False)
+            parts.append(values)
+            offsets.append(offsets[-1] + len(values))
+        self._column_masks[column] = masks
+        values = np.concatenate(parts) if parts else np.empty(0, dtype=self.column_dtype)
+        return values, np.array(offsets)
+    
+    def column_values(self, column):
+        """返回某列在所有文件中合并后的非空数值数组（每列只构建一次）
+        
+        流式模式下返回该列的蓄水池样本。
+        """
+        if self.streaming:
+            return self.stream_column_stats([column])[column].sample
+        if column not in self._column_store:
+            self.ensure_columns([column])
+            self._column_store[column] = self._build_column(column)
+        return self._column_store[column][0]
+    
+    def column_offsets(self, column):
+        """返回各文件在column_values数组中的起始位置，长度为文件数+1"""
+        self.column_values(column)
+        return self._column_store[column][1]
+    
+    def _file_segment(self, column, file_idx):
+        """返回某列在某个文件中的非空值和非空掩码（掩码含义同_column_masks）"""
+        values = self.column_values(column)
+        offsets = self._column_store[column][1]
+        return values[offsets[file_idx]:offsets[file_idx + 1]], self._column_masks[column][file_idx]
+    
+    def feature_matrix(self, columns, dtype=np.float64, return_rows=False):
+        """按行对齐的多特征数据矩阵（每行一颗晶粒，每列一个特征项），只保留所有特征项都有值的晶粒
+        
+        直接从列存储构建：每个文件先把各列的非空掩码合并为联合掩码，再把各列的非空值按联合掩码
+        取出，写入预先分配好的连续矩阵；缺少任一特征项的文件整个跳过。
+        return_rows为True时返回 (矩阵, 文件序号, 文件内行号)，用于把结果对应回原始晶粒。
+        """
+        if self.streaming:
+            raise ValueError("流式模式下不支持按行对齐的多特征矩阵")
+        columns = list(dict.fromkeys(columns))
+        self.ensure_columns(columns)
+        
+        # 第一遍：各文件的联合掩码和保留的行数
+        plan = []
+        for i in range(len(self.dfs)):
+            segments = [self._file_segment(col, i) for col in columns]
+            if any(mask is False for _, mask in segments):
+                continue
+            joint = None
+            for _, mask in segments:
+                if mask is not None:
+                    joint = mask.copy() if joint is None else np.logical_and(joint, mask, out=joint)
+            n_rows = len(segments[0][1]) if segments[0][1] is not None else len(segments[0][0])
+            plan.append((i, joint, n_rows if joint is None else int(np.count_nonzero(joint))))
+        
+        # 第二遍：按列写入连续矩阵
+        total = sum(count for _, _, count in plan)
+        matrix = np.empty((total, len(columns)), dtype=dtype)
+        file_ids = np.empty(total, dtype=np.int64)
+        row_numbers = np.empty(total, dtype=np.int64)
+        pos = 0
+        for i, joint, count in plan:
+            for j, col in enumerate(columns):
+                values, mask = self._file_segment(col, i)
+                if joint is not None:
+                    values = values[joint if mask is None else joint[mask]]
+                matrix[pos:pos + count, j] = values
+            file_ids[pos:pos + count] = i
+            row_numbers[pos:pos + count] = np.arange(count) if joint is None else np.flatnonzero(joint)
+            pos += count
+        if return_rows:
+            return matrix, file_ids, row_numbers
+        return matrix
+    
+    def feature_matrix_key(self, columns, dtype=np.float64):
+        """feature_matrix结果的标识，用作模型缓存的键，不需要对矩阵计算哈希"""
+        return (self._instance_id, self.data_version, tuple(dict.fromkeys(columns)), np.dtype(dtype).str)
+    
+    def file_values(self, column, file_idx):
+        """返回某列在第file_idx个文件中的非空数据（列存储中的一段视图）"""
+        offsets = self.column_offsets(column)
+        return self.column_values(column)[offsets[file_idx]:offsets[file_idx + 1]]
+    
+    def column_profile(self, column):
+        """返回某列的ColumnProfile，同一数据版本下只计算一次"""
+        key = (column, self.data_version)
+        if key not in self._profiles:
+            if self.streaming:
+                column_stats = self.stream_column_stats([column])[column]
+                self._profiles[key] = ColumnProfile(self.column_values(column), column_stats)
+            else:
+                self._profiles[key] = ColumnProfile(self.column_values(column),
+                                                    sorted_values=self.sorted_column(column))
+        return self._profiles[key]
+    
+    def sorted_column(self, column):
+        """返回某列排好序的数据（排序索引），同一数据版本下只排序一次"""
+        key = (column, self.data_version)
+        if key not in self._sorted_index:
+            self._sorted_index[key] = np.sort(self.column_values(column).astype(np.float64))
+        return self._sorted_index[key]
+    
+    def sorted_file_values(self, column, file_idx):
+        """返回某列在第file_idx个文件中排好序的数据"""
+        key = (column, self.data_version)
+        offsets = self.column_offsets(column)
+        if key not in self._sorted_segments:
+            values = self.column_values(column).astype(np.float64)
+            for i in range(len(offsets) - 1):
+                values[offsets[i]:offsets[i + 1]].sort()
+            self._sorted_segments[key] = values
+        return self._sorted_segments[key][offsets[file_idx]:offsets[file_idx + 1]]
+    
+    def yield_counts(self, column, lower, upper):
+        """用排序索引统计某列在给定上下限下的颗粒数，每次查询只需两次二分查找
         
-    def _read_file(self, file_path):
-        try:
-            print(f"开始读取文件: {file_path}")
-            print(f"self.analyzer = {self.analyzer}")
-            
-            if self.analyzer is not None and hasattr(self.analyzer, 'auto_detect_var') and self.analyzer.auto_detect_var.get():
-                # 自动检测模式
-                print("使用自动检测模式")
-                if hasattr(self.analyzer, 'special_char_entry'):
-                    special_char = self.analyzer.special_char_entry.get()
-                    print(f"获取到特殊字符: '{special_char}'")
-                else:
-                    special_char = ','
-                    print(f"未找到special_char_entry，使用默认特殊字符: '{special_char}'")
-                
-                header_row = 0
-                data_start_row = 1
-                
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    for i, line in enumerate(f):
-                        if i >= 100:  # 只检查前100行
-                            break
-                        if special_char in line:
-                            header_row = i
-                            data_start_row = header_row + 1
-                            print(f"找到特殊字符所在行: {header_row}，数据起始行: {data_start_row}")
-                            break
-                    else:
-                        error_msg = f"自动检测失败: 未找到特殊字符'{special_char}'，请检查设置或使用手动模式"
-                        print(error_msg)
-                        raise ValueError(error_msg)
+        返回 {'total', 'valid', 'below', 'above', 'yield'}，流式模式下需要遍历一次文件。
+        """
+        if self.streaming:
+            counts = self.limit_counts(column, lower, upper)
+        else:
+            sorted_values = self.sorted_column(column)
+            below, above, start, end = _count_in_limits(sorted_values, lower, upper)
+            counts = {'total': len(sorted_values), 'valid': end - start, 'below': below, 'above': above}
+        counts['yield'] = counts['valid'] / counts['total'] if counts['total'] > 0 else np.nan
+        return counts
+    
+    def histogram_counts(self, column, bins):
+        """某列在给定分箱边界下各右闭区间的频数（与pd.cut相同），已有排序索引时直接在排序数据上二分查找"""
+        sorted_values = self._sorted_index.get((column, self.data_version))
+        return _right_closed_counts(self.column_values(column), bins, sorted_values)
+    
+    def _sweep_index(self, column):
+        """扫描良率时使用的排序数据，流式模式下为排好序的蓄水池样本（良率为估计值）"""
+        if self.streaming:
+            return self.column_profile(column).sorted_values
+        return self.sorted_column(column)
+    
+    def limit_sweep(self, column, lower=None, upper=None, n_points=200):
+        """良率随下限、上限变化的曲线
+        
+        下限在数据范围内取n_points个候选值，上限固定为upper（None表示不限制），反之亦然。
+        返回 {'lower': (候选下限, 良率), 'upper': (候选上限, 良率)}，良率为0-1之间的小数。
+        """
+        sorted_values = self._sweep_index(column)
+        if len(sorted_values) == 0:
+            empty = (np.empty(0), np.empty(0))
+            return {'lower': empty, 'upper': empty}
+        candidates = np.linspace(sorted_values[0], sorted_values[-1], n_points)
+        return {
+            'lower': (candidates, _sweep_yield(sorted_values, candidates, np.inf if upper is None else upper)),
+            'upper': (candidates, _sweep_yield(sorted_values, -np.inf if lower is None else lower, candidates))
+        }
+    
+    def multiplier_sweep(self, column, method='3sigma', multipliers=None):
+        """良率随sigma倍数（method='3sigma'）或IQR倍数（method='iqr'）变化的曲线，上下限使用相同倍数
+        
+        返回 (倍数数组, 良率数组)。
+        """
+        if method not in ['3sigma', 'iqr']:
+            raise ValueError(f"不支持的统计方法: {method}")
+        if multipliers is None:
+            multipliers = np.linspace(0.5, 6.0, 200) if method == '3sigma' else np.linspace(0.0, 4.0, 200)
+        multipliers = np.asarray(multipliers, dtype=np.float64)
+        profile = self.column_profile(column)
+        if method == '3sigma':
+            lowers = profile.mean - multipliers * profile.std
+            uppers = profile.mean + multipliers * profile.std
+        else:
+            lowers = profile.q1 - multipliers * profile.iqr
+            uppers = profile.q3 + multipliers * profile.iqr
+        return multipliers, _sweep_yield(self._sweep_index(column), lowers, uppers)
+    
+    def multiplier_sweep_for_columns(self, columns, method='3sigma', multipliers=None):
+        """对多个列计算multiplier_sweep，返回 {列名: (倍数数组, 良率数组)}"""
+        self.ensure_columns(columns)
+        return {col: self.multiplier_sweep(col, method, multipliers) for col in columns}
+    
+    def solve_target_yield(self, column, target, mode='central'):
+        """求满足目标良率的最紧上下限
+        
+        参数:
+            column: 列名
+            target: 目标良率，0-1之间的小数，例如0.995
+            mode: 'central'两侧各去掉(1-target)/2的数据；'symmetric'以均值为中心的最窄对称上下限
+        返回 (下限, 上限)，流式模式下基于蓄水池样本估计。
+        """
+        if not 0 < target <= 1:
+            raise ValueError("目标良率必须在0-1之间")
+        if mode not in ['central', 'symmetric']:
+            raise ValueError(f"不支持的求解方式: {mode}")
+        sorted_values = self._sweep_index(column)
+        n = len(sorted_values)
+        if n == 0:
+            return (np.nan, np.nan)
+        if mode == 'central':
+            return _central_limits(sorted_values, int(np.floor(n * (1 - target) / 2 + 1e-9)))
+        return _symmetric_limits(sorted_values, self.column_profile(column).mean, int(np.ceil(n * target - 1e-9)))
+    
+    def _row_matrix(self, columns):
+        """按行对齐的数据矩阵（每行一颗晶粒，每列一个特征项），缺失的值为NaN
+        
+        与feature_matrix相同，直接由列存储和非空掩码构建；不包含任何一列的文件跳过。
+        """
+        self.ensure_columns(columns)
+        blocks = []
+        for i in range(len(self.dfs)):
+            segments = [self._file_segment(col, i) for col in columns]
+            present = [(values, mask) for values, mask in segments if mask is not False]
+            if not present:
+                continue
+            values, mask = present[0]
+            block = np.full((len(values) if mask is None else len(mask), len(columns)), np.nan)
+            for j, (values, mask) in enumerate(segments):
+                if mask is None:
+                    block[:, j] = values
+                elif mask is not False:
+                    block[mask, j] = values
+            blocks.append(block)
+        return np.vstack(blocks) if blocks else np.empty((0, len(columns)))
+    
+    def solve_target_yield_for_columns(self, columns, target, mode='central', all_pass=False):
+        """为多个列求满足目标良率的上下限
+        
+        参数:
+            columns: 列名列表
+            target: 目标良率，0-1之间的小数
+            mode: 'central'或'symmetric'，含义同solve_target_yield
+            all_pass: 为False时每列各自达到目标良率；为True时要求所有列同时通过的良率达到目标，
+                      所有列使用相同的两侧去除比例（central）或相同的sigma倍数（symmetric），
+                      缺失值视为通过
+        返回 (limits, info)，limits为 {列名: (下限, 上限)}，info包含各列良率'yields'和全部通过良率'all_pass_yield'
+        """
+        columns = list(dict.fromkeys(columns))
+        if not all_pass:
+            limits = {col: self.solve_target_yield(col, target, mode) for col in columns}
+            yields = {col: self.yield_counts(col, *limits[col])['yield'] for col in columns}
+            return limits, {'yields': yields, 'all_pass_yield': None}
+        
+        if self.streaming:
+            raise ValueError("流式模式下不支持按全部通过良率求解")
+        if not 0 < target <= 1:
+            raise ValueError("目标良率必须在0-1之间")
+        if mode not in ['central', 'symmetric']:
+            raise ValueError(f"不支持的求解方式: {mode}")
+        matrix = self._row_matrix(columns)
+        n_dies = len(matrix)
+        if n_dies == 0:
+            return {col: (np.nan, np.nan) for col in columns}, {'yields': {}, 'all_pass_yield': np.nan}
+        min_count = int(np.ceil(n_dies * target - 1e-9))
+        
+        if mode == 'central':
+            # 每颗晶粒在各列中离较近一侧尾部的排名比例，取所有列的最小值：
+            # 两侧各去掉比例t时，该晶粒通过所有列当且仅当 t < 该最小值
+            depth = np.full(n_dies, np.inf)
+            for j, col in enumerate(columns):
+                sorted_values = self.sorted_column(col)
+                n = len(sorted_values)
+                x = matrix[:, j]
+                valid = ~np.isnan(x)
+                count_le = np.searchsorted(sorted_values, x[valid], side='right')
+                count_ge = n - np.searchsorted(sorted_values, x[valid], side='left')
+                depth[valid] = np.minimum(depth[valid], np.minimum(count_le, count_ge) / n)
+            threshold = np.sort(depth)[n_dies - min_count]
+            limits = {}
+            for col in columns:
+                sorted_values = self.sorted_column(col)
+                n = len(sorted_values)
+                if n == 0:
+                    limits[col] = (np.nan, np.nan)
+                    continue
+                tail_count = (n - 1) // 2 if np.isinf(threshold) else int(np.ceil(threshold * n)) - 1
+                limits[col] = _central_limits(sorted_values, tail_count)
+        else:
+            # 每颗晶粒在各列中偏离均值的sigma倍数取最大值，所有列使用同一个倍数
+            z = np.zeros(n_dies)
+            centers = {}
+            for j, col in enumerate(columns):
+                profile = self.column_profile(col)
+                centers[col] = (profile.mean, profile.std)
+                x = matrix[:, j]
+                valid = ~np.isnan(x)
+                if profile.std > 0:
+                    z[valid] = np.maximum(z[valid], np.abs(x[valid] - profile.mean) / profile.std)
+            multiplier = np.sort(z)[min_count - 1] * (1 + 1e-12)
+            limits = {col: (mean - multiplier * std, mean + multiplier * std) for col, (mean, std) in centers.items()}
+        
+        # 计算实际达到的良率
+        passed = np.ones(n_dies, dtype=bool)
+        for j, col in enumerate(columns):
+            lower, upper = limits[col]
+            x = matrix[:, j]
+            with np.errstate(invalid='ignore'):
+                passed &= np.isnan(x) | ((x >= lower) & (x <= upper))
+        yields = {col: self.yield_counts(col, *limits[col])['yield'] for col in columns}
+        return limits, {'yields': yields, 'all_pass_yield': passed.mean()}
+    
+    def all_pass_analysis(self, limits, keep_packed=False):
+        """全部通过（联合）良率分析
+        
+        每个文件按位压缩出 晶粒×特征项 的失效矩阵（不生成布尔DataFrame），统计：
+        全部通过良率、首次失效归因（按limits中的顺序第一个失效的特征项）、
+        以及每个特征项的增量良率损失（只在该项失效的晶粒，即去掉该项可挽回的良率）。
+        限值为None表示该侧不限制，缺失值视为通过；流式模式下按块处理。
+        
+        参数:
+            limits: {列名: (下限, 上限)}
+            keep_packed: 为True时在结果中保留每个文件的位矩阵'packed'
+        """
+        columns = [col for col, (lower, upper) in limits.items() if lower is not None or upper is not None]
+        n_columns = len(columns)
+        total = passed = 0
+        fail_counts = np.zeros(n_columns, dtype=np.int64)
+        first_fail = np.zeros(n_columns, dtype=np.int64)
+        only_fail = np.zeros(n_columns, dtype=np.int64)
+        per_file = []
+        packed_files = []
+        
+        if not self.streaming:
+            self.ensure_columns(columns)
+        for file_idx, file_path in enumerate(self.files):
+            if self.streaming:
+                parts = [_pack_failures(chunk, columns, limits) for chunk in self._iter_file_chunks(file_path, columns)]
+                packed = np.vstack([p for p, _ in parts]) if parts else np.zeros((0, (n_columns + 7) // 8), dtype=np.uint8)
+                file_fail_counts = sum((c for _, c in parts), np.zeros(n_columns, dtype=np.int64))
             else:
-                # 手动模式或者没有提供analyzer
-                print("使用手动模式")
-                if self.analyzer is not None and hasattr(self.analyzer, 'start_row_entry'):
-                    try:
-                        start_row_text = self.analyzer.start_row_entry.get()
-                        print(f"获取到起始行文本: '{start_row_text}'")
-                        data_start_row = int(start_row_text)
-                        header_row = data_start_row - 1
-                        print(f"转换后的行号: header_row={header_row}, data_start_row={data_start_row}")
-                    except (ValueError, AttributeError) as e:
-                        print(f"获取起始行出错: {e}，使用默认值")
-                        # 如果无法获取，使用默认值
-                        header_row = self.skiprows
-                        data_start_row = header_row + 1
-                else:
-                    print(f"未找到start_row_entry，使用skiprows值: {self.skiprows}")
-                    # 使用初始化时提供的skiprows值
-                    header_row = self.skiprows
-                    data_start_row = header_row + 1
-            
-            # 读取标题行
-            print(f"Reading header from row {header_row}")
-            header_df = pd.read_csv(file_path, skiprows=header_row, nrows=1, header=None)
-            columns = [str(col).strip() for col in header_df.iloc[0].tolist()]
-            print(f"Found columns: {columns}")
-            
-            # 读取数据
-            print(f"Reading data from row {data_start_row}")
-            full_df = pd.read_csv(file_path, skiprows=data_start_row)
-            
-            # 如果列数不匹配，可能是CSV格式问题，尝试修复
-            if len(full_df.columns) != len(columns):
-                print(f"列数不匹配: 标题有{len(columns)}列，数据有{len(full_df.columns)}列。尝试修复...")
-                # 尝试使用不同的分隔符
-                for sep in [',', '\t', ';', ' ']:
-                    try:
-                        header_df = pd.read_csv(file_path, skiprows=header_row, nrows=1, header=None, sep=sep)
-                        test_columns = [str(col).strip() for col in header_df.iloc[0].tolist()]
-                        full_df = pd.read_csv(file_path, skiprows=data_start_row, sep=sep)
-                        if len(full_df.columns) == len(test_columns):
-                            columns = test_columns
-                            print(f"修复成功，使用分隔符: {sep}")
-                            break
-                    except:
-                        continue
+                packed, file_fail_counts = _pack_failures(self.dfs[file_idx], columns, limits)
+            file_passed, file_first_fail, file_only_fail = _summarize_packed(packed, n_columns)
             
-            # 确保列名和数据列数一致
-            if len(full_df.columns) != len(columns):
-                # 如果仍然不匹配，使用默认列名
-                print(f"警告: 列数仍然不匹配。使用默认列名。")
-                columns = [f"Column_{i}" for i in range(len(full_df.columns))]
-            
-            full_df.columns = columns
-            return full_df
-        except Exception as e:
-            print(f"读取文件时出错: {e}")
-            import traceback
-            traceback.print_exc()
-            # 返回空数据帧
-            return pd.DataFrame()
+            per_file.append({
+                'file': file_path,
+                'total': len(packed),
+                'passed': file_passed,
+                'yield': file_passed / len(packed) if len(packed) > 0 else np.nan
+            })
+            total += len(packed)
+            passed += file_passed
+            fail_counts += file_fail_counts
+            first_fail += file_first_fail
+            only_fail += file_only_fail
+            if keep_packed:
+                packed_files.append(packed)
+        
+        result = {
+            'columns': columns,
+            'total': total,
+            'passed': passed,
+            'yield': passed / total if total > 0 else np.nan,
+            'per_file': per_file,
+            'fail_counts': dict(zip(columns, fail_counts.tolist())),
+            'first_fail': dict(zip(columns, first_fail.tolist())),
+            'incremental_loss': {col: (n / total if total > 0 else np.nan) for col, n in zip(columns, only_fail.tolist())}
+        }
+        if keep_packed:
+            result['packed'] = packed_files
+        return result
+    
+    def all_pass_tables(self, limits):
+        """把all_pass_analysis的结果整理成两个表：各文件的全部通过良率，以及各特征项的失效归因"""
+        result = self.all_pass_analysis(limits)
+        yield_rows = []
+        for file_idx, file_result in enumerate(result['per_file']):
+            yield_rows.append({
+                '文件编号': file_idx + 1,
+                '文件名': os.path.basename(file_result['file']),
+                '总颗粒数': file_result['total'],
+                '全部通过颗粒数': file_result['passed'],
+                '全部通过良率': f"{file_result['yield']*100:.2f}%" if file_result['total'] > 0 else 'N/A'
+            })
+        yield_rows.append({
+            '文件编号': '汇总',
+            '文件名': '所有文件',
+            '总颗粒数': result['total'],
+            '全部通过颗粒数': result['passed'],
+            '全部通过良率': f"{result['yield']*100:.2f}%" if result['total'] > 0 else 'N/A'
+        })
+        
+        failed = result['total'] - result['passed']
+        attribution_rows = []
+        for col in result['columns']:
+            attribution_rows.append({
+                '特征项': col,
+                '下限值': limits[col][0] if limits[col][0] is not None else '',
+                '上限值': limits[col][1] if limits[col][1] is not None else '',
+                '失效颗粒数': result['fail_counts'][col],
+                '首次失效颗粒数': result['first_fail'][col],
+                '首次失效占比': f"{result['first_fail'][col]/failed*100:.2f}%" if failed > 0 else 'N/A',
+                '增量良率损失': f"{result['incremental_loss'][col]*100:.4f}%" if result['total'] > 0 else 'N/A'
+            })
+        return pd.DataFrame(yield_rows), pd.DataFrame(attribution_rows)
+    
+    def limit_counts(self, column, lower, upper):
+        """统计某列在给定上下限下的总颗粒数、有效颗粒数、超下限和超上限颗粒数"""
+        return self.limit_counts_for_columns({column: (lower, upper)})[column]
+    
+    def limit_counts_for_columns(self, limits):
+        """对多个列统计超限颗粒数，返回 {列名: {'total', 'valid', 'below', 'above'}}
+        
+        流式模式下所有列在一次文件遍历中统计完成。
+        """
+        counts = {}
+        if self.streaming:
+            per_file = self._stream_limit_stats(list(limits), limits)
+            for col in limits:
+                file_stats = [v for (_, c), v in per_file.items() if c == col]
+                counts[col] = {
+                    'total': sum(v[0] for v in file_stats),
+                    'valid': sum(v[3].count for v in file_stats),
+                    'below': sum(v[1] for v in file_stats),
+                    'above': sum(v[2] for v in file_stats)
+                }
+            return counts
+        
+        self.ensure_columns(list(limits))
+        for col, (lower, upper) in limits.items():
+            sorted_values = self.sorted_column(col)
+            below, above, start, end = _count_in_limits(sorted_values, lower, upper)
+            counts[col] = {'total': len(sorted_values), 'valid': end - start, 'below': below, 'above': above}
+        return counts
 
     def calculate_limits(self, column, method='3sigma', **params):
         if method not in ['3sigma', 'iqr']:
             raise ValueError(f"不支持的统计方法: {method}")
-        combined_data = pd.concat([df[column] for df in self.dfs if column in df])
+        profile = self.column_profile(column)
         
         # 检查分布类型，为偏态分布提供更好的推荐
-        skewness = stats.skew(combined_data)
+        skewness = profile.skewness
         is_skewed = abs(skewness) > 0.5  # 判断是否为偏态分布
         
         if method == '3sigma':
-            mean = combined_data.mean()
-            std = combined_data.std()
+            mean = profile.mean
+            std = profile.std
             
             if is_skewed:
                 # 对于偏态分布，使用非对称的sigma倍数
@@ -136,9 +2658,9 @@ class DataAnalyzer:
                 return (mean - params.get('lower_param', 3.0)*std, mean + params.get('upper_param', 3.0)*std)
                 
         elif method == 'iqr':
-            q1 = np.percentile(combined_data, 25)
-            q3 = np.percentile(combined_data, 75)
-            iqr_value = q3 - q1
+            q1 = profile.q1
+            q3 = profile.q3
+            iqr_value = profile.iqr
             
             if is_skewed:
                 # 对于偏态分布，使用非对称的IQR倍数
@@ -158,82 +2680,152 @@ class DataAnalyzer:
                 
             return (lower, upper)
 
-    def generate_report(self, selected_columns, output_path, limits):
-        """生成分析报告，确保每个文件的良率都被正确输出"""
-        report_data = []
+    def _report_row(self, file_idx, file_name, col, total, below_lower, above_upper, valid_count, valid_mean, valid_std, lower, upper):
+        """生成报告中的一行"""
+        return {
+            '文件编号': file_idx,
+            '文件名': file_name,
+            '特征项': col,
+            '总颗粒数': total,
+            '有效颗粒数': valid_count,
+            '超下限颗粒数': below_lower,
+            '超上限颗粒数': above_upper,
+            '良率': f"{valid_count/total*100:.2f}%" if total > 0 else 'N/A',
+            '平均值': valid_mean if valid_count > 0 else 0,
+            '标准差': valid_std if valid_count > 1 else 0,
+            '下限值': lower if lower is not None else '',
+            '上限值': upper if upper is not None else ''
+        }
+
+    def _report_rows(self, selected_columns, limits):
+        """基于列存储一次向量化计算报告统计量，返回 {列名: ({文件序号: 报告行}, 汇总行)}
+        
+        每列只遍历一次：按文件编号做分段归约得到各文件的颗粒数和范围内数据的均值、标准差，
+        汇总行由各文件的结果合并得到，不再重新计算。
+        """
+        self.ensure_columns(selected_columns)
+        n_files = len(self.files)
+        # 处理不同操作系统的路径分隔符
+        file_names = [file_path.split('/')[-1].split('\\')[-1] for file_path in self.files]
+        results = {}
         
-        # 分文件统计
-        for file_idx, (file_path, df) in enumerate(zip(self.files, self.dfs)):
-            for col in selected_columns:
-                if col in df.columns:
-                    data = df[col].dropna()
-                    lower, upper = limits.get(col, (None, None))
-                    
-                    valid = data[(data >= lower) & (data <= upper)] if lower is not None and upper is not None else data
-                    
-                    # 计算超限颗粒数
-                    below_lower = len(data[data < lower]) if lower is not None else 0
-                    above_upper = len(data[data > upper]) if upper is not None else 0
-                    
-                    # 计算总颗粒数
-                    total = len(data)
-                    
-                    base_data = {
-                        '文件编号': file_idx+1,
-                        '文件名': file_path.split('/')[-1].split('\\')[-1],  # 处理不同操作系统的路径分隔符
-                        '特征项': col,
-                        '总颗粒数': total,
-                        '有效颗粒数': len(valid),
-                        '超下限颗粒数': below_lower,
-                        '超上限颗粒数': above_upper,
-                        '良率': f"{len(valid)/total*100:.2f}%" if total > 0 else 'N/A',
-                        '平均值': valid.mean() if len(valid) > 0 else 0,
-                        '标准差': valid.std() if len(valid) > 1 else 0,
-                        '下限值': lower if lower is not None else '',
-                        '上限值': upper if upper is not None else ''
-                    }
-                    
-                    # 添加到报告数据
-                    report_data.append(base_data)
-        
-        # 添加汇总统计
         for col in selected_columns:
-            # 收集所有文件中该列的数据
-            all_col_data = []
-            for df in self.dfs:
-                if col in df.columns:
-                    all_col_data.append(df[col].dropna())
-            
-            if all_col_data:
-                combined_data = pd.concat(all_col_data)
-                lower, upper = limits.get(col, (None, None))
-                
-                valid = combined_data[(combined_data >= lower) & (combined_data <= upper)] if lower is not None and upper is not None else combined_data
-                
-                # 计算超限颗粒数
-                below_lower = len(combined_data[combined_data < lower]) if lower is not None else 0
-                above_upper = len(combined_data[combined_data > upper]) if upper is not None else 0
-                
-                # 计算总颗粒数
-                total = len(combined_data)
-                
-                base_data = {
-                    '文件编号': '汇总',
-                    '文件名': '所有文件',
-                    '特征项': col,
-                    '总颗粒数': total,
-                    '有效颗粒数': len(valid),
-                    '超下限颗粒数': below_lower,
-                    '超上限颗粒数': above_upper,
-                    '良率': f"{len(valid)/total*100:.2f}%" if total > 0 else 'N/A',
-                    '平均值': valid.mean() if len(valid) > 0 else 0,
-                    '标准差': valid.std() if len(valid) > 1 else 0,
-                    '下限值': lower if lower is not None else '',
-                    '上限值': upper if upper is not None else ''
-                }
-                
-                # 添加到报告数据
-                report_data.append(base_data)
+            has_column = [col in df.columns for df in self.dfs]
+            if not any(has_column):
+                results[col] = ({}, None)
+                continue
+            values = self.column_values(col).astype(np.float64, copy=False)
+            offsets = self.column_offsets(col)
+            totals = np.diff(offsets)
+            lower, upper = limits.get(col, (None, None))
+            
+            # 计算超限颗粒数
+            below = _segment_sum(values < lower, offsets) if lower is not None else np.zeros(n_files, dtype=np.int64)
+            above = _segment_sum(values > upper, offsets) if upper is not None else np.zeros(n_files, dtype=np.int64)
+            
+            # 范围内数据的分段归约：数量、均值、离差平方和
+            if lower is not None and upper is not None:
+                in_limits = (values >= lower) & (values <= upper)
+                counts = _segment_sum(in_limits, offsets)
+                valid_values = values[in_limits]
+                valid_offsets = np.concatenate(([0], np.cumsum(counts)))
+            else:
+                counts = totals
+                valid_values = values
+                valid_offsets = offsets
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means = _segment_sum(valid_values, valid_offsets) / counts
+                deviations = valid_values - np.repeat(means, counts)
+                np.square(deviations, out=deviations)
+                m2 = _segment_sum(deviations, valid_offsets)
+                stds = np.sqrt(m2 / (counts - 1))
+            
+            file_rows = {}
+            for i in range(n_files):
+                if has_column[i]:
+                    file_rows[i] = self._report_row(
+                        i+1, file_names[i], col, int(totals[i]), int(below[i]), int(above[i]), int(counts[i]),
+                        means[i] if counts[i] > 0 else 0, stds[i] if counts[i] > 1 else 0, lower, upper)
+            
+            # 合并各文件的结果得到汇总行
+            n_valid = counts.sum()
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = np.sum(np.where(counts > 0, means, 0) * counts) / n_valid
+                merged_m2 = m2.sum() + np.sum(np.where(counts > 0, counts * (means - mean) ** 2, 0))
+                std = np.sqrt(merged_m2 / (n_valid - 1))
+            results[col] = (file_rows, self._report_row(
+                '汇总', '所有文件', col, int(totals.sum()), int(below.sum()), int(above.sum()), int(n_valid),
+                mean if n_valid > 0 else 0, std if n_valid > 1 else 0, lower, upper))
+        return results
+
+    def _streaming_report_rows(self, selected_columns, limits):
+        """流式模式下每个文件只遍历一次，同时统计所有列；汇总行由各文件的统计量合并得到
+        
+        返回值与_report_rows相同：{列名: ({文件序号: 报告行}, 汇总行)}
+        """
+        per_file = self._stream_limit_stats(selected_columns, limits)
+        results = {}
+        
+        for col in selected_columns:
+            lower, upper = limits.get(col, (None, None))
+            
+            # 分文件统计
+            file_rows = {}
+            for file_idx, file_path in enumerate(self.files):
+                if (file_idx, col) in per_file:
+                    total, below_lower, above_upper, valid_stats = per_file[(file_idx, col)]
+                    file_rows[file_idx] = self._report_row(
+                        file_idx+1, file_path.split('/')[-1].split('\\')[-1], col, total, below_lower, above_upper,
+                        valid_stats.count, valid_stats.mean, valid_stats.std, lower, upper)
+            
+            # 添加汇总统计
+            file_stats = [per_file[(file_idx, col)] for file_idx in range(len(self.files)) if (file_idx, col) in per_file]
+            summary_row = None
+            if file_stats:
+                combined_stats = StreamingColumnStats(0)
+                for _, _, _, valid_stats in file_stats:
+                    combined_stats.merge(valid_stats)
+                summary_row = self._report_row(
+                    '汇总', '所有文件', col, sum(s[0] for s in file_stats), sum(s[1] for s in file_stats),
+                    sum(s[2] for s in file_stats), combined_stats.count, combined_stats.mean, combined_stats.std,
+                    lower, upper)
+            results[col] = (file_rows, summary_row)
+        return results
+    
+    def report_rows(self, selected_columns, limits, methods=None):
+        """返回报告的所有行：先按文件、再按特征项，最后是各特征项的汇总行
+        
+        每列的结果按(data_version, 列名, 上下限, 方法)缓存，修改部分列的上下限后重新生成报告时
+        只计算这些列。methods为 {列名: 上下限的计算方法}，只作为缓存键的一部分。
+        """
+        methods = methods or {}
+        columns = list(dict.fromkeys(selected_columns))
+        keys = {}
+        for col in columns:
+            lower, upper = limits.get(col, (None, None))
+            keys[col] = (self.data_version, col, lower, upper, methods.get(col))
+        pending = [col for col in columns if keys[col] not in self._report_cache]
+        if pending:
+            if self.streaming:
+                computed = self._streaming_report_rows(pending, limits)
+            else:
+                computed = self._report_rows(pending, limits)
+            for col in pending:
+                self._report_cache[keys[col]] = computed[col]
+            print(f"报告统计: 重新计算 {len(pending)} 列，复用缓存 {len(columns) - len(pending)} 列")
+        
+        results = [self._report_cache[keys[col]] for col in columns]
+        report_data = [file_rows[i] for i in range(len(self.files)) for file_rows, _ in results if i in file_rows]
+        report_data += [summary_row for _, summary_row in results if summary_row is not None]
+        return report_data
+
+    def generate_report(self, selected_columns, output_path, limits, fmt=None, methods=None):
+        """生成分析报告，确保每个文件的良率都被正确输出
+        
+        fmt为'xlsx'、'csv'或'parquet'，None表示按output_path的扩展名判断；写出方式见TableWriter。
+        methods为 {列名: 上下限的计算方法}，用于报告缓存，见report_rows。
+        """
+        report_data = self.report_rows(selected_columns, limits, methods)
         
         try:
             # 将数据转换为DataFrame并保存
@@ -246,82 +2838,61 @@ class DataAnalyzer:
             
             # 保存排序后的DataFrame
             report_df = report_df[base_columns]
-            report_df.to_excel(output_path, index=False)
+            
+            # 有上下限的特征项另外输出全部通过良率和失效归因
+            selected_limits = {col: limits[col] for col in selected_columns if col in limits}
+            with TableWriter(output_path, fmt) as writer:
+                writer.write_sheet(report_df, 'Sheet1', index=False)
+                if selected_limits:
+                    yield_df, attribution_df = self.all_pass_tables(selected_limits)
+                    writer.write_sheet(yield_df, '全部通过良率', index=False)
+                    writer.write_sheet(attribution_df, '失效归因', index=False)
             return True
         except Exception as e:
             print(f"保存Excel报告失败: {e}")
             return False
 
     def calculate_limits_for_columns(self, columns, method, **params):
+        """批量计算多个列的上下限
+        
+        各列数据按块拼成NaN填充的二维矩阵，均值、标准差、偏度和四分位数沿axis 0一次算出；
+        每块矩阵不超过BATCH_MATRIX_BYTES。流式模式下逐列使用已累积的统计量。
+        """
+        if method not in ['3sigma', 'iqr']:
+            raise ValueError(f"不支持的统计方法: {method}")
+        columns = list(dict.fromkeys(columns))
+        self.ensure_columns(columns)
         results = {}
-        for col in columns:
-            results[col] = self.calculate_limits(col, method, **params)
+        if self.streaming:
+            for col in columns:
+                results[col] = self.calculate_limits(col, method, **params)
+            return results
+        
+        start = 0
+        while start < len(columns):
+            # 逐列加入当前块，直到矩阵超出大小限制
+            block = [columns[start]]
+            n_rows = len(self.column_values(columns[start]))
+            for col in columns[start + 1:]:
+                rows = max(n_rows, len(self.column_values(col)))
+                if rows * (len(block) + 1) * 8 > BATCH_MATRIX_BYTES:
+                    break
+                block.append(col)
+                n_rows = rows
+            
+            matrix = np.full((n_rows, len(block)), np.nan)
+            for j, col in enumerate(block):
+                values = self.column_values(col)
+                matrix[:len(values), j] = values
+            lower, upper = _limits_from_matrix(matrix, method, params)
+            for j, col in enumerate(block):
+                results[col] = (lower[j], upper[j])
+            start += len(block)
         return results
 
     def analyze_distribution(self, column):
-        """分析数据分布特性，返回分布信息"""
-        combined_data = pd.concat([df[column] for df in self.dfs if column in df])
-        if len(combined_data) < 10:  # 数据太少，无法可靠分析
-            return {
-                'distribution': 'unknown',
-                'skewness': 0,
-                'kurtosis': 0,
-                'is_normal': True,
-                'p_value': 1.0,
-                'outlier_ratio': 0
-            }
-            
-        # 计算基本统计量
-        skewness = stats.skew(combined_data)
-        kurtosis = stats.kurtosis(combined_data)
-        
-        # 正态性检验
-        _, p_value = stats.normaltest(combined_data)
-        is_normal = p_value > 0.05
-        
-        # 检测离群值比例
-        q1 = np.percentile(combined_data, 25)
-        q3 = np.percentile(combined_data, 75)
-        iqr_value = q3 - q1
-        lower_bound = q1 - 1.5 * iqr_value
-        upper_bound = q3 + 1.5 * iqr_value
-        outliers = combined_data[(combined_data < lower_bound) | (combined_data > upper_bound)]
-        outlier_ratio = len(outliers) / len(combined_data)
-        
-        # 判断分布类型
-        distribution = 'normal'
-        if not is_normal:
-            if abs(skewness) < 0.5:
-                if kurtosis > 0.5:
-                    distribution = 't-distribution'
-                elif kurtosis < -0.5:
-                    distribution = 'uniform'
-                else:
-                    distribution = 'near-normal'
-            elif skewness > 0.5:
-                # 检查是否为对数正态分布
-                if np.all(combined_data > 0):
-                    try:
-                        _, lognorm_p = stats.normaltest(np.log(combined_data))
-                        if lognorm_p > 0.05:
-                            distribution = 'lognormal'
-                        else:
-                            distribution = 'right-skewed'
-                    except:
-                        distribution = 'right-skewed'
-                else:
-                    distribution = 'right-skewed'
-            elif skewness < -0.5:
-                distribution = 'left-skewed'
-        
-        return {
-            'distribution': distribution,
-            'skewness': skewness,
-            'kurtosis': kurtosis,
-            'is_normal': is_normal,
-            'p_value': p_value,
-            'outlier_ratio': outlier_ratio
-        }
+        """分析数据分布特性，返回分布信息（流式模式下正态性检验和离群值比例基于蓄水池样本）"""
+        return self.column_profile(column).distribution_info()
     
     def smart_recommend_limits(self, column, strictness='balanced'):
         """智能推荐上下限，根据数据分布特性自动选择最合适的方法
@@ -331,295 +2902,166 @@ class DataAnalyzer:
             strictness: 严格程度，可选值为'strict'(严格)、'balanced'(平衡)、'loose'(宽松)
         """
         # 分析数据分布
-        dist_info = self.analyze_distribution(column)
-        combined_data = pd.concat([df[column] for df in self.dfs if column in df.columns])
-        
-        # 检查数据是否包含0点或接近0的值
-        has_zero = np.any(np.abs(combined_data) < 1e-10)
-        data_range = combined_data.max() - combined_data.min()
-        data_magnitude = max(abs(combined_data.max()), abs(combined_data.min()))
-        
-        # 计算基本统计量，用于所有方法
-        mean = combined_data.mean()
-        std = combined_data.std()
-        q1 = np.percentile(combined_data, 25)
-        q3 = np.percentile(combined_data, 75)
-        iqr_value = q3 - q1
-        
-        # 根据严格程度设置系数
-        if strictness == 'strict':
-            strict_factor = 0.7  # 严格模式
-            # 对于大数值，使用更严格的控制
-            large_value_factor = 0.5 if data_magnitude > 300 else 0.7
-        elif strictness == 'loose':
-            strict_factor = 1.0  # 宽松模式
-            large_value_factor = 0.8 if data_magnitude > 300 else 1.0
-        else:  # balanced
-            strict_factor = 0.85  # 平衡模式
-            large_value_factor = 0.65 if data_magnitude > 300 else 0.85
-        
-        # 对于大数值，使用相对范围而非绝对范围
-        is_large_value = data_magnitude > 300  # 将大数值定义从100改为300
-        
-        # 根据分布类型选择合适的方法和参数
-        if dist_info['distribution'] == 'normal' or dist_info['distribution'] == 'near-normal':
-            # 正态或接近正态分布，使用3sigma方法
-            if is_large_value:
-                # 对于大数值，使用相对标准差（变异系数）或百分位数
-                if has_zero:
-                    # 有0点时使用变异系数
-                    cv = std / abs(mean) if mean != 0 else 0.1  # 变异系数
-                    # 使用更严格的系数
-                    sigma_factor = 2.0 * strict_factor * large_value_factor
-                    lower = mean * (1 - sigma_factor * cv)
-                    upper = mean * (1 + sigma_factor * cv)
-                else:
-                    # 无0点时使用百分位数
-                    p_low = 1.0 if strictness == 'strict' else (0.5 if strictness == 'loose' else 0.75)
-                    p_high = 99.0 if strictness == 'strict' else (99.5 if strictness == 'loose' else 99.25)
-                    lower = np.percentile(combined_data, p_low)
-                    upper = np.percentile(combined_data, p_high)
-                
-                # 确保下限不会变为负数（除非数据本身有负值）
-                if lower < 0 and combined_data.min() >= 0:
-                    lower = 0
-            else:
-                # 使用更严格的sigma倍数
-                sigma_factor = 2.5 * strict_factor
-                lower = mean - sigma_factor * std
-                upper = mean + sigma_factor * std
-                
-            return (lower, upper), '3sigma'
-            
-        elif dist_info['distribution'] == 'right-skewed':
-            # 右偏分布
-            if dist_info['outlier_ratio'] > 0.1:
-                # 离群值较多，使用IQR方法
-                # 对于大数值，调整IQR倍数
-                if is_large_value:
-                    if has_zero:
-                        # 有0点时使用更严格的控制
-                        lower_mult = 0.5 * strict_factor * large_value_factor
-                        upper_mult = 1.0 * strict_factor * large_value_factor
-                    else:
-                        # 无0点时使用百分位数
-                        p_low = 1.0 if strictness == 'strict' else (0.5 if strictness == 'loose' else 0.75)
-                        p_high = 99.0 if strictness == 'strict' else (99.5 if strictness == 'loose' else 99.25)
-                        return (np.percentile(combined_data, p_low), np.percentile(combined_data, p_high)), 'percentile'
-                else:
-                    lower_mult = 1.0 * strict_factor
-                    upper_mult = 1.5 * strict_factor
-                    
-                lower = q1 - lower_mult * iqr_value
-                upper = q3 + upper_mult * iqr_value
-                
-                # 确保下限不会变为负数（除非数据本身有负值）
-                if lower < 0 and combined_data.min() >= 0:
-                    lower = 0
-                    
-                return (lower, upper), 'iqr'
-            else:
-                # 离群值较少，使用调整后的3sigma
-                if is_large_value:
-                    if has_zero:
-                        # 有0点时使用变异系数
-                        cv = std / abs(mean) if mean != 0 else 0.1
-                        sigma_lower = 1.5 * strict_factor * large_value_factor
-                        sigma_upper = 2.0 * strict_factor * large_value_factor
-                        lower = mean * (1 - sigma_lower * cv)
-                        upper = mean * (1 + sigma_upper * cv)
-                    else:
-                        # 无0点时使用百分位数
-                        p_low = 1.0 if strictness == 'strict' else (0.5 if strictness == 'loose' else 0.75)
-                        p_high = 99.0 if strictness == 'strict' else (99.5 if strictness == 'loose' else 99.25)
-                        lower = np.percentile(combined_data, p_low)
-                        upper = np.percentile(combined_data, p_high)
-                    
-                    # 确保下限不会变为负数（除非数据本身有负值）
-                    if lower < 0 and combined_data.min() >= 0:
-                        lower = 0
-                else:
-                    lower = mean - 2.0 * std * strict_factor
-                    upper = mean + 2.5 * std * strict_factor
-                    
-                return (lower, upper), '3sigma'
-                
-        elif dist_info['distribution'] == 'left-skewed':
-            # 左偏分布
-            if dist_info['outlier_ratio'] > 0.1:
-                # 离群值较多，使用IQR方法
-                if is_large_value:
-                    if has_zero:
-                        # 有0点时使用更严格的控制
-                        lower_mult = 1.0 * strict_factor * large_value_factor
-                        upper_mult = 0.5 * strict_factor * large_value_factor
-                    else:
-                        # 无0点时使用百分位数
-                        p_low = 1.0 if strictness == 'strict' else (0.5 if strictness == 'loose' else 0.75)
-                        p_high = 99.0 if strictness == 'strict' else (99.5 if strictness == 'loose' else 99.25)
-                        return (np.percentile(combined_data, p_low), np.percentile(combined_data, p_high)), 'percentile'
-                else:
-                    lower_mult = 1.5 * strict_factor
-                    upper_mult = 1.0 * strict_factor
-                    
-                lower = q1 - lower_mult * iqr_value
-                upper = q3 + upper_mult * iqr_value
-                
-                # 确保下限不会变为负数（除非数据本身有负值）
-                if lower < 0 and combined_data.min() >= 0:
-                    lower = 0
-                    
-                return (lower, upper), 'iqr'
-            else:
-                # 离群值较少，使用调整后的3sigma
-                if is_large_value:
-                    if has_zero:
-                        # 有0点时使用变异系数
-                        cv = std / abs(mean) if mean != 0 else 0.1
-                        sigma_lower = 2.0 * strict_factor * large_value_factor
-                        sigma_upper = 1.5 * strict_factor * large_value_factor
-                        lower = mean * (1 - sigma_lower * cv)
-                        upper = mean * (1 + sigma_upper * cv)
-                    else:
-                        # 无0点时使用百分位数
-                        p_low = 1.0 if strictness == 'strict' else (0.5 if strictness == 'loose' else 0.75)
-                        p_high = 99.0 if strictness == 'strict' else (99.5 if strictness == 'loose' else 99.25)
-                        lower = np.percentile(combined_data, p_low)
-                        upper = np.percentile(combined_data, p_high)
-                    
-                    # 确保下限不会变为负数（除非数据本身有负值）
-                    if lower < 0 and combined_data.min() >= 0:
-                        lower = 0
-                else:
-                    lower = mean - 2.5 * std * strict_factor
-                    upper = mean + 2.0 * std * strict_factor
-                    
-                return (lower, upper), '3sigma'
-                
-        elif dist_info['distribution'] == 'lognormal':
-            # 对数正态分布，在对数空间中使用3sigma，然后转换回原始空间
-            # 确保所有值都为正
-            if combined_data.min() <= 0:
-                # 如果有非正值，使用IQR方法
-                lower = max(0, q1 - 1.2 * iqr_value * strict_factor)  # 确保下限不小于0
-                upper = q3 + 1.2 * iqr_value * strict_factor
-                return (lower, upper), 'iqr'
-            else:
-                # 对于大数值，使用百分位数
-                if is_large_value:
-                    p_low = 1.0 if strictness == 'strict' else (0.5 if strictness == 'loose' else 0.75)
-                    p_high = 99.0 if strictness == 'strict' else (99.5 if strictness == 'loose' else 99.25)
-                    return (np.percentile(combined_data, p_low), np.percentile(combined_data, p_high)), 'percentile'
-                else:
-                    # 在对数空间中使用sigma
-                    log_sigma = 2.0 * strict_factor
-                    log_data = np.log(combined_data)
-                    log_mean = log_data.mean()
-                    log_std = log_data.std()
-                    log_lower = log_mean - log_sigma * log_std
-                    log_upper = log_mean + log_sigma * log_std
-                    return (np.exp(log_lower), np.exp(log_upper)), 'lognormal'
-            
-        elif dist_info['distribution'] == 't-distribution':
-            # t分布，使用分位数方法
-            if strictness == 'strict':
-                p_low, p_high = 2.5, 97.5
-            elif strictness == 'loose':
-                p_low, p_high = 0.5, 99.5
-            else:  # balanced
-                p_low, p_high = 1.0, 99.0
-                
-            # 对于大数值，使用更严格的分位数
-            if is_large_value:
-                p_low = p_low * 2 if p_low < 5 else p_low
-                p_high = 100 - (100 - p_high) * 2 if p_high > 95 else p_high
-                
-            lower = np.percentile(combined_data, p_low)
-            upper = np.percentile(combined_data, p_high)
-                
-            # 确保下限不会变为负数（除非数据本身有负值）
-            if lower < 0 and combined_data.min() >= 0:
-                lower = 0
-                
-            return (lower, upper), 'percentile'
-            
-        elif dist_info['distribution'] == 'uniform':
-            # 均匀分布，使用扩展的最小/最大值，但对大数值进行调整
-            min_val = combined_data.min()
-            max_val = combined_data.max()
-            range_val = max_val - min_val
-            
-            # 对于大数值，使用更小的扩展比例或直接使用分位数
-            if is_large_value:
-                if strictness == 'strict':
-                    p_low, p_high = 2.5, 97.5
-                elif strictness == 'loose':
-                    p_low, p_high = 0.5, 99.5
-                else:  # balanced
-                    p_low, p_high = 1.0, 99.0
-                    
-                lower = np.percentile(combined_data, p_low)
-                upper = np.percentile(combined_data, p_high)
-            else:
-                # 根据严格程度调整扩展比例
-                if strictness == 'strict':
-                    extension = 0.01 * strict_factor
-                elif strictness == 'loose':
-                    extension = 0.05 * strict_factor
-                else:  # balanced
-                    extension = 0.03 * strict_factor
-                    
-                lower = min_val - extension * range_val
-                upper = max_val + extension * range_val
-            
-            # 确保下限不会变为负数（除非数据本身有负值）
-            if lower < 0 and min_val >= 0:
-                lower = 0
-                
-            return (lower, upper), 'range'
-            
-        else:
-            # 未知分布，使用IQR方法（较为稳健），但对大数值进行调整
-            if is_large_value:
-                # 对于大数值，使用分位数
-                if strictness == 'strict':
-                    p_low, p_high = 2.5, 97.5
-                elif strictness == 'loose':
-                    p_low, p_high = 0.5, 99.5
-                else:  # balanced
-                    p_low, p_high = 1.0, 99.0
-                    
-                lower = np.percentile(combined_data, p_low)
-                upper = np.percentile(combined_data, p_high)
-            else:
-                # 根据严格程度调整IQR倍数
-                if strictness == 'strict':
-                    mult = 0.8 * strict_factor
-                elif strictness == 'loose':
-                    mult = 1.5 * strict_factor
-                else:  # balanced
-                    mult = 1.2 * strict_factor
-                    
-                lower = q1 - mult * iqr_value
-                upper = q3 + mult * iqr_value
-            
-            # 确保下限不会变为负数（除非数据本身有负值）
-            if lower < 0 and combined_data.min() >= 0:
-                lower = 0
-                
-            return (lower, upper), 'iqr'
-            
-    def smart_recommend_limits_for_columns(self, columns, strictness='balanced'):
+        self.ensure_columns([column])
+        profile = self.column_profile(column)
+        return _recommend_from_profile(profile, self.column_values(column), strictness)
+    
+    def smart_recommend_limits_for_columns(self, columns, strictness='balanced', workers=None, with_timing=False,
+                                           progress_callback=None):
         """为多个列智能推荐上下限
         
         参数:
             columns: 列名列表
             strictness: 严格程度，可选值为'strict'(严格)、'balanced'(平衡)、'loose'(宽松)
+            workers: 并行计算的进程数，None或1表示逐列计算；结果与逐列计算完全相同
+            with_timing: 为True时额外返回每列的耗时（秒）
+            progress_callback: 每完成一列调用一次 progress_callback(已完成数, 总数, 列名)
         """
+        self.ensure_columns(columns)
+        recommendations = {}
+        timings = {}
+        
+        # 只有还没有ColumnProfile的列需要计算，流式模式下统计量已累积，无需并行
+        pending = [col for col in dict.fromkeys(columns) if (col, self.data_version) not in self._profiles]
+        if workers and workers > 1 and not self.streaming and len(pending) > 1:
+            self._parallel_recommend(pending, strictness, workers, recommendations, timings, progress_callback)
+        
         results = {}
         methods = {}
         for col in columns:
-            (lower, upper), method = self.smart_recommend_limits(col, strictness)
+            if col not in recommendations:
+                begin = time.perf_counter()
+                recommendations[col] = self.smart_recommend_limits(col, strictness)
+                timings[col] = time.perf_counter() - begin
+                if progress_callback is not None:
+                    progress_callback(len(recommendations), len(columns), col)
+            (lower, upper), method = recommendations[col]
             results[col] = (lower, upper)
             methods[col] = method
-        return results, methods
\ No newline at end of file
+        if with_timing:
+            return results, methods, timings
+        return results, methods
+    
+    def _parallel_recommend(self, columns, strictness, workers, recommendations, timings, progress_callback=None):
+        """用进程池为多个列计算ColumnProfile和推荐结果，列数据通过共享内存传给子进程
+        
+        子进程计算出的ColumnProfile存入缓存；某组列失败时这些列留给调用方逐列计算。
+        """
+        arrays = [self.column_values(col) for col in columns]
+        offsets = np.concatenate([[0], np.cumsum([len(a) for a in arrays])])
+        total = int(offsets[-1])
+        dtype = np.dtype(self.column_dtype)
+        spans = {col: (int(offsets[i]), int(offsets[i + 1])) for i, col in enumerate(columns)}
+        
+        # 列按顺序轮流分到各组，每个进程处理若干组
+        n_tasks = min(len(columns), workers * 4)
+        groups = [[] for _ in range(n_tasks)]
+        for i, col in enumerate(columns):
+            groups[i % n_tasks].append((col,) + spans[col])
+        
+        print(f"使用 {min(workers, n_tasks)} 个进程并行推荐 {len(columns)} 列")
+        values_shm = shared_memory.SharedMemory(create=True, size=max(total * dtype.itemsize, 1))
+        sorted_shm = shared_memory.SharedMemory(create=True, size=max(total * 8, 1))
+        try:
+            all_values = np.ndarray((total,), dtype=dtype, buffer=values_shm.buf)
+            all_sorted = np.ndarray((total,), dtype=np.float64, buffer=sorted_shm.buf)
+            for col, values in zip(columns, arrays):
+                start, end = spans[col]
+                all_values[start:end] = values
+            
+            with ProcessPoolExecutor(max_workers=min(workers, n_tasks)) as executor:
+                futures = [executor.submit(_smart_recommend_worker, values_shm.name, sorted_shm.name, total,
+                                           dtype.str, group, strictness) for group in groups]
+                for future in as_completed(futures):
+                    try:
+                        group_results = future.result()
+                    except Exception as e:
+                        print(f"并行推荐出错，改为逐列计算: {e}")
+                        continue
+                    for col, recommendation, profile, elapsed in group_results:
+                        start, end = spans[col]
+                        profile.sorted_values = all_sorted[start:end].copy()
+                        self._profiles[(col, self.data_version)] = profile
+                        self._sorted_index[(col, self.data_version)] = profile.sorted_values
+                        recommendations[col] = recommendation
+                        timings[col] = elapsed
+                        if progress_callback is not None:
+                            progress_callback(len(recommendations), len(columns), col)
+        finally:
+            all_values = all_sorted = None
+            values_shm.close()
+            values_shm.unlink()
+            sorted_shm.close()
+            sorted_shm.unlink()
+    
+    def histogram_page_specs(self, columns, limits, workers=None, progress_callback=None):
+        """按列顺序返回报告中每个特征项分布图页面的内容（见_histogram_page_spec）
+        
+        结果按(data_version, 列名, 上下限)缓存，只计算上下限变化过的列。
+        workers大于1时用进程池计算，列数据通过共享内存传给子进程；某组列失败时这些列改为逐列计算。
+        progress_callback: 每完成一列调用一次 progress_callback(已完成数, 总数, 列名)
+        """
+        columns = list(dict.fromkeys(columns))
+        keys = {}
+        for col in columns:
+            lower, upper = limits.get(col, (None, None))
+            keys[col] = (self.data_version, col, lower, upper)
+        specs = {col: self._page_spec_cache[keys[col]] for col in columns if keys[col] in self._page_spec_cache}
+        all_columns, columns = columns, [col for col in columns if col not in specs]
+        self.ensure_columns(columns)
+        
+        if workers and workers > 1 and len(columns) > 1:
+            arrays = [self.column_values(col) for col in columns]
+            offsets = np.concatenate([[0], np.cumsum([len(a) for a in arrays])])
+            total = int(offsets[-1])
+            dtype = arrays[0].dtype
+            
+            # 列按顺序轮流分到各组，每个进程处理若干组
+            n_tasks = min(len(columns), workers * 4)
+            groups = [[] for _ in range(n_tasks)]
+            for i, col in enumerate(columns):
+                lower, upper = limits.get(col, (None, None))
+                groups[i % n_tasks].append((col, int(offsets[i]), int(offsets[i + 1]), lower, upper))
+            
+            values_shm = shared_memory.SharedMemory(create=True, size=max(total * dtype.itemsize, 1))
+            try:
+                all_values = np.ndarray((total,), dtype=dtype, buffer=values_shm.buf)
+                for i, values in enumerate(arrays):
+                    all_values[offsets[i]:offsets[i + 1]] = values
+                
+                with ProcessPoolExecutor(max_workers=min(workers, n_tasks)) as executor:
+                    futures = [executor.submit(_histogram_page_worker, values_shm.name, total, dtype.str, group)
+                               for group in groups]
+                    for future in as_completed(futures):
+                        try:
+                            group_specs = future.result()
+                        except Exception as e:
+                            print(f"并行生成分布图出错，改为逐列计算: {e}")
+                            continue
+                        for spec in group_specs:
+                            specs[spec['column']] = spec
+                            if 'error' not in spec:
+                                self._page_spec_cache[keys[spec['column']]] = spec
+                            if progress_callback is not None:
+                                progress_callback(len(specs), len(all_columns), spec['column'])
+            finally:
+                all_values = None
+                values_shm.close()
+                values_shm.unlink()
+        
+        for col in columns:
+            if col not in specs:
+                lower, upper = limits.get(col, (None, None))
+                try:
+                    specs[col] = _histogram_page_spec(col, self.column_values(col), lower, upper)
+                except Exception as e:
+                    specs[col] = {'column': col, 'lower': lower, 'upper': upper, 'empty': True, 'error': str(e)}
+                if 'error' not in specs[col]:
+                    self._page_spec_cache[keys[col]] = specs[col]
+                if progress_callback is not None:
+                    progress_callback(len(specs), len(all_columns), col)
+        return [specs[col] for col in all_columns]
+    
+    def apply_outlier_screen(self, screen, files, progress_callback=None):
+        """用已保存的多维筛选模型按块判定新的CSV文件，标题行设置与当前文件相同，返回screen_csv_files的结果"""
+        return screen_csv_files(screen, files, self._read_options(), self.chunksize, self.workers, progress_callback)
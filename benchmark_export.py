@@ -0,0 +1,114 @@
+"""导出写入性能测试
+
+模拟分布导出的工作表结构（每个特征项一个_分布、_统计信息、_超限信息工作表），比较
+pandas ExcelWriter与TableWriter各写出方式的耗时和吞吐量。
+
+用法:
+    python benchmark_export.py --columns 2000 --bins 50
+    python benchmark_export.py --columns 200 --memory   # 同时统计峰值内存（会变慢）
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from analysis import TableWriter
+
+
+def make_tables(n_columns, n_bins, seed=0):
+    """生成与分布导出相同结构的表格"""
+    rng = np.random.default_rng(seed)
+    tables = []
+    for j in range(n_columns):
+        col = f"{10 + j * 0.0137:.4f}"
+        edges = np.linspace(-3, 3, n_bins + 1)
+        counts = rng.integers(0, 5000, size=n_bins)
+        result_df = pd.DataFrame({
+            '区间': [f"{edges[i]:.4f}-{edges[i+1]:.4f}" for i in range(n_bins)],
+            '数量': counts,
+            '百分比(%)': np.round(counts / counts.sum() * 100, 2),
+        })
+        stats_df = pd.DataFrame({
+            '统计量': ['总数', '平均值', '标准差', '最小值', '最大值', '中位数'],
+            '值': [int(counts.sum()), *rng.normal(size=5)],
+        })
+        limit_df = pd.DataFrame({
+            '类型': ['超下限', '超上限', '范围内'],
+            '数量': rng.integers(0, 100, size=3),
+            '百分比(%)': rng.random(3) * 100,
+        })
+        tables.append([(f"{col}_分布", result_df), (f"{col}_统计信息", stats_df), (f"{col}_超限信息", limit_df)])
+    return tables
+
+
+def write_with_pandas(tables, path):
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        for sheets in tables:
+            for name, df in sheets:
+                df.to_excel(writer, sheet_name=name, index=False)
+
+
+def write_with_table_writer(tables, path, fmt=None, engine=None):
+    with TableWriter(path, fmt=fmt, engine=engine) as writer:
+        for sheets in tables:
+            for name, df in sheets:
+                writer.write_sheet(df, name, index=False)
+
+
+def available_cases():
+    cases = [('pandas ExcelWriter(openpyxl)', 'xlsx', lambda t, p: write_with_pandas(t, p)),
+             ('TableWriter openpyxl write_only', 'xlsx', lambda t, p: write_with_table_writer(t, p, engine='openpyxl'))]
+    try:
+        import xlsxwriter  # noqa: F401
+        cases.append(('TableWriter xlsxwriter constant_memory', 'xlsx',
+                      lambda t, p: write_with_table_writer(t, p, engine='xlsxwriter')))
+    except ImportError:
+        print("未安装xlsxwriter，跳过constant_memory模式")
+    cases.append(('TableWriter csv', 'csv', lambda t, p: write_with_table_writer(t, p)))
+    try:
+        import pyarrow  # noqa: F401
+        cases.append(('TableWriter parquet', 'parquet', lambda t, p: write_with_table_writer(t, p)))
+    except ImportError:
+        print("未安装pyarrow，跳过parquet导出")
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description='导出写入性能测试')
+    parser.add_argument('--columns', type=int, default=500, help='特征项数量（每项3个工作表）')
+    parser.add_argument('--bins', type=int, default=50, help='每个分布表的区间数')
+    parser.add_argument('--memory', action='store_true', help='使用tracemalloc统计峰值内存')
+    args = parser.parse_args()
+
+    tables = make_tables(args.columns, args.bins)
+    n_sheets = sum(len(sheets) for sheets in tables)
+    n_rows = sum(len(df) for sheets in tables for _, df in sheets)
+    print(f"{args.columns}个特征项，{n_sheets}个工作表，共{n_rows}行")
+
+    out_dir = tempfile.mkdtemp(prefix='export_bench_')
+    try:
+        for name, ext, func in available_cases():
+            path = os.path.join(out_dir, f"bench.{ext}")
+            if args.memory:
+                tracemalloc.start()
+            start = time.perf_counter()
+            func(tables, path)
+            elapsed = time.perf_counter() - start
+            peak = ''
+            if args.memory:
+                peak = f"，峰值内存 {tracemalloc.get_traced_memory()[1] / 1024 ** 2:.1f} MB"
+                tracemalloc.stop()
+            size = sum(os.path.getsize(os.path.join(out_dir, f)) for f in os.listdir(out_dir))
+            print(f"{name}: {elapsed:.2f}秒，{n_rows / elapsed:,.0f}行/秒，{n_sheets / elapsed:,.0f}工作表/秒，"
+                  f"输出 {size / 1024 ** 2:.1f} MB{peak}")
+            for f in os.listdir(out_dir):
+                os.remove(os.path.join(out_dir, f))
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
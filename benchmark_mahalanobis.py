@@ -0,0 +1,68 @@
+"""马氏距离计算性能测试
+
+比较原来逐行计算的实现（np.linalg.inv + 每行两次dot）与analysis.mahalanobis_distances
+分块Cholesky实现的耗时，并检查两者结果是否一致。逐行实现很慢，只在前--loop-rows行上计时后按比例估算。
+指定--components时再测试主成分降维后的马氏距离（特征数多时使用随机化SVD）。
+
+用法:
+    python benchmark_mahalanobis.py --rows 2000000 --features 20
+    python benchmark_mahalanobis.py --rows 50000 --features 2000 --components 10 --loop-rows 1000
+"""
+import argparse
+import time
+import numpy as np
+from analysis import mahalanobis_distances, pca_mahalanobis_distances
+
+
+def loop_distances(data):
+    """原来的逐行实现"""
+    mean_vec = np.mean(data, axis=0)
+    cov_mat = np.cov(data, rowvar=False)
+    cov_mat += 1e-6 * np.eye(cov_mat.shape[0])
+    inv_cov = np.linalg.inv(cov_mat)
+    distances = []
+    for i in range(len(data)):
+        diff = data[i] - mean_vec
+        distances.append(np.sqrt(diff.dot(inv_cov).dot(diff.T)))
+    return np.array(distances)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='马氏距离计算性能测试')
+    parser.add_argument('--rows', type=int, default=2000000, help='颗粒数')
+    parser.add_argument('--features', type=int, default=20, help='特征数')
+    parser.add_argument('--loop-rows', type=int, default=100000, help='逐行实现实际计时的行数')
+    parser.add_argument('--components', type=int, default=None, help='主成分降维后保留的主成分数')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    mixing = rng.normal(size=(args.features, args.features))
+    data = rng.normal(size=(args.rows, args.features)) @ mixing + rng.normal(size=args.features) * 10
+    print(f"{args.rows}颗粒 × {args.features}特征")
+
+    start = time.perf_counter()
+    fast = mahalanobis_distances(data)
+    fast_time = time.perf_counter() - start
+    print(f"分块Cholesky: {fast_time:.2f}秒，{args.rows / fast_time:,.0f}颗粒/秒")
+
+    # 逐行实现使用前loop_rows行的数据，与分块实现在同一子集上比较结果
+    subset = data[:args.loop_rows]
+    start = time.perf_counter()
+    slow = loop_distances(subset)
+    loop_time = time.perf_counter() - start
+    estimated = loop_time * args.rows / len(subset)
+    print(f"逐行计算: {len(subset)}颗粒 {loop_time:.2f}秒，{len(subset) / loop_time:,.0f}颗粒/秒，"
+          f"全部数据估计 {estimated:.1f}秒（约{estimated / fast_time:.0f}倍）")
+
+    max_diff = np.max(np.abs(mahalanobis_distances(subset) - slow))
+    print(f"同一子集上两种实现的最大差异: {max_diff:.3e}")
+
+    if args.components:
+        start = time.perf_counter()
+        _, k = pca_mahalanobis_distances(data, args.components)
+        pca_time = time.perf_counter() - start
+        print(f"主成分降维({k}个主成分): {pca_time:.2f}秒，{args.rows / pca_time:,.0f}颗粒/秒")
+
+
+if __name__ == '__main__':
+    main()
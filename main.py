@@ -1,16 +1,16 @@
+import os
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import pandas as pd
 import numpy as np
-from analysis import DataAnalyzer
+from analysis import (DataAnalyzer, TableWriter, discover_columns, DEFAULT_CACHE_DIR, DEFAULT_CACHE_MAX_BYTES,
+                      isolation_forest_inliers, OutlierScreen,
+                      DBSCAN_SAMPLE_SIZE, DBSCAN_MEMORY_MB)
 from tkinter import BooleanVar
-from scipy import stats
-from sklearn.ensemble import IsolationForest
-from sklearn.cluster import DBSCAN
-from sklearn.preprocessing import StandardScaler
-from scipy.stats import chi2
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.figure import Figure
 import traceback
 
 class YieldAnalysisApp:
@@ -19,7 +19,9 @@ class YieldAnalysisApp:
         self.files = []
         self.selected_columns = []
         self.dfs = []
+        self.analyzer = None  # 选择特征项后按需创建
         self.limits = {}  # 初始化limits属性
+        self._page_figures = {}  # (data_version, 列名, 下限, 上限, 计算方法) -> 报告中已绘制的分布图页面
         self.skiprows = 0  # 初始化skiprows属性
         # 不要在这里初始化UI元素
         self.setup_ui()  # 将setup_ui放在成员变量初始化之后
@@ -37,6 +39,8 @@ class YieldAnalysisApp:
         print("开始设置UI...")
         # 初始化自动检测变量
         self.auto_detect_var = tk.BooleanVar(value=True)
+        self.use_cache_var = tk.BooleanVar(value=False)  # 缓存会写入用户目录，默认关闭
+        self.streaming_var = tk.BooleanVar(value=False)
         
         self.root.title("良率分析工具")
         self.root.geometry("900x700")
@@ -110,6 +114,31 @@ class YieldAnalysisApp:
         self.start_row_entry.insert(0, '1')  # 默认从第1行开始（0表示第一行）
         ttk.Label(start_row_frame, text="(当关闭自动检测时使用)").pack(side='left', padx=5)
         
+        # 并行读取进程数
+        workers_frame = ttk.Frame(csv_settings_frame)
+        workers_frame.pack(fill='x', pady=2)
+        
+        ttk.Label(workers_frame, text="读取进程数:").pack(side='left', padx=5)
+        self.load_workers_entry = ttk.Entry(workers_frame, width=10)
+        self.load_workers_entry.pack(side='left', padx=5)
+        self.load_workers_entry.insert(0, str(os.cpu_count() or 1))
+        ttk.Label(workers_frame, text="(多个文件时并行读取，1表示逐个读取)").pack(side='left', padx=5)
+        
+        # 解析结果缓存
+        cache_frame = ttk.Frame(csv_settings_frame)
+        cache_frame.pack(fill='x', pady=2)
+        
+        ttk.Checkbutton(cache_frame, text="使用解析缓存", variable=self.use_cache_var).pack(side='left', padx=5)
+        ttk.Label(cache_frame, text=f"(再次打开相同文件时直接加载缓存，不再重新解析；缓存目录: {DEFAULT_CACHE_DIR}，"
+                                    f"最多 {DEFAULT_CACHE_MAX_BYTES // 1024 ** 3} GB)").pack(side='left', padx=5)
+        
+        # 流式模式
+        streaming_frame = ttk.Frame(csv_settings_frame)
+        streaming_frame.pack(fill='x', pady=2)
+        
+        ttk.Checkbutton(streaming_frame, text="流式模式", variable=self.streaming_var).pack(side='left', padx=5)
+        ttk.Label(streaming_frame, text="(文件超出内存时使用，按块读取只保留统计量，不支持分布输出和多维分析)").pack(side='left', padx=5)
+        
         # 初始状态设置 - 将toggle_auto_detect调用移到特殊字符和起始行号输入框初始化后
         try:
             self.toggle_auto_detect()
@@ -160,6 +189,8 @@ class YieldAnalysisApp:
         
         ttk.Button(button_frame, text="批量推荐", command=self.batch_recommend).pack(side='left', padx=5)
         ttk.Button(button_frame, text="智能推荐", command=self.smart_recommend).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="良率曲线", command=self.show_yield_curves).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="目标良率", command=self.solve_target_yield).pack(side='left', padx=5)
         ttk.Label(button_frame, text="选择下列特征项并使用批量推荐或单击'推荐'按钮").pack(side='left', padx=5)
         
         # 树形视图和滚动条
@@ -259,13 +290,6 @@ class YieldAnalysisApp:
         self.iqr_upper_label.grid(row=1, column=2, padx=5, pady=2)
         self.iqr_upper_entry.grid(row=1, column=3, padx=5, pady=2)
         
-        # 马氏距离参数
-        self.mahalanobis_label = ttk.Label(self.params_frame, text="自由度:")
-        self.mahalanobis_entry = ttk.Entry(self.params_frame, width=8, validate="key", validatecommand=vcmd)
-        
-        self.mahalanobis_label.grid(row=2, column=0, padx=5, pady=2)
-        self.mahalanobis_entry.grid(row=2, column=1, padx=5, pady=2)
-        
         # Isolation Forest参数
         self.if_contamination_label = ttk.Label(self.params_frame, text="异常比例:")
         self.if_contamination_entry = ttk.Entry(self.params_frame, width=8, validate="key", validatecommand=vcmd)
@@ -305,8 +329,6 @@ class YieldAnalysisApp:
         self.iqr_lower_entry.grid_remove()
         self.iqr_upper_label.grid_remove()
         self.iqr_upper_entry.grid_remove()
-        self.mahalanobis_label.grid_remove()
-        self.mahalanobis_entry.grid_remove()
         self.if_contamination_label.grid_remove()
         self.if_contamination_entry.grid_remove()
         self.percentile_lower_label.grid_remove()
@@ -324,8 +346,6 @@ class YieldAnalysisApp:
         self.iqr_lower_entry.grid_remove()
         self.iqr_upper_label.grid_remove()
         self.iqr_upper_entry.grid_remove()
-        self.mahalanobis_label.grid_remove()
-        self.mahalanobis_entry.grid_remove()
         self.if_contamination_label.grid_remove()
         self.if_contamination_entry.grid_remove()
         self.percentile_lower_label.grid_remove()
@@ -352,11 +372,6 @@ class YieldAnalysisApp:
             self.iqr_lower_entry.insert(0, '1.5')
             self.iqr_upper_entry.delete(0, tk.END)
             self.iqr_upper_entry.insert(0, '1.5')
-        elif method == 'mahalanobis':
-            self.mahalanobis_label.grid()
-            self.mahalanobis_entry.grid()
-            self.mahalanobis_entry.delete(0, tk.END)
-            self.mahalanobis_entry.insert(0, '1')
         elif method == 'isolation_forest':
             self.if_contamination_label.grid()
             self.if_contamination_entry.grid()
@@ -427,9 +442,20 @@ class YieldAnalysisApp:
                     if column in self.limits:
                         del self.limits[column]
         
-        # 为选中的列推荐限制值
-        for column in selected_columns:
-            self._on_recommend_click(column, method=method, **current_params)
+        # 为选中的列推荐限制值，所有列一次批量计算
+        if not self._ensure_analyzer(list(self.selected_columns) + selected_columns):
+            tk.messagebox.showerror("错误", "请先选择文件")
+            return
+        try:
+            limits = self.analyzer.calculate_limits_for_columns(selected_columns, method, **current_params)
+        except Exception as e:
+            tk.messagebox.showerror("错误", f"计算限制值时出错: {str(e)}")
+            return
+        
+        for item in self.column_tree.get_children():
+            column = self.column_tree.item(item, 'values')[1]
+            if column in limits:
+                self._apply_recommended_limits(item, column, *limits[column])
     
     def analyze(self):
         if not self.files:
@@ -453,6 +479,9 @@ class YieldAnalysisApp:
                 except ValueError:
                     continue
         
+        # 确保analyzer已加载所有设置了上下限的特征项
+        self._ensure_analyzer(list(self.selected_columns) + list(self.limits))
+        
         # 显示结果
         self._show_analysis_results()
         
@@ -465,6 +494,93 @@ class YieldAnalysisApp:
         # 更新状态栏
         self.status_label.config(text="分析完成")
 
+    def _column_methods(self):
+        """返回列表中每个特征项上下限的计算方法 {列名: 方法}"""
+        methods = {}
+        for item in self.column_tree.get_children():
+            values = self.column_tree.item(item, 'values')
+            methods[values[1]] = values[4]
+        return methods
+    
+    def _recommend_method_text(self, method_info):
+        """返回智能推荐方法的说明，不是智能推荐的上下限时返回空字符串"""
+        if not method_info or '智能推荐' not in method_info:
+            return ""
+        text = f"\n推荐方法: {method_info}\n"
+        # 添加方法说明
+        if '3sigma' in method_info:
+            text += "基于均值和标准差计算"
+        elif 'iqr' in method_info:
+            text += "基于四分位数范围计算"
+        elif 'lognormal' in method_info:
+            text += "在对数空间中计算后转换"
+        elif 'percentile' in method_info:
+            text += "基于百分位数计算"
+        elif 'range' in method_info:
+            text += "基于数据范围计算"
+        return text
+    
+    def _draw_histogram_page(self, fig, spec, method_info=''):
+        """在Figure上绘制一个特征项的分布图页面，直方图使用预先统计好的频数"""
+        col = spec['column']
+        lower, upper = spec['lower'], spec['upper']
+        
+        if spec['empty']:
+            # 创建简单的图表显示没有数据的信息
+            ax = fig.add_subplot(111)
+            message = f"生成分布图失败: {spec['error']}" if 'error' in spec else '没有有效数据'
+            ax.text(0.5, 0.5, message, horizontalalignment='center',
+                    verticalalignment='center', transform=ax.transAxes, fontsize=14)
+            ax.set_title(f'{col} 分布')
+            ax.axis('off')
+            print(f'没有有效数据用于生成{col}的直方图')
+            return
+        
+        # 创建左右分栏布局
+        ax1, ax2 = fig.subplots(1, 2, gridspec_kw={'width_ratios': [3, 1]})
+        fig.suptitle(f'{col} 分布', fontsize=14)
+        
+        # 在左侧绘制直方图
+        counts, bins = spec['counts'], spec['bins']
+        patches = ax1.bar(bins[:-1], counts, width=np.diff(bins), align='edge',
+                          alpha=0.7, edgecolor='black', label='数据分布')
+        
+        # 如果有上下限，标记范围内和范围外的数据
+        if lower is not None and upper is not None:
+            # 为范围外的bin设置不同的颜色
+            bin_centers = 0.5 * (bins[:-1] + bins[1:])
+            for center, patch in zip(bin_centers, patches):
+                if center < lower or center > upper:
+                    patch.set_facecolor('lightcoral')  # 范围外的设为红色
+                else:
+                    patch.set_facecolor('lightgreen')  # 范围内的设为绿色
+            
+            # 添加图例
+            ax1.legend([
+                plt.Rectangle((0,0),1,1, facecolor='lightgreen', edgecolor='black'),
+                plt.Rectangle((0,0),1,1, facecolor='lightcoral', edgecolor='black')
+            ], ['范围内数据', '范围外数据'])
+        
+        # 添加上下限线
+        if lower is not None:
+            ax1.axvline(x=lower, color='red', linestyle='--', label='下限')
+        if upper is not None:
+            ax1.axvline(x=upper, color='green', linestyle='--', label='上限')
+        
+        ax1.set_xlabel('测量值')
+        ax1.set_ylabel('频数')
+        ax1.grid(True, linestyle='--', alpha=0.7)
+        
+        # 在右侧显示统计信息
+        info_text = spec['info_text']
+        if lower is not None and upper is not None:
+            info_text += self._recommend_method_text(method_info)
+        ax2.axis('off')  # 关闭坐标轴
+        ax2.text(0, 0.95, info_text, verticalalignment='top', fontsize=9)
+        
+        # 调整子图之间的间距；使用固定边距，tight_layout需要额外绘制一遍整个页面
+        fig.subplots_adjust(left=0.07, right=0.98, bottom=0.1, top=0.9, wspace=0.12)
+    
     def generate_report(self):
         if not self.files:
             messagebox.showerror("错误", "请先选择文件")
@@ -493,251 +609,57 @@ class YieldAnalysisApp:
             self.progress_label.config(text=f"{progress}%")
             progress_window.update_idletasks()
         
-        output_path = filedialog.asksaveasfilename(defaultextension='.xlsx')
+        output_path = filedialog.asksaveasfilename(
+            defaultextension='.xlsx',
+            filetypes=[("Excel files", "*.xlsx"), ("CSV files", "*.csv"), ("Parquet files", "*.parquet"), ("All files", "*.*")]
+        )
         if not output_path:
             progress_window.destroy()
             return
         
-        # 确保analyzer已初始化
-        if not hasattr(self, 'analyzer') or self.analyzer is None:
-            self.analyzer = DataAnalyzer(self.files, analyzer=self)
+        # 确保analyzer已初始化，并加载了选中的特征项
+        self._ensure_analyzer(self.selected_columns)
         
         # 创建PDF文件用于保存直方图
-        pdf_path = output_path.replace('.xlsx', '_distribution.pdf')
+        pdf_path = os.path.splitext(output_path)[0] + '_distribution.pdf'
         
         try:
             with PdfPages(pdf_path) as pdf:
                 # 更新进度条
                 update_progress(10)
                 
-                # 生成汇总分布图
-                combined_data = pd.concat(self.dfs)
-                total_columns = len(self.selected_columns)
+                # 生成汇总分布图（流式模式下基于蓄水池样本绘制）
+                # 直方图和统计信息由子进程计算，主进程只按列顺序绘制页面
+                plt.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei', 'sans-serif']
+                plt.rcParams['axes.unicode_minus'] = False
+                columns = [col for col in self.selected_columns
+                           if self.analyzer.streaming or any(col in df.columns for df in self.dfs)]
+                specs = self.analyzer.histogram_page_specs(
+                    columns, self.limits, workers=self._get_load_workers(),
+                    progress_callback=lambda done, total, col: update_progress(10 + int(50 * done / total))
+                )
                 
-                for i, col in enumerate(self.selected_columns):
-                    update_progress(10 + int(80 * i / total_columns))  # 更新进度，10-90%
+                # 上下限和计算方法都没有变化的页面直接复用上次绘制的Figure
+                methods = self._column_methods()
+                page_figures = {}
+                for i, spec in enumerate(specs):
+                    update_progress(60 + int(30 * i / len(specs)))  # 更新进度，60-90%
                     
-                    if col in combined_data.columns:
-                        data = combined_data[col].dropna()
-                        lower, upper = self.limits.get(col, (None, None))
-                        
-                        # 创建图表
-                        plt.figure(figsize=(10, 6))
-                        plt.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei', 'sans-serif']
-                        plt.rcParams['axes.unicode_minus'] = False
-                        
-                        if not data.empty:
-                            # 处理离群值并计算更合适的直方图区间
-                            try:
-                                # 使用四分位范围(IQR)检测离群值
-                                q1 = np.percentile(data, 25)
-                                q3 = np.percentile(data, 75)
-                                iqr = q3 - q1
-                                
-                                # 定义离群值边界 (一般用1.5倍IQR)
-                                lower_bound = q1 - 1.5 * iqr
-                                upper_bound = q3 + 1.5 * iqr
-                                
-                                # 找出主要数据分布范围（排除极端离群值）
-                                main_data = data[(data >= lower_bound) & (data <= upper_bound)]
-                                
-                                # 如果过滤后的数据太少，则还是使用原始数据
-                                if len(main_data) < len(data) * 0.9:  # 如果过滤掉超过10%的数据，考虑回退
-                                    # 尝试使用更宽松的边界
-                                    lower_bound = q1 - 3 * iqr
-                                    upper_bound = q3 + 3 * iqr
-                                    main_data = data[(data >= lower_bound) & (data <= upper_bound)]
-                                    
-                                    # 如果还是过滤掉太多数据，则使用5%和95%分位数作为边界
-                                    if len(main_data) < len(data) * 0.8:
-                                        lower_bound = np.percentile(data, 1)
-                                        upper_bound = np.percentile(data, 99)
-                                        main_data = data[(data >= lower_bound) & (data <= upper_bound)]
-                                        
-                                # 确保边界包含上下限值（如果有设置）
-                                if lower is not None:
-                                    lower_bound = min(lower_bound, lower)
-                                if upper is not None:
-                                    upper_bound = max(upper_bound, upper)
-                                    
-                                # 计算直方图bin数和范围
-                                min_val = lower_bound
-                                max_val = upper_bound
-                                data_range = max_val - min_val
-                                
-                                # 如果数据范围很小，调整间距
-                                if data_range < 1e-10:
-                                    mean_val = np.mean(data)
-                                    min_val = mean_val - 1
-                                    max_val = mean_val + 1
-                                    
-                                # 根据数据量自动调整bin数量
-                                if len(data) < 100:
-                                    n_bins = 10
-                                elif len(data) < 1000:
-                                    n_bins = 20
-                                else:
-                                    n_bins = 30
-                                    
-                                # 生成区间
-                                bins = np.linspace(min_val, max_val, n_bins + 1)
-                                
-                                # 记录离群值的信息
-                                outliers = data[(data < lower_bound) | (data > upper_bound)]
-                                outlier_info = f"离群值: {len(outliers)}个 ({len(outliers)/len(data)*100:.2f}%)" if len(outliers) > 0 else ""
-                            except:
-                                # 如果出错就使用默认设置
-                                bins = 20
-                                outlier_info = ""
-                            
-                            # 创建左右分栏布局
-                            fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 6), gridspec_kw={'width_ratios': [3, 1]})
-                            plt.suptitle(f'{col} 分布', fontsize=14)
-                            
-                            # 在左侧绘制直方图
-                            n, bins, patches = ax1.hist(
-                                data,
-                                bins=bins,
-                                alpha=0.7,
-                                edgecolor='black',
-                                label='数据分布'
-                            )
-                        
-                            # 如果有上下限，标记范围内和范围外的数据
-                            if lower is not None and upper is not None:
-                                # 获取每个bin的中心点
-                                bin_centers = 0.5 * (bins[:-1] + bins[1:])
-                                
-                                # 为范围外的bin设置不同的颜色
-                                for i, patch in enumerate(patches):
-                                    if bin_centers[i] < lower or bin_centers[i] > upper:
-                                        patch.set_facecolor('lightcoral')  # 范围外的设为红色
-                                    else:
-                                        patch.set_facecolor('lightgreen')  # 范围内的设为绿色
-                                
-                                # 添加图例
-                                ax1.legend([
-                                    plt.Rectangle((0,0),1,1, facecolor='lightgreen', edgecolor='black'),
-                                    plt.Rectangle((0,0),1,1, facecolor='lightcoral', edgecolor='black')
-                                ], ['范围内数据', '范围外数据'])
-                            
-                            # 添加上下限线
-                            if lower is not None:
-                                ax1.axvline(x=lower, color='red', linestyle='--', label='下限')
-                            if upper is not None:
-                                ax1.axvline(x=upper, color='green', linestyle='--', label='上限')
-                            
-                            ax1.set_xlabel('测量值')
-                            ax1.set_ylabel('频数')
-                            ax1.grid(True, linestyle='--', alpha=0.7)
-                            
-                            # 计算正态性检验结果
-                            _, p_value = stats.normaltest(data)
-                            is_normal = p_value > 0.05
-                            normality_text = "符合正态分布" if is_normal else "不符合正态分布"
-                            
-                            # 如果不符合正态分布，尝试识别可能的分布类型
-                            distribution_type = ""
-                            if not is_normal:
-                                # 计算偏度和峰度
-                                skewness = stats.skew(data)
-                                kurtosis = stats.kurtosis(data)
-                                
-                                # 尝试拟合几种常见分布
-                                try:
-                                    # 对数正态分布检验
-                                    if np.all(data > 0):  # 对数正态分布要求数据全部为正
-                                        _, lognorm_p = stats.normaltest(np.log(data))
-                                        if lognorm_p > 0.05:
-                                            distribution_type = "可能符合对数正态分布"
-                                    
-                                    # 根据偏度和峰度判断
-                                    if not distribution_type:
-                                        if abs(skewness) < 0.5:
-                                            if kurtosis > 0.5:
-                                                distribution_type = "可能符合t分布"
-                                            elif kurtosis < -0.5:
-                                                distribution_type = "可能符合均匀分布"
-                                            else:
-                                                distribution_type = "接近正态但有偏差"
-                                        elif skewness > 0.5:
-                                            distribution_type = "右偏分布(可能为指数族分布)"
-                                        elif skewness < -0.5:
-                                            distribution_type = "左偏分布"
-                                except:
-                                    distribution_type = "无法确定分布类型"
-                            
-                            # 在右侧显示统计信息
-                            ax2.axis('off')  # 关闭坐标轴
-                            
-                            # 统计信息
-                            info_text = f"总样本数: {len(data)}\n"
-                            info_text += f"平均值: {np.mean(data):.4f}\n"
-                            info_text += f"标准差: {np.std(data):.4f}\n"
-                            info_text += f"中位数: {np.median(data):.4f}\n"
-                            info_text += f"最小值: {np.min(data):.4f}\n"
-                            info_text += f"最大值: {np.max(data):.4f}\n\n"
-                            info_text += f"正态性检验: {normality_text}\n(p={p_value:.4f})\n"
-                            
-                            if not is_normal and distribution_type:
-                                info_text += f"分布类型: {distribution_type}\n"
-                                
-                            if outlier_info:
-                                info_text += f"\n{outlier_info}\n"
-                            if lower is not None and upper is not None:
-                                valid_count = len(data[(data >= lower) & (data <= upper)])
-                                below_count = len(data[data < lower])
-                                above_count = len(data[data > upper])
-                                
-                                info_text += f"\n范围内样本数: {valid_count}\n({valid_count/len(data)*100:.2f}%)\n"
-                                info_text += f"低于下限样本数: {below_count}\n({below_count/len(data)*100:.2f}%)\n"
-                                info_text += f"高于上限样本数: {above_count}\n({above_count/len(data)*100:.2f}%)\n"
-                                
-                                # 添加上下限值
-                                info_text += f"\n下限值: {lower:.4f}\n"
-                                info_text += f"上限值: {upper:.4f}\n"
-                                
-                                # 尝试获取推荐方法信息
-                                for item in self.column_tree.get_children():
-                                    if self.column_tree.item(item, 'values')[1] == col:
-                                        method_info = self.column_tree.item(item, 'values')[4]
-                                        if method_info and '智能推荐' in method_info:
-                                            info_text += f"\n推荐方法: {method_info}\n"
-                                            # 添加方法说明
-                                            if '3sigma' in method_info:
-                                                info_text += "基于均值和标准差计算"
-                                            elif 'iqr' in method_info:
-                                                info_text += "基于四分位数范围计算"
-                                            elif 'lognormal' in method_info:
-                                                info_text += "在对数空间中计算后转换"
-                                            elif 'percentile' in method_info:
-                                                info_text += "基于百分位数计算"
-                                            elif 'range' in method_info:
-                                                info_text += "基于数据范围计算"
-                                        break
-                            
-                            # 显示统计信息
-                            ax2.text(0, 0.95, info_text, verticalalignment='top', fontsize=9)
-                            
-                            # 调整子图之间的间距
-                            plt.tight_layout()
-                            plt.subplots_adjust(top=0.9)
-                                
-                        else:
-                            # 创建简单的图表显示没有数据的信息
-                            fig, ax = plt.subplots(figsize=(10, 6))
-                            ax.text(0.5, 0.5, '没有有效数据', horizontalalignment='center', 
-                                   verticalalignment='center', transform=ax.transAxes, fontsize=14)
-                            ax.set_title(f'{col} 分布')
-                            ax.axis('off')
-                            print(f'没有有效数据用于生成{col}的直方图')
-                        
-                        try:
-                            pdf.savefig()
-                        except Exception as e:
-                            print(f'保存图表失败: {e}')
-                        finally:
-                            plt.close()
+                    col = spec['column']
+                    key = (self.analyzer.data_version, col, spec['lower'], spec['upper'], methods.get(col, ''))
+                    fig = self._page_figures.get(key)
+                    if fig is None:
+                        # 使用独立的Figure，不经过pyplot，不再使用时即可释放
+                        fig = Figure(figsize=(10, 6) if spec['empty'] else (12, 6))
+                        self._draw_histogram_page(fig, spec, methods.get(col, ''))
+                    if 'error' not in spec:
+                        page_figures[key] = fig
+                    try:
+                        pdf.savefig(fig)
+                    except Exception as e:
+                        print(f'保存图表失败: {e}')
+                # 只保留本次报告用到的页面
+                self._page_figures = page_figures
                 
                 # 生成Excel报告
                 update_progress(90)
@@ -747,7 +669,8 @@ class YieldAnalysisApp:
                     self.analyzer.generate_report(
                         self.selected_columns, 
                         output_path, 
-                        self.limits
+                        self.limits,
+                        methods=methods
                     )
                     update_progress(100)
                     messagebox.showinfo("成功", f"报告已成功生成:\n{output_path}\n{pdf_path}")
@@ -819,35 +742,95 @@ class YieldAnalysisApp:
             # 重置选中列集合
             self.selected_columns = []
             
-            # 创建analyzer对象并加载文件
-            self.analyzer = DataAnalyzer(self.files, skiprows=self.skiprows, analyzer=self)
+            # 只读取各文件的标题区域获取列名，数值数据在用户选择特征项后按需加载
+            if self.analyzer is not None:
+                # 文件集合变化，清空已加载的数据和列存储
+                self.analyzer.workers = self._get_load_workers()
+                self.analyzer.set_files(self.files)
+            self.schema = discover_columns(self.files, skiprows=self.skiprows, analyzer=self)
             
-            # 如果analyzer没有成功创建，可能是因为文件读取错误
-            if not hasattr(self, 'analyzer') or self.analyzer is None:
-                messagebox.showerror("错误", "无法创建分析器。请检查文件格式和起始行设置。")
-                return
+            if self.schema['errors']:
+                failed = "\n".join(os.path.basename(f) for f in self.schema['errors'])
+                messagebox.showwarning("警告", f"以下文件读取失败，已跳过:\n{failed}")
             
-            # 检查是否成功加载了数据
-            if len(self.analyzer.dfs) == 0 or self.analyzer.dfs[0].empty:
+            # 检查是否成功读取了列名
+            if not self.schema['columns']:
                 messagebox.showerror("错误", "没有成功加载任何数据。请检查文件格式和起始行设置。")
                 return
             
-            # 获取第一个文件的列
-            df = self.analyzer.dfs[0]
-            self.dfs = self.analyzer.dfs
-            
-            # 将列添加到树形视图
-            for col in df.columns:
+            # 将第一个文件的列添加到树形视图
+            columns = self.schema['columns']
+            for col in columns:
                 self.column_tree.insert('', 'end', values=('False', col, '', '', '推荐'))
             
             # 显示成功加载的列数
-            messagebox.showinfo("成功", f"成功加载 {len(df.columns)} 列数据。")
+            message = f"成功加载 {len(columns)} 列数据。"
+            if len(self.schema['union']) != len(self.schema['intersection']):
+                message += f"\n各文件共有 {len(self.schema['intersection'])} 列，合计 {len(self.schema['union'])} 列。"
+            messagebox.showinfo("成功", message)
             
         except Exception as e:
             print(f"加载列出错: {e}")
             traceback.print_exc()
             messagebox.showerror("错误", f"加载列时出错: {str(e)}\n请检查文件格式和起始行设置。")
 
+    def _ensure_analyzer(self, columns=None):
+        """确保analyzer已创建并加载了所需的列，数据只在用到时按列解析
+        
+        参数:
+            columns: 需要的列，None表示当前选中的特征项
+        """
+        if not self.files:
+            return False
+        columns = list(self.selected_columns if columns is None else columns)
+        streaming = self.streaming_var.get()
+        if self.analyzer is None or self.analyzer.streaming != streaming:
+            self.analyzer = DataAnalyzer(self.files, skiprows=self.skiprows, analyzer=self,
+                                         workers=self._get_load_workers(), lazy=not streaming,
+                                         streaming=streaming)
+            self.dfs = self.analyzer.dfs
+            self._page_figures.clear()
+        else:
+            # 读取进程数可能在analyzer创建后修改过，每次加载前重新读取
+            self.analyzer.workers = self._get_load_workers()
+
+        missing = self.analyzer.missing_columns(columns)
+        if not missing:
+            self.analyzer.ensure_columns(columns)
+            return True
+        
+        # 多个文件时按设置的进程数并行读取
+        progress_window = tk.Toplevel(self.root)
+        progress_window.title("读取文件进度")
+        progress_window.geometry("300x100")
+        progress = ttk.Progressbar(progress_window, orient="horizontal", length=250, mode="determinate")
+        progress.pack(pady=20)
+        progress_label = ttk.Label(progress_window, text=f"0/{len(self.files)}")
+        progress_label.pack()
+        
+        def update_progress(done, total, file_path):
+            progress['value'] = done * 100 / total
+            progress_label.config(text=f"{done}/{total}")
+            progress_window.update_idletasks()
+        
+        load_errors = len(self.analyzer.load_errors)
+        try:
+            self.analyzer.ensure_columns(columns, progress_callback=update_progress)
+        finally:
+            progress_window.destroy()
+        
+        if len(self.analyzer.load_errors) > load_errors:
+            failed = "\n".join(os.path.basename(f) for f in self.analyzer.load_errors)
+            messagebox.showwarning("警告", f"以下文件读取失败，已跳过:\n{failed}")
+        return True
+
+    def _get_load_workers(self):
+        """读取设置中的并行进程数，无效时逐个读取"""
+        try:
+            return max(1, int(self.load_workers_entry.get()))
+        except (ValueError, AttributeError):
+            return 1
+
     def _on_treeview_click(self, event):
         item = self.column_tree.identify_row(event.y)
         col = self.column_tree.identify_column(event.x)
@@ -876,11 +859,6 @@ class YieldAnalysisApp:
                     current_params = {'lower_multiplier': lower, 'upper_multiplier': upper}
                 except ValueError:
                     return
-            elif method == 'mahalanobis':
-                try:
-                    current_params = {'n_components': int(self.mahalanobis_entry.get() or '1')}
-                except ValueError:
-                    return
             elif method == 'Isolation Forest':
                 try:
                     current_params = {'contamination': float(self.if_contamination_entry.get() or '0.1')}
@@ -932,6 +910,32 @@ class YieldAnalysisApp:
         upper_entry.insert(0, self.column_tree.item(item, 'values')[3])
         upper_entry.grid(row=1, column=1)
         
+        # 输入时实时显示良率，基于排序索引，每次只需两次二分查找
+        yield_label = ttk.Label(entry_window, text="")
+        yield_label.pack(padx=10, pady=5)
+        
+        def update_yield(event=None):
+            if self.analyzer is None or self.analyzer.streaming:
+                yield_label.config(text="")
+                return
+            try:
+                lower = float(lower_entry.get()) if lower_entry.get() else None
+                upper = float(upper_entry.get()) if upper_entry.get() else None
+            except ValueError:
+                yield_label.config(text="请输入有效的数字")
+                return
+            counts = self.analyzer.yield_counts(column, lower, upper)
+            if counts['total'] == 0:
+                yield_label.config(text="该列没有有效数据")
+                return
+            yield_label.config(text=f"良率: {counts['yield']*100:.2f}%  有效 {counts['valid']}/{counts['total']}\n"
+                                    f"超下限 {counts['below']}，超上限 {counts['above']}")
+        
+        lower_entry.bind('<KeyRelease>', update_yield)
+        upper_entry.bind('<KeyRelease>', update_yield)
+        if self.files and not self.streaming_var.get() and self._ensure_analyzer(list(self.selected_columns) + [column]):
+            update_yield()
+        
         def save_values():
             values = list(self.column_tree.item(item, 'values'))
             values[2] = lower_entry.get()
@@ -954,39 +958,40 @@ class YieldAnalysisApp:
             tk.messagebox.showerror("错误", "请先选择统计方法")
             return
         
-        # 确保analyzer已初始化
-        if not hasattr(self, 'analyzer') or self.analyzer is None:
-            if self.files:
-                self.analyzer = DataAnalyzer(self.files, analyzer=self)
-            else:
-                tk.messagebox.showerror("错误", "请先选择文件")
-                return
+        # 确保analyzer已初始化，并加载了该列
+        if not self._ensure_analyzer(list(self.selected_columns) + [column]):
+            tk.messagebox.showerror("错误", "请先选择文件")
+            return
                 
         try:
             lower, upper = self.analyzer.calculate_limits(column, method, **params)
             for item in self.column_tree.get_children():
                 if self.column_tree.item(item, 'values')[1] == column:
-                    current_values = list(self.column_tree.item(item, 'values'))
-                    if lower is not None and upper is not None:
-                        current_values[2] = f'{lower:.4f}'
-                        current_values[3] = f'{upper:.4f}'
-                        current_values[4] = '已推荐'
-                        # 更新列背景色
-                        self.column_tree.item(item, tags=('recommended',))
-                        self.column_tree.tag_configure('recommended', background='#E8F5E9')
-                        # 同步到输入框
-                        self.lower_entry.delete(0, tk.END)
-                        self.lower_entry.insert(0, f'{lower:.4f}')
-                        self.upper_entry.delete(0, tk.END)
-                        self.upper_entry.insert(0, f'{upper:.4f}')
-                        # 更新limits参数
-                        self.limits[column] = (lower, upper)
-                    else:
-                        tk.messagebox.showwarning("警告", f"无法计算{column}的限制值，可能是数据不足或分布不适合当前方法")
-                    self.column_tree.item(item, values=tuple(current_values))
+                    self._apply_recommended_limits(item, column, lower, upper)
                     break
         except Exception as e:
             tk.messagebox.showerror("错误", f"计算限制值时出错: {str(e)}")
+    
+    def _apply_recommended_limits(self, item, column, lower, upper):
+        """把推荐的上下限写入树形视图中的一项，并更新limits"""
+        current_values = list(self.column_tree.item(item, 'values'))
+        if lower is not None and upper is not None:
+            current_values[2] = f'{lower:.4f}'
+            current_values[3] = f'{upper:.4f}'
+            current_values[4] = '已推荐'
+            # 更新列背景色
+            self.column_tree.item(item, tags=('recommended',))
+            self.column_tree.tag_configure('recommended', background='#E8F5E9')
+            # 同步到输入框
+            self.lower_entry.delete(0, tk.END)
+            self.lower_entry.insert(0, f'{lower:.4f}')
+            self.upper_entry.delete(0, tk.END)
+            self.upper_entry.insert(0, f'{upper:.4f}')
+            # 更新limits参数
+            self.limits[column] = (lower, upper)
+        else:
+            tk.messagebox.showwarning("警告", f"无法计算{column}的限制值，可能是数据不足或分布不适合当前方法")
+        self.column_tree.item(item, values=tuple(current_values))
 
     def _show_analysis_results(self):
         """在结果文本框中显示分析结果"""
@@ -1000,29 +1005,39 @@ class YieldAnalysisApp:
         
         # 添加结果表格
         result_data = []
+        counts = self.analyzer.limit_counts_for_columns(self.limits)
         for col, (lower, upper) in self.limits.items():
-            data = pd.concat([df[col] for df in self.dfs if col in df.columns])
-            valid = data[(data >= lower) & (data <= upper)] if lower is not None and upper is not None else data
-            
-            # 计算超限颗粒数
-            below_lower = len(data[data < lower]) if lower is not None else 0
-            above_upper = len(data[data > upper]) if upper is not None else 0
+            total = counts[col]['total']
+            valid = counts[col]['valid']
             
             # 添加到结果列表
             result_data.append({
                 '特征项': col,
                 '下限': f'{lower:.4f}' if lower is not None else 'N/A',
                 '上限': f'{upper:.4f}' if lower is not None else 'N/A',
-                '总颗粒数': len(data),
-                '有效颗粒数': len(valid),
-                '超下限颗粒数': below_lower,
-                '超上限颗粒数': above_upper,
-                '良率': f'{len(valid)/len(data)*100:.2f}%' if len(data) > 0 else 'N/A'
+                '总颗粒数': total,
+                '有效颗粒数': valid,
+                '超下限颗粒数': counts[col]['below'],
+                '超上限颗粒数': counts[col]['above'],
+                '良率': f'{valid/total*100:.2f}%' if total > 0 else 'N/A'
             })
         
         # 按良率排序
         result_data.sort(key=lambda x: float(x['良率'].replace('%', '')) if x['良率'] != 'N/A' else 0)
         
+        # 全部通过良率和主要失效项
+        all_pass = self.analyzer.all_pass_analysis(self.limits)
+        if all_pass['columns'] and all_pass['total'] > 0:
+            self.result_text.insert(tk.END, "全部通过良率: ", 'feature')
+            self.result_text.tag_configure('feature', font=('Arial', 10, 'bold'))
+            self.result_text.insert(tk.END, f"{all_pass['yield']*100:.2f}% ({all_pass['passed']}/{all_pass['total']})\n")
+            top_fails = sorted(all_pass['first_fail'].items(), key=lambda x: x[1], reverse=True)[:5]
+            for col, count in top_fails:
+                if count > 0:
+                    self.result_text.insert(tk.END, f"  首次失效 {col}: {count} 颗，"
+                                                    f"增量良率损失 {all_pass['incremental_loss'][col]*100:.2f}%\n")
+            self.result_text.insert(tk.END, "\n")
+        
         # 显示结果
         for item in result_data:
             self.result_text.insert(tk.END, f"特征项: {item['特征项']}\n", 'feature')
@@ -1038,40 +1053,9 @@ class YieldAnalysisApp:
         # 禁用文本框
         self.result_text.config(state='disabled')
 
-    def mahalanobis_outlier_removal(self, data, threshold=0.99):
-        # 计算均值向量
-        mean_vec = np.mean(data, axis=0)
-        # 计算协方差矩阵
-        cov_mat = np.cov(data, rowvar=False)
-        # 添加正则化确保矩阵可逆
-        cov_mat += 1e-6 * np.eye(cov_mat.shape[0])
-        # 计算逆协方差矩阵
-        inv_cov = np.linalg.inv(cov_mat)
-        # 计算每个点的马氏距离
-        distances = []
-        for i in range(len(data)):
-            diff = data[i] - mean_vec
-            dist = np.sqrt(diff.dot(inv_cov).dot(diff.T))
-            distances.append(dist)
-        # 使用卡方分布确定阈值
-        from scipy.stats import chi2
-        cutoff = np.sqrt(chi2.ppf(threshold, data.shape[1]))
-        # 返回非离群点的索引
-        return np.where(np.array(distances) <= cutoff)[0]
-
     def isolation_forest_removal(self, data, contamination=0.05):
-        # 创建并训练隔离森林模型
-        clf = IsolationForest(
-            contamination=contamination,  # 预期的异常点比例
-            random_state=42,
-            n_estimators=100
-        )
-        # 拟合数据
-        clf.fit(data)
-        # 预测异常(-1)和正常(1)
-        predictions = clf.predict(data)
-        # 返回正常点的索引
-        return np.where(predictions == 1)[0]
+        # 隔离森林模型按数据矩阵缓存，只修改异常比例时直接用缓存的异常分数重新划分，返回正常点的索引
+        return isolation_forest_inliers(data, contamination, n_jobs=self._get_load_workers())
 
     def multi_dimensional_analysis(self):
         """多维分析功能，对多个特征项进行共同分析"""
@@ -1085,11 +1069,20 @@ class YieldAnalysisApp:
         if len(selected_features) < 2:
             tk.messagebox.showerror("错误", "多维分析需要至少选择2个特征项")
             return
+        
+        if self.streaming_var.get():
+            tk.messagebox.showerror("错误", "流式模式下不支持多维分析，请在CSV设置中关闭流式模式")
+            return
+        
+        # 确保analyzer已初始化，并加载了选中的特征项
+        if not self._ensure_analyzer(selected_features):
+            tk.messagebox.showerror("错误", "请先选择文件")
+            return
             
         # 创建多维分析窗口
         multi_win = tk.Toplevel(self.root)
         multi_win.title("多维分析设置")
-        multi_win.geometry("400x300")
+        multi_win.geometry("400x450")
         
         # 方法选择
         method_frame = ttk.Frame(multi_win, padding=10)
@@ -1115,83 +1108,75 @@ class YieldAnalysisApp:
         contamination_entry = ttk.Entry(if_frame, textvariable=contamination_var, width=10)
         contamination_entry.grid(row=0, column=1, padx=5, pady=5)
         
+        # 马氏距离参数，主成分数留空表示不降维
+        ttk.Label(if_frame, text="马氏距离主成分数:").grid(row=1, column=0, sticky='w')
+        n_components_var = tk.StringVar(value="")
+        ttk.Entry(if_frame, textvariable=n_components_var, width=10).grid(row=1, column=1, padx=5, pady=5)
+        
+        # DBSCAN参数，颗粒数超过抽样数时抽样拟合
+        dbscan_frame = ttk.Frame(param_frame)
+        dbscan_frame.pack(fill='x')
+        
+        eps_var = tk.StringVar(value="0.5")
+        min_samples_var = tk.StringVar(value="5")
+        sample_size_var = tk.StringVar(value=str(DBSCAN_SAMPLE_SIZE))
+        memory_var = tk.StringVar(value=str(DBSCAN_MEMORY_MB))
+        for row, (label, var) in enumerate([("DBSCAN邻域半径:", eps_var), ("DBSCAN最少点数:", min_samples_var),
+                                            ("DBSCAN抽样数:", sample_size_var), ("内存上限(MB):", memory_var)]):
+            ttk.Label(dbscan_frame, text=label).grid(row=row, column=0, sticky='w')
+            ttk.Entry(dbscan_frame, textvariable=var, width=10).grid(row=row, column=1, padx=5, pady=2)
+        
         # 添加应用按钮
         def apply_multi_analysis():
             method = method_var.get()
             
-            # 收集选中特征的数据
-            data_dict = {}
-            for feature in selected_features:
-                feature_data = []
-                for df in self.dfs:
-                    if feature in df.columns:
-                        feature_data.extend(df[feature].dropna().tolist())
-                data_dict[feature] = feature_data
-            
-            # 检查数据长度是否一致
-            lengths = [len(data) for data in data_dict.values()]
-            if len(set(lengths)) > 1:
-                tk.messagebox.showerror("错误", "所选特征的数据长度不一致，无法进行多维分析")
+            # 构建按行对齐的数据矩阵，只保留所有选中特征都有值的晶粒
+            data_matrix = self.analyzer.feature_matrix(selected_features)
+            if len(data_matrix) == 0:
+                tk.messagebox.showerror("错误", "所选特征没有同时有值的晶粒，无法进行多维分析")
                 return
-                
-            # 构建数据矩阵
-            import numpy as np
-            data_matrix = np.array([data_dict[feature] for feature in selected_features]).T
             
             # 应用选定的方法
             try:
                 if method == "Isolation Forest":
-                    from sklearn.ensemble import IsolationForest
                     contamination = float(contamination_var.get())
                     if contamination <= 0 or contamination >= 1:
                         tk.messagebox.showerror("错误", "异常比例必须在0-1之间")
                         return
-                        
-                    # 训练模型
-                    model = IsolationForest(contamination=contamination, random_state=42)
-                    model.fit(data_matrix)
                     
-                    # 预测
-                    predictions = model.predict(data_matrix)
-                    valid_indices = np.where(predictions == 1)[0]
+                    # 同一组特征数据只拟合一次模型，修改异常比例时直接用缓存的异常分数重新划分
+                    screen, valid_indices = OutlierScreen.fit(
+                        'isolation_forest', data_matrix, selected_features, n_jobs=self._get_load_workers(),
+                        cache_key=self.analyzer.feature_matrix_key(selected_features), contamination=contamination)
                     
                 elif method == "马氏距离":
-                    # 计算均值向量
-                    mean_vec = np.mean(data_matrix, axis=0)
-                    # 计算协方差矩阵
-                    cov_mat = np.cov(data_matrix, rowvar=False)
-                    # 添加正则化确保矩阵可逆
-                    cov_mat += 1e-6 * np.eye(cov_mat.shape[0])
-                    # 计算逆协方差矩阵
-                    inv_cov = np.linalg.inv(cov_mat)
-                    # 计算每个点的马氏距离
-                    distances = []
-                    for i in range(len(data_matrix)):
-                        diff = data_matrix[i] - mean_vec
-                        dist = np.sqrt(diff.dot(inv_cov).dot(diff))
-                        distances.append(dist)
-                    
-                    # 使用卡方分布确定阈值
-                    from scipy.stats import chi2
-                    threshold = 0.99  # 99%置信度
-                    cutoff = np.sqrt(chi2.ppf(threshold, data_matrix.shape[1]))
+                    try:
+                        n_components = int(n_components_var.get()) if n_components_var.get().strip() else None
+                    except ValueError:
+                        tk.messagebox.showerror("错误", "主成分数必须是整数")
+                        return
                     
-                    # 获取非离群点的索引
-                    valid_indices = np.where(np.array(distances) <= cutoff)[0]
+                    # 分块计算马氏距离（可先做主成分降维），使用卡方分布确定阈值（99%置信度），获取非离群点的索引
+                    screen, valid_indices = OutlierScreen.fit('mahalanobis', data_matrix, selected_features,
+                                                              threshold=0.99, n_components=n_components)
                     
                 elif method == "DBSCAN":
-                    from sklearn.cluster import DBSCAN
-                    from sklearn.preprocessing import StandardScaler
-                    
-                    # 标准化数据
-                    scaler = StandardScaler()
-                    scaled_data = scaler.fit_transform(data_matrix)
-                    
-                    # 应用DBSCAN
-                    db = DBSCAN(eps=0.5, min_samples=5).fit(scaled_data)
+                    try:
+                        eps = float(eps_var.get())
+                        min_samples = int(min_samples_var.get())
+                        sample_size = int(sample_size_var.get())
+                        max_memory_mb = float(memory_var.get())
+                    except ValueError:
+                        tk.messagebox.showerror("错误", "DBSCAN参数必须是数字")
+                        return
                     
-                    # 获取非噪声点的索引
-                    valid_indices = np.where(db.labels_ != -1)[0]
+                    # 标准化后分块做DBSCAN，数据量大时抽样拟合，获取非噪声点的索引
+                    screen, valid_indices = OutlierScreen.fit(
+                        'dbscan', data_matrix, selected_features, n_jobs=self._get_load_workers(),
+                        eps=eps, min_samples=min_samples, sample_size=sample_size, max_memory_mb=max_memory_mb)
+                    dbscan_info = screen.info
+                    print(f"DBSCAN({dbscan_info['mode']}): 样本 {dbscan_info['sample_size']} 颗，"
+                          f"核心点 {dbscan_info['core_points']} 个，耗时 {dbscan_info['total_seconds']:.2f} 秒")
                 
                 # 计算每个特征的范围
                 filtered_data = data_matrix[valid_indices]
@@ -1201,7 +1186,11 @@ class YieldAnalysisApp:
                 result_text += f"总样本数: {len(data_matrix)}\n"
                 result_text += f"有效样本数: {len(valid_indices)}\n"
                 result_text += f"剔除样本数: {len(data_matrix) - len(valid_indices)}\n"
-                result_text += f"良率: {len(valid_indices) / len(data_matrix) * 100:.2f}%\n\n"
+                result_text += f"良率: {len(valid_indices) / len(data_matrix) * 100:.2f}%\n"
+                if method == "DBSCAN":
+                    result_text += (f"DBSCAN{'抽样拟合' if dbscan_info['mode'] == 'sampled' else ''}: "
+                                    f"样本 {dbscan_info['sample_size']} 颗，耗时 {dbscan_info['total_seconds']:.2f} 秒\n")
+                result_text += "\n"
                 
                 # 更新每个特征的上下限
                 for i, feature in enumerate(selected_features):
@@ -1233,6 +1222,7 @@ class YieldAnalysisApp:
                 result_text_widget.pack(fill='both', expand=True, padx=10, pady=10)
                 result_text_widget.insert('1.0', result_text)
                 result_text_widget.config(state='disabled')
+                ttk.Button(result_win, text="保存模型", command=lambda: self.save_outlier_screen(screen)).pack(pady=5)
                 
                 # 更新状态
                 self.status_label.config(text=f"多维分析完成: 良率 {len(valid_indices) / len(data_matrix) * 100:.2f}%")
@@ -1248,6 +1238,86 @@ class YieldAnalysisApp:
         
         ttk.Button(button_frame, text="应用", command=apply_multi_analysis).pack(side='right', padx=10)
         ttk.Button(button_frame, text="取消", command=multi_win.destroy).pack(side='right', padx=10)
+        ttk.Button(button_frame, text="用已保存模型筛选", command=self.apply_saved_outlier_screen).pack(side='left', padx=10)
+
+    def save_outlier_screen(self, screen):
+        """把拟合好的多维筛选模型保存到文件，之后的批次直接加载使用"""
+        output_path = filedialog.asksaveasfilename(
+            defaultextension=".pkl",
+            filetypes=[("多维筛选模型", "*.pkl"), ("所有文件", "*.*")],
+            title="保存多维筛选模型"
+        )
+        if not output_path:
+            return
+        try:
+            screen.save(output_path)
+            self.status_label.config(text=f"多维筛选模型已保存: {os.path.basename(output_path)}")
+        except Exception as e:
+            tk.messagebox.showerror("错误", f"保存模型出错: {str(e)}")
+
+    def apply_saved_outlier_screen(self):
+        """加载已保存的多维筛选模型，按块读取新的CSV文件逐块判定，不重新拟合也不把文件读入内存"""
+        model_path = filedialog.askopenfilename(
+            filetypes=[("多维筛选模型", "*.pkl"), ("所有文件", "*.*")],
+            title="选择多维筛选模型"
+        )
+        if not model_path:
+            return
+        try:
+            screen = OutlierScreen.load(model_path)
+        except Exception as e:
+            tk.messagebox.showerror("错误", f"加载模型出错: {str(e)}")
+            return
+        
+        files = filedialog.askopenfilenames(filetypes=[("CSV files", "*.csv")], title="选择要筛选的CSV文件")
+        if not files:
+            return
+        
+        progress_window = tk.Toplevel(self.root)
+        progress_window.title("筛选进度")
+        progress_window.geometry("300x100")
+        progress = ttk.Progressbar(progress_window, orient="horizontal", length=250, mode="determinate")
+        progress.pack(pady=20)
+        progress_label = ttk.Label(progress_window, text=f"0/{len(files)}")
+        progress_label.pack()
+        
+        def update_progress(done, total, file_path):
+            progress['value'] = done * 100 / total
+            progress_label.config(text=f"{done}/{total}")
+            progress_window.update_idletasks()
+        
+        try:
+            # 流式模式的analyzer不读取数据，只用来沿用当前的标题行设置
+            analyzer = DataAnalyzer(list(files), skiprows=self.skiprows, analyzer=self,
+                                    workers=self._get_load_workers(), streaming=True)
+            result = analyzer.apply_outlier_screen(screen, analyzer.files, progress_callback=update_progress)
+        except Exception as e:
+            traceback.print_exc()
+            tk.messagebox.showerror("错误", f"筛选出错: {str(e)}")
+            return
+        finally:
+            progress_window.destroy()
+        
+        method_names = {'mahalanobis': '马氏距离', 'isolation_forest': 'Isolation Forest', 'dbscan': 'DBSCAN'}
+        result_text = f"多维筛选结果 ({method_names[screen.method]}，模型: {os.path.basename(model_path)}):\n"
+        result_text += f"特征: {', '.join(screen.features)}\n"
+        result_text += (f"共 {result['rows']} 颗，耗时 {result['seconds']:.2f} 秒，"
+                        f"{result['dies_per_second']:,.0f} 颗/秒\n\n")
+        for row in result['files']:
+            if row['error']:
+                result_text += f"{row['file']}: 出错 {row['error']}\n"
+            else:
+                result_text += (f"{row['file']}: 判定 {row['screened']} 颗，剔除 {row['failed']} 颗，"
+                                f"良率 {row['yield']:.2f}%\n")
+        
+        result_win = tk.Toplevel(self.root)
+        result_win.title("多维筛选结果")
+        result_win.geometry("500x300")
+        result_text_widget = tk.Text(result_win, wrap='word')
+        result_text_widget.pack(fill='both', expand=True, padx=10, pady=10)
+        result_text_widget.insert('1.0', result_text)
+        result_text_widget.config(state='disabled')
+        self.status_label.config(text=f"多维筛选完成: {result['dies_per_second']:,.0f} 颗/秒")
 
     def smart_recommend(self):
         """根据数据分布特性智能推荐上下限"""
@@ -1261,18 +1331,15 @@ class YieldAnalysisApp:
             tk.messagebox.showerror("错误", "请至少选择一个特征项")
             return
         
-        # 确保analyzer已初始化
-        if not hasattr(self, 'analyzer') or self.analyzer is None:
-            if self.files:
-                self.analyzer = DataAnalyzer(self.files, analyzer=self)
-            else:
-                tk.messagebox.showerror("错误", "请先选择文件")
-                return
+        # 确保analyzer已初始化，并加载了选中的特征项
+        if not self._ensure_analyzer(selected_columns):
+            tk.messagebox.showerror("错误", "请先选择文件")
+            return
         
         # 创建严格度选择对话框
         strictness_win = tk.Toplevel(self.root)
         strictness_win.title("选择推荐严格度")
-        strictness_win.geometry("400x300")  # 增加高度以确保按钮可见
+        strictness_win.geometry("400x340")  # 增加高度以确保按钮可见
         strictness_win.grab_set()  # 使窗口成为模态窗口
         strictness_win.transient(self.root)  # 设置为主窗口的子窗口
         
@@ -1315,14 +1382,26 @@ class YieldAnalysisApp:
             padding=5
         ).pack(anchor='w', pady=5)
         
+        # 并行计算进程数
+        workers_frame = ttk.Frame(strictness_win)
+        workers_frame.pack(fill='x', padx=30, pady=5)
+        ttk.Label(workers_frame, text="计算进程数:").pack(side='left')
+        workers_var = tk.StringVar(value=str(os.cpu_count() or 1))
+        ttk.Entry(workers_frame, textvariable=workers_var, width=8).pack(side='left', padx=5)
+        ttk.Label(workers_frame, text="(1表示逐列计算)").pack(side='left')
+        
         # 添加按钮 - 确保按钮在窗口底部可见
         button_frame = ttk.Frame(strictness_win)
         button_frame.pack(fill='x', pady=20, side='bottom')
         
         def start_recommendation():
             strictness = strictness_var.get()
+            try:
+                workers = max(1, int(workers_var.get()))
+            except ValueError:
+                workers = 1
             strictness_win.destroy()
-            self._perform_smart_recommend(selected_columns, strictness)
+            self._perform_smart_recommend(selected_columns, strictness, workers)
         
         # 使用更大、更明显的按钮样式
         style = ttk.Style()
@@ -1335,8 +1414,162 @@ class YieldAnalysisApp:
         ttk.Button(center_frame, text="确定", command=start_recommendation, style="Action.TButton").pack(side='right', padx=10)
         ttk.Button(center_frame, text="取消", command=strictness_win.destroy, style="Action.TButton").pack(side='right', padx=10)
     
-    def _perform_smart_recommend(self, selected_columns, strictness):
-        """执行智能推荐"""
+    def show_yield_curves(self):
+        """绘制选中特征项的良率曲线：良率随sigma/IQR倍数或随上下限的变化"""
+        selected_columns = []
+        for item in self.column_tree.get_children():
+            if self.column_tree.item(item, 'values')[0] == 'True':
+                selected_columns.append(self.column_tree.item(item, 'values')[1])
+        
+        if not selected_columns:
+            tk.messagebox.showerror("错误", "请至少选择一个特征项")
+            return
+        
+        if not self._ensure_analyzer(selected_columns):
+            tk.messagebox.showerror("错误", "请先选择文件")
+            return
+        
+        curve_win = tk.Toplevel(self.root)
+        curve_win.title("良率曲线")
+        curve_win.geometry("900x650")
+        
+        # 曲线类型和特征项选择
+        control_frame = ttk.Frame(curve_win, padding=10)
+        control_frame.pack(fill='x')
+        
+        ttk.Label(control_frame, text="曲线类型:").pack(side='left', padx=5)
+        mode_var = tk.StringVar(value="sigma倍数")
+        mode_combo = ttk.Combobox(control_frame, textvariable=mode_var, values=["sigma倍数", "IQR倍数", "上下限"],
+                                  state='readonly', width=12)
+        mode_combo.pack(side='left', padx=5)
+        
+        ttk.Label(control_frame, text="特征项:").pack(side='left', padx=5)
+        column_var = tk.StringVar(value=selected_columns[0])
+        column_combo = ttk.Combobox(control_frame, textvariable=column_var, values=selected_columns,
+                                    state='readonly', width=20)
+        column_combo.pack(side='left', padx=5)
+        ttk.Label(control_frame, text="(上下限曲线只显示一个特征项，另一侧固定为当前限值)").pack(side='left', padx=5)
+        
+        plt.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei', 'sans-serif']
+        plt.rcParams['axes.unicode_minus'] = False
+        fig = Figure(figsize=(9, 5.5))
+        ax = fig.add_subplot(111)
+        canvas = FigureCanvasTkAgg(fig, master=curve_win)
+        canvas.get_tk_widget().pack(fill='both', expand=True, padx=10, pady=10)
+        
+        def draw_curves(event=None):
+            ax.clear()
+            mode = mode_var.get()
+            try:
+                if mode in ("sigma倍数", "IQR倍数"):
+                    method = '3sigma' if mode == "sigma倍数" else 'iqr'
+                    sweeps = self.analyzer.multiplier_sweep_for_columns(selected_columns, method)
+                    for col, (multipliers, yields) in sweeps.items():
+                        ax.plot(multipliers, yields * 100, label=col)
+                    ax.set_xlabel(f"{mode}（上下限相同）")
+                    ax.set_title("良率随倍数的变化")
+                else:
+                    col = column_var.get()
+                    lower, upper = self.limits.get(col, (None, None))
+                    sweep = self.analyzer.limit_sweep(col, lower, upper)
+                    upper_text = f"{upper:.4f}" if upper is not None else "不限"
+                    lower_text = f"{lower:.4f}" if lower is not None else "不限"
+                    candidates, yields = sweep['lower']
+                    ax.plot(candidates, yields * 100, label=f"调整下限（上限={upper_text}）")
+                    candidates, yields = sweep['upper']
+                    ax.plot(candidates, yields * 100, label=f"调整上限（下限={lower_text}）")
+                    ax.set_xlabel("限值")
+                    ax.set_title(f"{col} 良率随上下限的变化")
+            except Exception as e:
+                tk.messagebox.showerror("错误", f"计算良率曲线时出错: {str(e)}")
+                return
+            
+            ax.set_ylabel("良率(%)")
+            ax.set_ylim(0, 101)
+            ax.grid(True, alpha=0.3)
+            # 特征项太多时不显示图例
+            if len(ax.get_lines()) <= 15:
+                ax.legend(fontsize=8)
+            fig.tight_layout()
+            canvas.draw()
+        
+        mode_combo.bind('<<ComboboxSelected>>', draw_curves)
+        column_combo.bind('<<ComboboxSelected>>', draw_curves)
+        draw_curves()
+    
+    def solve_target_yield(self):
+        """根据目标良率求解选中特征项的上下限"""
+        selected_columns = []
+        for item in self.column_tree.get_children():
+            if self.column_tree.item(item, 'values')[0] == 'True':
+                selected_columns.append(self.column_tree.item(item, 'values')[1])
+        
+        if not selected_columns:
+            tk.messagebox.showerror("错误", "请至少选择一个特征项")
+            return
+        
+        if not self._ensure_analyzer(selected_columns):
+            tk.messagebox.showerror("错误", "请先选择文件")
+            return
+        
+        target_win = tk.Toplevel(self.root)
+        target_win.title("目标良率求解")
+        target_win.geometry("420x300")
+        target_win.grab_set()
+        target_win.transient(self.root)
+        
+        target_frame = ttk.Frame(target_win, padding=10)
+        target_frame.pack(fill='x', padx=10)
+        ttk.Label(target_frame, text="目标良率(%):").pack(side='left')
+        target_var = tk.StringVar(value="99.5")
+        ttk.Entry(target_frame, textvariable=target_var, width=10).pack(side='left', padx=5)
+        
+        mode_frame = ttk.Frame(target_win, padding=10)
+        mode_frame.pack(fill='x', padx=10)
+        mode_var = tk.StringVar(value="central")
+        ttk.Radiobutton(mode_frame, text="两侧等比例去除 - 去掉两侧尾部最差的数据",
+                        variable=mode_var, value="central").pack(anchor='w', pady=2)
+        ttk.Radiobutton(mode_frame, text="对称 - 以均值为中心的最窄对称上下限",
+                        variable=mode_var, value="symmetric").pack(anchor='w', pady=2)
+        
+        all_pass_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(target_win, text="按全部通过良率求解（所有特征项同时通过）",
+                        variable=all_pass_var).pack(anchor='w', padx=20, pady=5)
+        
+        def start_solve():
+            try:
+                target = float(target_var.get()) / 100
+            except ValueError:
+                tk.messagebox.showerror("错误", "请输入有效的目标良率")
+                return
+            try:
+                limits, info = self.analyzer.solve_target_yield_for_columns(
+                    selected_columns, target, mode_var.get(), all_pass=all_pass_var.get())
+            except Exception as e:
+                tk.messagebox.showerror("错误", f"求解上下限时出错: {str(e)}")
+                return
+            target_win.destroy()
+            
+            for item in self.column_tree.get_children():
+                column = self.column_tree.item(item, 'values')[1]
+                if column in limits:
+                    self._apply_recommended_limits(item, column, *limits[column])
+            
+            message = f"已为 {len(limits)} 个特征项求解上下限。"
+            if info['all_pass_yield'] is not None:
+                message += f"\n全部通过良率: {info['all_pass_yield']*100:.2f}%"
+            else:
+                lowest = min(info['yields'].values()) if info['yields'] else np.nan
+                message += f"\n各特征项良率最低为: {lowest*100:.2f}%"
+            tk.messagebox.showinfo("完成", message)
+        
+        button_frame = ttk.Frame(target_win)
+        button_frame.pack(fill='x', pady=15, side='bottom')
+        ttk.Button(button_frame, text="求解", command=start_solve).pack(side='right', padx=10)
+        ttk.Button(button_frame, text="取消", command=target_win.destroy).pack(side='right', padx=10)
+    
+    def _perform_smart_recommend(self, selected_columns, strictness, workers=1):
+        """执行智能推荐，workers大于1时多个进程并行计算各列"""
         # 显示进度窗口
         progress_window = tk.Toplevel(self.root)
         progress_window.title("智能推荐进度")
@@ -1359,7 +1592,12 @@ class YieldAnalysisApp:
         try:
             # 获取智能推荐结果
             update_progress(10)
-            limits, methods = self.analyzer.smart_recommend_limits_for_columns(selected_columns, strictness)
+            limits, methods, timings = self.analyzer.smart_recommend_limits_for_columns(
+                selected_columns, strictness, workers=workers, with_timing=True,
+                progress_callback=lambda done, total, col: update_progress(10 + int(80 * done / total)))
+            slowest = sorted(timings.items(), key=lambda x: x[1], reverse=True)[:5]
+            print(f"智能推荐耗时 {sum(timings.values()):.2f} 秒，最慢的列: " +
+                  ", ".join(f"{col}({seconds:.3f}s)" for col, seconds in slowest))
             
             # 关闭进度窗口
             progress_window.destroy()
@@ -1412,9 +1650,8 @@ class YieldAnalysisApp:
             
             # 填充数据
             for col in selected_columns:
-                # 获取分布信息
-                dist_info = self.analyzer.analyze_distribution(col)
-                distribution_type = dist_info['distribution']
+                # 获取分布信息（推荐时已计算并缓存）
+                distribution_type = self.analyzer.column_profile(col).distribution_info()['distribution']
                 
                 # 翻译分布类型为中文
                 dist_map = {
@@ -1530,13 +1767,14 @@ class YieldAnalysisApp:
             tk.messagebox.showerror("错误", "请先在分析设置中选择特征项")
             return
         
-        # 确保analyzer已初始化
-        if not hasattr(self, 'analyzer') or self.analyzer is None:
-            if self.files:
-                self.analyzer = DataAnalyzer(self.files, analyzer=self)
-            else:
-                tk.messagebox.showerror("错误", "请先选择文件")
-                return
+        if self.streaming_var.get():
+            tk.messagebox.showerror("错误", "流式模式下不支持分布输出，请在CSV设置中关闭流式模式")
+            return
+        
+        # 确保analyzer已初始化，并加载了选中的特征项
+        if not self._ensure_analyzer(self.selected_columns):
+            tk.messagebox.showerror("错误", "请先选择文件")
+            return
 
         output_win = tk.Toplevel(self.root)
         output_win.title("产出分布输出")
@@ -1751,7 +1989,7 @@ class YieldAnalysisApp:
             # 选择保存路径
             output_path = filedialog.asksaveasfilename(
                 defaultextension='.xlsx',
-                filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")]
+                filetypes=[("Excel files", "*.xlsx"), ("CSV files", "*.csv"), ("Parquet files", "*.parquet"), ("All files", "*.*")]
             )
             
             if not output_path:
@@ -1773,32 +2011,32 @@ class YieldAnalysisApp:
             
             try:
                 # 获取数据
-                combined_data = pd.concat(self.dfs)
+                # 一维分布直接使用列存储，二维、三维分布需要按行对齐的数据
+                combined_data = pd.concat(self.dfs) if dimension != "1D" else None
                 update_progress(10)
                 
                 # 检查数据是否为空
-                if combined_data.empty:
+                if all(df.empty for df in self.dfs):
                     raise ValueError("没有可用数据，请确保已加载文件并包含有效数据。")
                 
                 # 创建一个默认工作表标志，确保至少有一个工作表被创建
                 created_at_least_one_sheet = False
                 
                 # 创建Excel写入器
-                with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
+                with TableWriter(output_path) as writer:
                     # 根据不同维度执行不同的输出逻辑
                     if dimension == "1D":
                         # 一维分布 - 简化为只输出数量和百分比
                         for i, (col, lower, upper, interval) in enumerate(selected_columns):
                             update_progress(10 + int(80 * i / len(selected_columns)))
                             
-                            if col in combined_data.columns:
-                                data = combined_data[col].dropna()
+                            if any(col in df.columns for df in self.dfs):
+                                data = self.analyzer.column_values(col)
                                 
                                 # 检查数据是否足够
                                 if len(data) < 2:
                                     # 如果数据不足，创建一个简单的工作表说明情况
-                                    pd.DataFrame({'说明': [f'列 "{col}" 中的有效数据不足，无法生成分布']}).to_excel(
-                                        writer, sheet_name=f"{col}_数据不足", index=False)
+                                    writer.write_sheet(pd.DataFrame({'说明': [f'列 "{col}" 中的有效数据不足，无法生成分布']}), f"{col}_数据不足", index=False)
                                     created_at_least_one_sheet = True
                                     continue
                                 
@@ -1808,42 +2046,37 @@ class YieldAnalysisApp:
                                         # 创建均匀间隔的分箱
                                         bins = np.linspace(lower, upper, interval + 1)
                                         
-                                        # 创建区间标签
-                                        bin_labels = [f"{bins[i]:.4f}-{bins[i+1]:.4f}" for i in range(len(bins) - 1)]
-                                        
-                                        # 将数据分箱并计算每个区间的数量
-                                        cut_data = pd.cut(data, bins, labels=bin_labels)
-                                        value_counts = cut_data.value_counts().sort_index()
+                                        # 按右闭区间统计每个区间的数量（与pd.cut相同），不生成与数据等长的分类数组
+                                        counts = self.analyzer.histogram_counts(col, bins)
                                         
                                         # 如果所有数据都被筛选掉，添加说明
-                                        if len(value_counts) == 0:
-                                            pd.DataFrame({'说明': [f'列 "{col}" 中没有数据在指定范围 [{lower}, {upper}] 内']}).to_excel(
-                                                writer, sheet_name=f"{col}_范围无数据", index=False)
+                                        if len(counts) == 0:
+                                            writer.write_sheet(pd.DataFrame({'说明': [f'列 "{col}" 中没有数据在指定范围 [{lower}, {upper}] 内']}), f"{col}_范围无数据", index=False)
                                             created_at_least_one_sheet = True
                                             continue
                                         
                                         # 计算百分比
-                                        percentages = value_counts / len(data) * 100
+                                        percentages = counts / len(data) * 100
                                         
-                                        # 创建结果数据框
+                                        # 创建结果数据框，区间标签只为输出表格生成
                                         result_df = pd.DataFrame({
-                                            '区间': value_counts.index,
-                                            '频数': value_counts.values,
-                                            '百分比(%)': percentages.values,
-                                            '累计百分比(%)': np.cumsum(percentages.values)
+                                            '区间': [f"{bins[i]:.4f}-{bins[i+1]:.4f}" for i in range(len(bins) - 1)],
+                                            '频数': counts,
+                                            '百分比(%)': percentages,
+                                            '累计百分比(%)': np.cumsum(percentages)
                                         })
                                         
                                         # 添加总计行
                                         total_row = pd.DataFrame({
                                             '区间': ['总计'],
-                                            '频数': [sum(value_counts.values)],
+                                            '频数': [int(counts.sum())],
                                             '百分比(%)': [100.0],
                                             '累计百分比(%)': [None]
                                         })
                                         result_df = pd.concat([result_df, total_row], ignore_index=True)
                                         
                                         # 写入Excel
-                                        result_df.to_excel(writer, sheet_name=f"{col}_分布", index=False)
+                                        writer.write_sheet(result_df, f"{col}_分布", index=False)
                                         created_at_least_one_sheet = True
                                         
                                         # 添加简单统计信息
@@ -1859,9 +2092,9 @@ class YieldAnalysisApp:
                                         })
                                         
                                         # 计算超限信息
-                                        below_limit = len(data[data < lower])
-                                        above_limit = len(data[data > upper])
-                                        within_limit = len(data[(data >= lower) & (data <= upper)])
+                                        below_limit = int(np.count_nonzero(data < lower))
+                                        above_limit = int(np.count_nonzero(data > upper))
+                                        within_limit = int(np.count_nonzero((data >= lower) & (data <= upper)))
                                         
                                         limit_df = pd.DataFrame({
                                             '范围': ['低于下限', '在范围内', '高于上限'],
@@ -1874,13 +2107,13 @@ class YieldAnalysisApp:
                                         })
                                         
                                         # 将统计信息和超限信息写入单独的工作表
-                                        stats_df.to_excel(writer, sheet_name=f"{col}_统计信息", index=False)
-                                        limit_df.to_excel(writer, sheet_name=f"{col}_超限信息", index=False)
+                                        writer.write_sheet(stats_df, f"{col}_统计信息", index=False)
+                                        writer.write_sheet(limit_df, f"{col}_超限信息", index=False)
                                     
                                     except Exception as e:
                                         # 如果处理特定列时出错，记录错误并继续处理其他列
                                         error_df = pd.DataFrame({'错误信息': [f'处理列 "{col}" 时出错: {str(e)}']})
-                                        error_df.to_excel(writer, sheet_name=f"{col}_错误", index=False)
+                                        writer.write_sheet(error_df, f"{col}_错误", index=False)
                                         created_at_least_one_sheet = True
                                         print(f"处理列 {col} 时出错: {str(e)}")
                                         continue
@@ -1896,34 +2129,32 @@ class YieldAnalysisApp:
                                             max_val = max_val + 0.5
                                             
                                         bins = np.linspace(min_val, max_val, interval + 1)
-                                        bin_labels = [f"{bins[i]:.4f}-{bins[i+1]:.4f}" for i in range(len(bins) - 1)]
                                         
-                                        # 将数据分箱并计算每个区间的数量
-                                        cut_data = pd.cut(data, bins, labels=bin_labels)
-                                        value_counts = cut_data.value_counts().sort_index()
+                                        # 按右闭区间统计每个区间的数量（与pd.cut相同）
+                                        counts = self.analyzer.histogram_counts(col, bins)
                                         
                                         # 计算百分比
-                                        percentages = value_counts / len(data) * 100
+                                        percentages = counts / len(data) * 100
                                         
-                                        # 创建结果数据框
+                                        # 创建结果数据框，区间标签只为输出表格生成
                                         result_df = pd.DataFrame({
-                                            '区间': value_counts.index,
-                                            '频数': value_counts.values,
-                                            '百分比(%)': percentages.values,
-                                            '累计百分比(%)': np.cumsum(percentages.values)
+                                            '区间': [f"{bins[i]:.4f}-{bins[i+1]:.4f}" for i in range(len(bins) - 1)],
+                                            '频数': counts,
+                                            '百分比(%)': percentages,
+                                            '累计百分比(%)': np.cumsum(percentages)
                                         })
                                         
                                         # 添加总计行
                                         total_row = pd.DataFrame({
                                             '区间': ['总计'],
-                                            '频数': [sum(value_counts.values)],
+                                            '频数': [int(counts.sum())],
                                             '百分比(%)': [100.0],
                                             '累计百分比(%)': [None]
                                         })
                                         result_df = pd.concat([result_df, total_row], ignore_index=True)
                                         
                                         # 写入Excel
-                                        result_df.to_excel(writer, sheet_name=f"{col}_自动分箱", index=False)
+                                        writer.write_sheet(result_df, f"{col}_自动分箱", index=False)
                                         created_at_least_one_sheet = True
                                         
                                         # 添加简单统计信息到单独的工作表
@@ -1938,11 +2169,11 @@ class YieldAnalysisApp:
                                             ]
                                         })
                                         
-                                        stats_df.to_excel(writer, sheet_name=f"{col}_自动分箱_统计", index=False)
+                                        writer.write_sheet(stats_df, f"{col}_自动分箱_统计", index=False)
                                     except Exception as e:
                                         # 如果自动分箱失败，记录错误
                                         error_df = pd.DataFrame({'错误信息': [f'自动分箱失败: {str(e)}']})
-                                        error_df.to_excel(writer, sheet_name=f"{col}_错误", index=False)
+                                        writer.write_sheet(error_df, f"{col}_错误", index=False)
                                         created_at_least_one_sheet = True
                                         print(f"自动分箱失败: {str(e)}")
                                         continue
@@ -1964,8 +2195,7 @@ class YieldAnalysisApp:
                             
                             if len(valid_data) < 2:
                                 # 数据不足
-                                pd.DataFrame({'说明': [f'列 "{col1}" 和 "{col2}" 的有效配对数据不足']}).to_excel(
-                                    writer, sheet_name="数据不足", index=False)
+                                writer.write_sheet(pd.DataFrame({'说明': [f'列 "{col1}" 和 "{col2}" 的有效配对数据不足']}), "数据不足", index=False)
                                 created_at_least_one_sheet = True
                             else:
                                 try:
@@ -2016,8 +2246,8 @@ class YieldAnalysisApp:
                                             pivot_percent['总计'] = pivot_percent.sum(axis=1)
                                             
                                             # 写入Excel
-                                            pivot_count.to_excel(writer, sheet_name="二维分布_频数")
-                                            pivot_percent.to_excel(writer, sheet_name="二维分布_百分比")
+                                            writer.write_sheet(pivot_count, "二维分布_频数")
+                                            writer.write_sheet(pivot_percent, "二维分布_百分比")
                                             created_at_least_one_sheet = True
                                             
                                             # 添加统计信息
@@ -2033,24 +2263,24 @@ class YieldAnalysisApp:
                                                 ]
                                             })
                                             
-                                            stats_df.to_excel(writer, sheet_name="二维分布_统计信息", index=False)
+                                            writer.write_sheet(stats_df, "二维分布_统计信息", index=False)
                                         else:
                                             # 没有数据在指定范围内
-                                            pd.DataFrame({
+                                            writer.write_sheet(pd.DataFrame({
                                                 '说明': [f'在指定范围内 [{col1}: {lower1}-{upper1}, {col2}: {lower2}-{upper2}] 没有数据']
-                                            }).to_excel(writer, sheet_name="范围无数据", index=False)
+                                            }), "范围无数据", index=False)
                                             created_at_least_one_sheet = True
                                     else:
                                         # 如果未指定上下限，使用自动范围
-                                        pd.DataFrame({
+                                        writer.write_sheet(pd.DataFrame({
                                             '说明': ['请为二维分析指定上下限']
-                                        }).to_excel(writer, sheet_name="需要上下限", index=False)
+                                        }), "需要上下限", index=False)
                                         created_at_least_one_sheet = True
                                 except Exception as e:
                                     # 二维分析错误
-                                    pd.DataFrame({
+                                    writer.write_sheet(pd.DataFrame({
                                         '错误信息': [f'二维分析出错: {str(e)}']
-                                    }).to_excel(writer, sheet_name="二维分析错误", index=False)
+                                    }), "二维分析错误", index=False)
                                     created_at_least_one_sheet = True
                                     print(f"二维分析出错: {str(e)}")
                     
@@ -2072,8 +2302,7 @@ class YieldAnalysisApp:
                             
                             if len(valid_data) < 3:
                                 # 数据不足
-                                pd.DataFrame({'说明': [f'列 "{col1}", "{col2}" 和 "{col3}" 的有效配对数据不足']}).to_excel(
-                                    writer, sheet_name="数据不足", index=False)
+                                writer.write_sheet(pd.DataFrame({'说明': [f'列 "{col1}", "{col2}" 和 "{col3}" 的有效配对数据不足']}), "数据不足", index=False)
                                 created_at_least_one_sheet = True
                             else:
                                 try:
@@ -2131,8 +2360,8 @@ class YieldAnalysisApp:
                                                     percent_table[col] = (percent_table[col] / total_count * 100).round(2)
                                             
                                             # 输出到Excel
-                                            tri_table.to_excel(writer, sheet_name="三维分布")
-                                            percent_table.to_excel(writer, sheet_name="三维分布百分比")
+                                            writer.write_sheet(tri_table, "三维分布")
+                                            writer.write_sheet(percent_table, "三维分布百分比")
                                             created_at_least_one_sheet = True
                                             
                                             # 添加统计信息
@@ -2153,12 +2382,12 @@ class YieldAnalysisApp:
                                                 ]
                                             })
                                             
-                                            stats_df.to_excel(writer, sheet_name="三维分布_统计信息", index=False)
+                                            writer.write_sheet(stats_df, "三维分布_统计信息", index=False)
                                         else:
                                             # 没有数据在指定范围内
-                                            pd.DataFrame({
+                                            writer.write_sheet(pd.DataFrame({
                                                 '说明': [f'在指定范围内没有有效数据点']
-                                            }).to_excel(writer, sheet_name="范围无数据", index=False)
+                                            }), "范围无数据", index=False)
                                             created_at_least_one_sheet = True
                                     else:
                                         # 如果没有设置上下限，使用自动范围进行简单统计
@@ -2168,24 +2397,24 @@ class YieldAnalysisApp:
                                             f'{col1}-{col3}': [len(valid_data), np.corrcoef(valid_data[col1], valid_data[col3])[0, 1]],
                                             f'{col2}-{col3}': [len(valid_data), np.corrcoef(valid_data[col2], valid_data[col3])[0, 1]]
                                         })
-                                        summary_df.to_excel(writer, sheet_name="三维数据_统计", index=False)
+                                        writer.write_sheet(summary_df, "三维数据_统计", index=False)
                                         
                                         # 输出原始数据的摘要
-                                        valid_data.describe().to_excel(writer, sheet_name="三维数据_描述")
+                                        writer.write_sheet(valid_data.describe(), "三维数据_描述")
                                         created_at_least_one_sheet = True
                                 except Exception as e:
                                     # 三维分析错误
-                                    pd.DataFrame({
+                                    writer.write_sheet(pd.DataFrame({
                                         '错误信息': [f'三维分析出错: {str(e)}']
-                                    }).to_excel(writer, sheet_name="三维分析错误", index=False)
+                                    }), "三维分析错误", index=False)
                                     created_at_least_one_sheet = True
                                     print(f"三维分析出错: {str(e)}")
                     
                     # 如果没有创建任何工作表，添加一个默认工作表
                     if not created_at_least_one_sheet:
-                        pd.DataFrame({
+                        writer.write_sheet(pd.DataFrame({
                             '说明': ['未能生成任何分析结果，请检查数据和参数设置']
-                        }).to_excel(writer, sheet_name="无分析结果", index=False)
+                        }), "无分析结果", index=False)
                 
                 update_progress(100)
                 tk.messagebox.showinfo("成功", f"分布数据已成功导出到: {output_path}")